@@ -0,0 +1,125 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Compare requests per second of `RedirectsMiddleware` under ASGI when Django has
+to wrap it with `sync_to_async` and when it runs natively in the event loop.
+
+The middleware table calls the middleware the way Django's handler adapts it:
+a sync only middleware is wrapped with `sync_to_async` and gets the next async
+handler wrapped with `async_to_sync`. With Django 3.1+ the client table also
+sends the requests through the whole ASGI handler with `AsyncClient`. Needs
+Python 3.5+ and asgiref.
+
+    python -m benchmarks.asgi
+"""
+
+import asyncio
+from timeit import default_timer
+
+from benchmarks.common import print_table, setup
+from benchmarks.suite import make_patterns
+from redirect_urls.middleware import RedirectsMiddleware
+
+
+SIZES = (100, 1000)
+# requests in flight at once
+CONCURRENCY = 10
+NUMBER = 1000
+REPEAT = 3
+
+
+class SyncRedirectsMiddleware(RedirectsMiddleware):
+    """How Django sees the middleware without async support."""
+    async_capable = False
+
+
+def requests_per_second(loop, send, paths):
+    """Return the best requests per second of awaiting `send(path)` for `paths`."""
+    async def run():
+        for start in range(0, len(paths), CONCURRENCY):
+            await asyncio.gather(*[send(path) for path in paths[start:start + CONCURRENCY]])
+
+    # warm up the caches and the thread pool
+    loop.run_until_complete(run())
+    times = []
+    for _ in range(REPEAT):
+        start = default_timer()
+        loop.run_until_complete(run())
+        times.append(default_timer() - start)
+
+    return len(paths) / min(times)
+
+
+def scenario_paths(size):
+    hits = ['/docs{}/intro/'.format(i) for i in range(0, size, 10)]
+    misses = ['/en-US/not/redirected/{}/'.format(i) for i in range(10)]
+    return [('hit', (hits * NUMBER)[:NUMBER]), ('miss', (misses * NUMBER)[:NUMBER])]
+
+
+def main():
+    setup()
+
+    import django
+    from asgiref.sync import async_to_sync, sync_to_async
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+
+    from redirect_urls.utils import get_resolver, redirectpatterns
+
+    async def next_handler(request):
+        return HttpResponse('passed')
+
+    rf = RequestFactory()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    rows = []
+    for size in SIZES:
+        resolver = get_resolver(make_patterns(size))
+        middlewares = [
+            ('sync_to_async', sync_to_async(
+                RedirectsMiddleware(async_to_sync(next_handler), resolver=resolver),
+                thread_sensitive=True)),
+            ('native', RedirectsMiddleware(next_handler, resolver=resolver)),
+        ]
+        for scenario, paths in scenario_paths(size):
+            requests = dict((path, rf.get(path)) for path in set(paths))
+            row = [size, scenario]
+            for label, middleware in middlewares:
+                row.append('{:.0f}'.format(requests_per_second(
+                    loop, lambda path: middleware(requests[path]), paths)))
+            rows.append(row)
+
+    print('middleware, requests/s')
+    print_table(['size', 'scenario', 'sync_to_async', 'native'], rows)
+
+    if django.VERSION < (3, 1):
+        print()
+        print('AsyncClient needs Django 3.1+, skipped')
+        return
+
+    from django.test import AsyncClient, override_settings
+
+    rows = []
+    for size in SIZES:
+        redirectpatterns[:] = make_patterns(size)
+        row_by_scenario = {}
+        for middleware_path in ('benchmarks.asgi.SyncRedirectsMiddleware',
+                                'redirect_urls.middleware.RedirectsMiddleware'):
+            with override_settings(MIDDLEWARE=[middleware_path]):
+                client = AsyncClient()
+                for scenario, paths in scenario_paths(size):
+                    row = row_by_scenario.setdefault(scenario, [size, scenario])
+                    row.append('{:.0f}'.format(requests_per_second(loop, client.get, paths)))
+
+        rows.extend(row_by_scenario.values())
+
+    del redirectpatterns[:]
+    print()
+    print('AsyncClient, requests/s')
+    print_table(['size', 'scenario', 'sync_to_async', 'native'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Compare ways to check a list of URLs against the redirects of `benchmarks.suite`:
+a request per URL through `RedirectsMiddleware` as a test would, `resolve_many()`,
+and `audit_urls()` in one process and in a pool of processes. Reports the URLs
+checked per second.
+
+    python -m benchmarks.audit
+    python -m benchmarks.audit --size 1000 --urls 200000 --processes 8
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import multiprocessing
+from timeit import default_timer
+
+from benchmarks.common import print_table, setup
+
+
+SIZE = 1000
+URLS = 20000
+
+
+def make_urls(size, count):
+    """Return `count` URLs, a fifth of them redirected, going over the table in order."""
+    urls = []
+    for n in range(count):
+        i = n * 7 % size
+        if n % 5 == 0:
+            urls.append('/de/docs{}/page-{}/?utm_source=log'.format(i - i % 10, n))
+        elif n % 5 == 1:
+            urls.append('/en-US/firefox/{}/'.format(n))
+        else:
+            urls.append('/legacy/{}/page.html?id={}'.format(i, n))
+
+    return urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--size', type=int, default=SIZE)
+    parser.add_argument('--urls', type=int, default=URLS)
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+    setup()
+
+    from django.test import RequestFactory
+
+    from benchmarks.suite import make_patterns
+    from redirect_urls.audit import audit_urls, parse_url
+    from redirect_urls.middleware import RedirectsMiddleware
+    from redirect_urls.utils import default_resolver, resolve_many, set_redirectpatterns
+
+    set_redirectpatterns(make_patterns(args.size))
+    urls = make_urls(args.size, args.urls)
+    resolver = default_resolver()
+    resolver.warm()
+
+    def middleware():
+        rf = RequestFactory()
+        middleware = RedirectsMiddleware(resolver=resolver)
+        for url in urls:
+            middleware(rf.get(url))
+
+    def batch():
+        requests = ((path, query, None) for path, query in map(parse_url, urls))
+        for _ in resolve_many(requests, resolver):
+            pass
+
+    def audit(processes):
+        return lambda: sum(1 for _ in audit_urls(iter(urls), processes=processes))
+
+    rows = []
+    runs = [('middleware', middleware), ('resolve_many', batch), ('audit_urls x1', audit(1)),
+            ('audit_urls x{}'.format(args.processes), audit(args.processes))]
+    for name, run in runs:
+        start = default_timer()
+        run()
+        elapsed = default_timer() - start
+        rows.append([name, '{:.2f}'.format(elapsed), '{:.0f}'.format(len(urls) / elapsed)])
+
+    print_table(['method', 'seconds', 'urls/s'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Compare resolving paths that miss every redirect pattern with Django's resolver,
+the default redirects resolver, and the combined regex, locale dispatch, and
+sharded options.
+
+    python -m benchmarks.combined
+"""
+
+from benchmarks.common import best_of, print_table, setup
+
+
+SIZES = (1000, 10000, 50000)
+
+
+def make_patterns(size):
+    from redirect_urls.utils import gone, no_redirect, redirect
+
+    patterns = []
+    for i in range(size):
+        kind = i % 4
+        if kind == 0:
+            patterns.append(redirect(r'^section{}/(?P<page>.*)$'.format(i), '/new/{page}'))
+        elif kind == 1:
+            patterns.append(redirect(r'^products/{}/(?P<id>\d+)/?$'.format(i), '/p/{id}/',
+                                     query={'src': 'old'}))
+        elif kind == 2:
+            patterns.append(gone(r'^legacy{}/.*$'.format(i)))
+        else:
+            patterns.append(no_redirect(r'^keep{}/(index\.html)?$'.format(i)))
+
+    return patterns
+
+
+def main():
+    setup()
+
+    from django.urls import Resolver404
+
+    from redirect_urls.resolvers import URLResolver, resolver_pattern
+    from redirect_urls.utils import get_resolver
+
+    def miss(resolver, path):
+        try:
+            resolver.resolve(path)
+        except Resolver404:
+            pass
+
+    rows = []
+    for size in SIZES:
+        patterns = make_patterns(size)
+        resolvers = [
+            URLResolver(resolver_pattern(r'^/'), patterns),
+            get_resolver(patterns),
+            get_resolver(patterns, locale_dispatch=True),
+            get_resolver(patterns, combined=True),
+            get_resolver(patterns, combined=True, locale_dispatch=True),
+            get_resolver(patterns, sharded=True),
+            get_resolver(patterns, combined=True, locale_dispatch=True, sharded=True),
+        ]
+        times = []
+        for resolver in resolvers:
+            # build indexes and compile regexes outside of the timing
+            miss(resolver, '/warm/up/')
+            number = max(1, 20000 // size)
+            times.append(best_of(lambda: miss(resolver, '/en-US/not/redirected/'), number))
+
+        rows.append([size] + ['{:.3f}'.format(t * 1000) for t in times] +
+                    ['{:.1f}x'.format(times[0] / min(times))])
+
+    print_table(['patterns', 'django ms', 'index ms', 'locale ms', 'combined ms',
+                 'both ms', 'sharded ms', 'all ms', 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    main()
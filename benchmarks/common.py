@@ -0,0 +1,26 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Shared setup for the benchmarks. Run them from the repo root with `python -m`."""
+
+import os
+import timeit
+
+import django
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+    django.setup()
+
+
+def best_of(func, number, repeat=5):
+    """Return the best time in seconds for a single call of `func`."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    for row in [headers] + rows:
+        print('  '.join(str(cell).rjust(width) for cell, width in zip(row, widths)))
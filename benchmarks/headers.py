@@ -0,0 +1,121 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Time the header based deciders with and without the shared cache of header
+classifications, for requests whose User-Agents repeat like real traffic does,
+and a decision table against the nested deciders it replaces.
+
+    python -m benchmarks.headers
+"""
+
+import random
+
+from benchmarks.common import best_of, print_table, setup
+from benchmarks.suite import ANDROID_UA, CHROME_UA, FIREFOX_UA, IPHONE_UA
+
+
+REQUESTS = 2000
+# distinct User-Agents, the most common ones are requested most often
+DISTINCT = 300
+
+
+def user_agents():
+    bases = [FIREFOX_UA, CHROME_UA, ANDROID_UA, IPHONE_UA]
+    distinct = [bases[n % len(bases)].replace('Mozilla/5.0', 'Mozilla/5.0 (build {})'.format(n))
+                for n in range(DISTINCT)]
+    rng = random.Random(42)
+    return [distinct[min(int(rng.paretovariate(1.2)) - 1, DISTINCT - 1)]
+            for _ in range(REQUESTS)]
+
+
+def main():
+    setup()
+
+    from django.test import RequestFactory
+
+    from redirect_urls import utils
+    from redirect_urls.cache import ClassificationCache
+
+    rf = RequestFactory()
+    requests = [rf.get('/firefox/', HTTP_USER_AGENT=ua) for ua in user_agents()]
+
+    def make_deciders():
+        # a page with several header based redirects, e.g. on a download page
+        return [
+            utils.is_firefox_redirector('/firefox/', '/other/'),
+            utils.platform_redirector('/desktop/', '/android/', '/ios/'),
+            utils.ua_redirector(r'Windows NT 10', '/win10/', '/other/'),
+        ]
+
+    rows = []
+    for label, size in [('uncached', 0), ('cached', utils.HEADER_CACHE_SIZE)]:
+        utils._header_cache = ClassificationCache(size)
+        deciders = make_deciders()
+
+        def run():
+            for request in requests:
+                for decider in deciders:
+                    decider(request)
+
+        run()
+        per_request = best_of(run, 5) / len(requests)
+        stats = utils._header_cache.stats()
+        rows.append([label, '{:.2f}'.format(per_request * 1e6),
+                     '{:.1%}'.format(stats['hit_rate']), stats['size']])
+
+    print_table(['', 'us per request', 'hit rate', 'cached UAs'], rows)
+    print()
+
+    # routing on the User-Agent, Accept-Language and a cookie
+    import re
+
+    android_re = re.compile('android', re.I)
+    german_re = re.compile('^de', re.I)
+
+    def hand_written(request, *args, **kwargs):
+        if android_re.search(request.META.get('HTTP_USER_AGENT', '')):
+            if german_re.search(request.META.get('HTTP_ACCEPT_LANGUAGE', '')):
+                return '/de/android/'
+            return '/android/'
+        if german_re.search(request.META.get('HTTP_ACCEPT_LANGUAGE', '')):
+            if request.COOKIES.get('beta', '') == '1':
+                return '/de/beta/'
+        return '/firefox/'
+
+    android = utils.ua_redirector('android', True, False)
+    german = utils.header_redirector('accept-language', '^de', True, False)
+    beta = utils.header_redirector('cookie', r'\bbeta=1\b', True, False)
+
+    def nested(request, *args, **kwargs):
+        if android(request):
+            if german(request):
+                return '/de/android/'
+            return '/android/'
+        if german(request) and beta(request):
+            return '/de/beta/'
+        return '/firefox/'
+
+    utils._header_cache = ClassificationCache(utils.HEADER_CACHE_SIZE)
+    table = utils.decision_redirector([
+        ({'user-agent': 'android', 'accept-language': '^de'}, '/de/android/'),
+        ({'user-agent': 'android'}, '/android/'),
+        ([('accept-language', '^de'), ('cookie:beta', '^1$')], '/de/beta/'),
+    ], '/firefox/')
+    for n, request in enumerate(requests):
+        request.META['HTTP_ACCEPT_LANGUAGE'] = 'de-DE,de;q=0.8' if n % 3 else 'en-US,en;q=0.5'
+
+    rows = []
+    for label, decider in [('hand written regexes', hand_written),
+                           ('nested deciders', nested),
+                           ('decision table', table)]:
+        assert [decider(r) for r in requests] == [hand_written(r) for r in requests]
+        per_request = best_of(lambda: [decider(r) for r in requests], 5) / len(requests)
+        rows.append([label, '{:.2f}'.format(per_request * 1e6)])
+
+    print_table(['', 'us per request'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Measure the memory used by redirect patterns with tracemalloc: once they are
+defined, once the resolver is warmed up, and once every one of them matched a
+request. A mix of exact path, regex, query and header dependent redirects is
+created for each size, in a new process.
+
+    python -m benchmarks.memory
+    python -m benchmarks.memory --sizes 1000 10000
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import gc
+import json
+import subprocess
+import sys
+import tracemalloc
+
+from benchmarks.common import print_table, setup
+
+
+SIZES = (1000, 10000, 50000)
+
+
+def make_patterns(size):
+    from redirect_urls.utils import redirect
+
+    patterns, paths = [], []
+    for i in range(size):
+        kind = i % 10
+        if kind < 6:
+            patterns.append(redirect(r'^legacy/{}/page\.html$'.format(i), '/new/{}/'.format(i)))
+            paths.append('/legacy/{}/page.html'.format(i))
+        elif kind < 8:
+            patterns.append(redirect(r'^legacy/{}/(?P<page>[\w-]+)/$'.format(i),
+                                     '/new/{}/{{page}}/'.format(i)))
+            paths.append('/legacy/{}/some-page/'.format(i))
+        elif kind == 8:
+            patterns.append(redirect(r'^promo/{}/$'.format(i), '/promo/', permanent=False,
+                                     query={'utm_campaign': str(i)}, cache_timeout=None))
+            paths.append('/promo/{}/'.format(i))
+        else:
+            patterns.append(redirect(r'^download/{}/$'.format(i), '/new/{}/'.format(i),
+                                     vary='User-Agent'))
+            paths.append('/download/{}/'.format(i))
+
+    return patterns, paths
+
+
+def traced_kb():
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0] / 1024
+
+
+def child(size):
+    setup()
+
+    from django.test import RequestFactory
+
+    from redirect_urls.utils import get_resolver
+
+    rf = RequestFactory()
+    tracemalloc.start()
+    before = traced_kb()
+    patterns, paths = make_patterns(size)
+    defined = traced_kb()
+    resolver = get_resolver(patterns)
+    resolver.warm()
+    warmed = traced_kb()
+    # each pattern on its own, trying them all in order for every path takes too long
+    for url_pattern, path in zip(patterns, paths):
+        match = url_pattern.resolve(path[1:])
+        response = match.func(rf.get(path), *match.args, **match.kwargs)
+        assert response.status_code in (301, 302), path
+
+    served = traced_kb()
+    print(json.dumps({'defined': defined - before, 'warmed': warmed - before,
+                      'served': served - before}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child)
+
+    rows = []
+    for size in args.sizes:
+        output = subprocess.check_output([sys.executable, '-m', 'benchmarks.memory',
+                                          '--child', str(size)])
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        row = [size]
+        for stage in ('defined', 'warmed', 'served'):
+            row.append('{:.1f} / {:.0f}'.format(result[stage] / 1024,
+                                                result[stage] * 1024 / size))
+        rows.append(row)
+
+    print_table(['size', 'defined MB / B each', 'warmed MB / B each', 'served MB / B each'],
+                rows)
+
+
+if __name__ == '__main__':
+    main()
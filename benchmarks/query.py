@@ -0,0 +1,98 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Time the query strings of `redirect()` with a `query`, merged with campaign query
+strings full of utm params like those of most redirected requests, and compare
+them with encoding everything on every request as before.
+
+    python -m benchmarks.query
+"""
+
+from benchmarks.common import best_of, print_table, setup
+
+
+NUMBER = 5000
+QUERY = {'utm_source': 'mozilla.org', 'utm_medium': 'referral', 'utm_campaign': 'legacy'}
+QUERY_STRINGS = [
+    ('empty', ''),
+    ('short', 'lang=de'),
+    ('utm', 'utm_source=newsletter&utm_medium=email&utm_campaign=fall-2019_launch'
+            '&utm_content=hero-cta&utm_term=firefox.browser'),
+    ('utm escaped', 'utm_source=partner%20site&utm_medium=cpc&utm_campaign=Spring+Sale+2020'
+                    '&utm_content=banner%2F728x90&gclid=EAIaIQobChMI8r2-xvbp5QIVgbHtCh0'),
+    ('utm long', '&'.join(['utm_source=social', 'utm_medium=paid-social',
+                           'utm_campaign=firefox-quantum_launch_2017-11-14_global',
+                           'utm_content=video-ad_variant-b_30s', 'utm_term=fast-browser',
+                           'fbclid=IwAR2x7b5c9WQ_7bKJZk3Y1qRkL0m4nYpV-8sQe6tUo1dJfGhXcAzMwE',
+                           'ref=homepage', 'entrypoint=campaign-page'] * 3)),
+]
+
+
+def legacy_merge(querystring, query):
+    """How a request query string was merged with `query` on every request before."""
+    try:
+        from urllib.parse import parse_qs, urlencode
+    except ImportError:
+        from urllib import urlencode
+        from urlparse import parse_qs
+
+    merged = parse_qs(querystring)
+    merged.update(query)
+    return urlencode(merged, doseq=True)
+
+
+def main():
+    setup()
+
+    from django.test import RequestFactory, override_settings
+
+    try:
+        from urllib.parse import urlencode
+    except ImportError:
+        from urllib import urlencode
+
+    from redirect_urls.utils import merge_query_string, redirect
+
+    merging = redirect(r'^iam/the/(?P<name>\w+)/$', '/donnie/the/{name}/', query=QUERY,
+                       merge_query=True)
+    params = merging._query_params
+    rows = [['static query', '{:.2f}'.format(best_of(lambda: urlencode(QUERY, doseq=True),
+                                                     NUMBER) * 1e6), '0.00']]
+    for label, querystring in QUERY_STRINGS:
+        assert merge_query_string(querystring, params) == legacy_merge(querystring, QUERY)
+        legacy = best_of(lambda: legacy_merge(querystring, QUERY), NUMBER)
+        # the view skips the merge for requests without a query string
+        merged = 0.0
+        if querystring:
+            merged = best_of(lambda: merge_query_string(querystring, params), NUMBER)
+        rows.append(['merge ' + label, '{:.2f}'.format(legacy * 1e6),
+                     '{:.2f}'.format(merged * 1e6)])
+
+    print_table(['query string', 'per request us', 'pre-encoded us'], rows)
+    print()
+
+    # every campaign click has a query string of its own, so the location cache misses
+    rf = RequestFactory()
+    kwargs = {'locale': 'de/', 'name': 'walrus'}
+    with override_settings(REDIRECT_URLS_STATIC_CACHE_SIZE=0):
+        views = [
+            ('static query', redirect(r'^iam/the/(?P<name>\w+)/$', '/donnie/the/{name}/',
+                                      query=QUERY)),
+            ('merged query', redirect(r'^iam/the/(?P<name>\w+)/$', '/donnie/the/{name}/',
+                                      query=QUERY, merge_query=True)),
+        ]
+
+    rows = []
+    for label, pattern in views:
+        for query_label, querystring in QUERY_STRINGS:
+            request = rf.get('/de/iam/the/walrus/?' + querystring)
+            view_time = best_of(lambda: pattern(request, **kwargs), NUMBER)
+            rows.append(['{} {}'.format(label, query_label), '{:.2f}'.format(view_time * 1e6)])
+
+    print_table(['view', 'us'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Time resolving a path matched by a pattern near the end of the table of
+`benchmarks.suite` before and after promoting the most matched patterns, and
+how long the promotion takes.
+
+    python -m benchmarks.reorder
+"""
+
+from timeit import default_timer
+
+from benchmarks.common import best_of, print_table, setup
+from benchmarks.suite import make_patterns
+
+
+SIZES = (1000, 10000, 100000)
+OPTIONS = (
+    ('default', {}),
+    ('fastest', {'combined': True, 'locale_dispatch': True, 'sharded': True}),
+)
+
+
+def main():
+    setup()
+
+    from redirect_urls.utils import get_resolver
+
+    rows = []
+    for size in SIZES:
+        patterns = make_patterns(size)
+        # the last of the redirects that only match the docs pages they are for
+        position = size - 10
+        path = '/de/docs{}/intro/'.format(position)
+        # most patterns have been matched now and then, one of them a lot
+        hits = dict((url_pattern, 1) for url_pattern in patterns[:size // 2])
+        hits[patterns[position]] = 100
+        for label, options in OPTIONS:
+            resolver = get_resolver(patterns, hot_size=16, **options)
+            resolver.resolve(path)
+            before = best_of(lambda: resolver.resolve(path), max(1, 10000 // size))
+
+            start = default_timer()
+            resolver.reorder(hits)
+            first = default_timer() - start
+            start = default_timer()
+            resolver.reorder(hits)
+            again = default_timer() - start
+
+            after = best_of(lambda: resolver.resolve(path), 10000)
+            rows.append([size, label,
+                         '{:.1f}'.format(before * 1e6),
+                         '{:.1f}'.format(after * 1e6),
+                         '{:.0f}'.format(first * 1e3),
+                         '{:.1f}'.format(again * 1e3)])
+
+    print_table(['size', 'resolver', 'before us', 'promoted us', 'first reorder ms',
+                 'reorder ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
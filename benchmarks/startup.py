@@ -0,0 +1,139 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Time the startup of a list of redirects and the first requests of a forked worker,
+without warming up, with `warm_redirects()` before the fork, and with
+`warm_redirects(freeze=True)`. Each is run in a new process, which reports the
+time to create the patterns, to warm them up, the latency of the first miss and
+hit in the worker, and how much memory the worker no longer shares with its
+parent after those requests and a garbage collection (Linux only).
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --sizes 1000 10000
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+from timeit import default_timer
+
+from benchmarks.common import print_table, setup
+
+
+SIZES = (1000, 10000)
+MODES = ('lazy', 'warm', 'freeze')
+# one in this many patterns is a regex, the others are exact paths
+REGEX_EVERY = 5
+
+
+def private_kb():
+    """Return the memory of this process that isn't shared with others, or None."""
+    try:
+        with open('/proc/self/smaps_rollup') as fp:
+            lines = fp.readlines()
+    except IOError:
+        return None
+
+    return sum(int(line.split()[1]) for line in lines if line.startswith('Private_'))
+
+
+def make_patterns(size):
+    from redirect_urls.utils import redirect
+
+    patterns = []
+    for i in range(size):
+        if i % REGEX_EVERY:
+            patterns.append(redirect(r'^legacy/{}/page\.html$'.format(i), '/new/{}/'.format(i)))
+        else:
+            patterns.append(redirect(r'^legacy/{}/(?P<page>[\w-]+)/$'.format(i),
+                                     '/new/{}/{{page}}/'.format(i)))
+
+    return patterns
+
+
+def worker(middleware, size, write_fd):
+    from django.test import RequestFactory
+
+    rf = RequestFactory()
+    miss = rf.get('/not/a/redirect/')
+    hit = rf.get('/legacy/{}/page/'.format((size - 1) // REGEX_EVERY * REGEX_EVERY))
+    start = default_timer()
+    middleware(miss)
+    first_miss = default_timer() - start
+    start = default_timer()
+    response = middleware(hit)
+    first_hit = default_timer() - start
+    assert response.status_code == 301
+    gc.collect()
+    with os.fdopen(write_fd, 'w') as fp:
+        json.dump({'first_miss': first_miss, 'first_hit': first_hit,
+                   'private_kb': private_kb()}, fp)
+
+
+def child(mode, size):
+    setup()
+
+    from redirect_urls.middleware import RedirectsMiddleware
+    from redirect_urls.utils import register, warm_redirects
+
+    start = default_timer()
+    register(make_patterns(size))
+    define = default_timer() - start
+    middleware = RedirectsMiddleware()
+    start = default_timer()
+    if mode != 'lazy':
+        warm_redirects(freeze=mode == 'freeze')
+    warm = default_timer() - start
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if not pid:
+        os.close(read_fd)
+        try:
+            worker(middleware, size, write_fd)
+        finally:
+            os._exit(0)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as fp:
+        result = json.load(fp)
+    os.waitpid(pid, 0)
+    result.update(define=define, warm=warm)
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        mode, size = args.child
+        return child(mode, int(size))
+
+    rows = []
+    for size in args.sizes:
+        for mode in MODES:
+            output = subprocess.check_output([sys.executable, '-m', 'benchmarks.startup',
+                                              '--child', mode, str(size)])
+            result = json.loads(output.decode().strip().splitlines()[-1])
+            private = result['private_kb']
+            rows.append([size, mode, '{:.3f}'.format(result['define']),
+                         '{:.3f}'.format(result['warm']),
+                         '{:.2f}'.format(result['first_miss'] * 1e3),
+                         '{:.2f}'.format(result['first_hit'] * 1e3),
+                         'n/a' if private is None else '{:.1f}'.format(private / 1024)])
+
+    print_table(['size', 'mode', 'define s', 'warm s', 'first miss ms', 'first hit ms',
+                 'worker private MB'], rows)
+
+
+if __name__ == '__main__':
+    main()
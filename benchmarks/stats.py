@@ -0,0 +1,75 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Measure the overhead of the per-pattern stats on `RedirectsMiddleware`, using the
+tables and requests of `benchmarks.suite`. The fastest resolver options make for
+the biggest relative overhead.
+
+    python -m benchmarks.stats
+"""
+
+from benchmarks.common import best_of, print_table, setup
+from benchmarks.suite import PASSED, make_patterns, make_scenarios
+
+
+SIZES = (100, 1000, 10000)
+REPEAT = 30
+OPTIONS = (
+    ('default', {}),
+    ('fastest', {'combined': True, 'locale_dispatch': True, 'sharded': True}),
+)
+
+
+def main():
+    setup()
+
+    from redirect_urls.middleware import RedirectsMiddleware
+    from redirect_urls.stats import RedirectStats
+    from redirect_urls.utils import get_resolver
+
+    rows = []
+    for size in SIZES:
+        patterns = make_patterns(size)
+        scenarios = make_scenarios(size)
+        for label, options in OPTIONS:
+            resolver = get_resolver(patterns, **options)
+            middlewares = [
+                RedirectsMiddleware(lambda request: PASSED, resolver=resolver),
+                RedirectsMiddleware(lambda request: PASSED, resolver=resolver,
+                                    stats=RedirectStats()),
+            ]
+            for scenario, cases in scenarios:
+                requests = [request for request, check in cases]
+                runs = []
+                for middleware in middlewares:
+                    def run(middleware=middleware):
+                        for request in requests:
+                            middleware(request)
+
+                    run()
+                    runs.append(run)
+
+                # alternate between the two so that noise affects both alike
+                number = max(1, 2000 // size)
+                times = [min(t) / len(requests) for t in zip(*[
+                    [best_of(run, number, repeat=1) for run in runs] for _ in range(REPEAT)
+                ])]
+                rows.append([size, label, scenario,
+                             '{:.2f}'.format(times[0] * 1e6),
+                             '{:.2f}'.format(times[1] * 1e6),
+                             '{:+.2f}'.format((times[1] - times[0]) * 1e6),
+                             '{:+.1f}%'.format((times[1] / times[0] - 1) * 100)])
+
+    print_table(['size', 'resolver', 'scenario', 'off us', 'on us', 'added us', 'overhead'],
+                rows)
+
+    stats = RedirectStats()
+    record = best_of(lambda: stats.record('^dude/$', 1e-5, 1e-4), 100000)
+    print()
+    print('recording one request: {:.2f} us'.format(record * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Measure `RedirectsMiddleware` on synthetic redirect tables of increasing size.
+
+Each table mixes `redirect`, `gone`, `no_redirect`, `ua_redirector` and
+`platform_redirector` entries. For every size the suite times requests that hit
+a redirect, miss every pattern, merge the request query string, and redirect
+based on the User-Agent header, and reports p50/p99 latency and throughput.
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --sizes 100 1000 --output results.json
+    python -m benchmarks.suite --options '{"combined": true}' --compare results.json
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import json
+import platform
+import sys
+import time
+from itertools import cycle
+from timeit import default_timer
+
+from benchmarks.common import print_table, setup
+
+
+SIZES = (100, 1000, 10000, 100000)
+# each table repeats these kinds of entries in this order
+KINDS = ('redirect', 'redirect', 'redirect', 'redirect', 'redirect',
+         'query', 'gone', 'no_redirect', 'ua', 'platform')
+# where in the table the hit requests land, as fractions of its length
+POSITIONS = (0.1, 0.5, 0.9)
+
+FIREFOX_UA = 'Mozilla/5.0 (Windows NT 10.0; rv:68.0) Gecko/20100101 Firefox/68.0'
+CHROME_UA = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+             '(KHTML, like Gecko) Chrome/76.0.3809.100 Safari/537.36')
+ANDROID_UA = 'Mozilla/5.0 (Android 9; Mobile; rv:68.0) Gecko/68.0 Firefox/68.0'
+IPHONE_UA = ('Mozilla/5.0 (iPhone; CPU iPhone OS 12_4 like Mac OS X) '
+             'AppleWebKit/605.1.15 (KHTML, like Gecko) FxiOS/18.0 Mobile/15E148 Safari/605.1.15')
+
+
+def make_patterns(size):
+    from redirect_urls.utils import (gone, no_redirect, platform_redirector, redirect,
+                                     ua_redirector)
+
+    patterns = []
+    for i in range(size):
+        kind = KINDS[i % len(KINDS)]
+        if kind == 'redirect':
+            patterns.append(redirect(r'^docs{}/(?P<page>[\w/-]*)$'.format(i),
+                                     '/learn/{}/{{page}}'.format(i)))
+        elif kind == 'query':
+            patterns.append(redirect(r'^campaign{}/?$'.format(i), '/landing/{}/'.format(i),
+                                     query={'utm_source': 'legacy'}, merge_query=True))
+        elif kind == 'gone':
+            patterns.append(gone(r'^retired{}/.*$'.format(i)))
+        elif kind == 'no_redirect':
+            patterns.append(no_redirect(r'^keep{}/(index\.html)?$'.format(i)))
+        elif kind == 'ua':
+            patterns.append(redirect(r'^download{}/?$'.format(i),
+                                     ua_redirector('firefox', '/firefox/new/', '/browsers/'),
+                                     permanent=False))
+        else:
+            patterns.append(redirect(r'^mobile{}/?$'.format(i),
+                                     platform_redirector('/desktop/', '/android/', '/ios/'),
+                                     permanent=False))
+
+    return patterns
+
+
+def entries(size, kind):
+    """Return indices of entries of `kind` spread over a table of `size`."""
+    offset = KINDS.index(kind)
+    count = (size - offset + len(KINDS) - 1) // len(KINDS)
+    return sorted(set(offset + len(KINDS) * int(pos * (count - 1)) for pos in POSITIONS))
+
+
+def make_scenarios(size):
+    """
+    Return a list of (scenario, [(request, check)]) where each check is a function
+    of the response that confirms the middleware did what the scenario expects.
+    """
+    from django.test import RequestFactory
+
+    rf = RequestFactory()
+
+    def location(status, expected):
+        return lambda response: (response.status_code == status and
+                                 response['Location'] == expected)
+
+    def passed(response):
+        return response is PASSED
+
+    hits = []
+    for i in entries(size, 'redirect'):
+        hits.append((rf.get('/docs{}/intro/'.format(i)),
+                     location(301, '/learn/{}/intro/'.format(i))))
+        hits.append((rf.get('/de/docs{}/intro/'.format(i)),
+                     location(301, '/de/learn/{}/intro/'.format(i))))
+    for i in entries(size, 'gone'):
+        hits.append((rf.get('/retired{}/page.html'.format(i)),
+                     lambda response: response.status_code == 410))
+
+    misses = [
+        (rf.get('/en-US/not/redirected/'), passed),
+        (rf.get('/docs/intro/'), passed),
+        (rf.get('/fr/firefox/new/'), passed),
+    ]
+    for i in entries(size, 'no_redirect'):
+        # the middleware returns what the no_redirect view returns
+        misses.append((rf.get('/keep{}/'.format(i)), lambda response: response is None))
+
+    queries = []
+    for i in entries(size, 'query'):
+        queries.append((rf.get('/campaign{}/'.format(i), {'utm_campaign': 'fall'}),
+                        location(301, '/landing/{}/?utm_campaign=fall&utm_source=legacy'
+                                      .format(i))))
+        queries.append((rf.get('/en-US/campaign{}'.format(i), {'id': '12'}),
+                        location(301, '/en-US/landing/{}/?id=12&utm_source=legacy'
+                                      .format(i))))
+
+    headers = []
+    for i in entries(size, 'ua'):
+        for ua, expected in ((FIREFOX_UA, '/firefox/new/'), (CHROME_UA, '/browsers/')):
+            headers.append((rf.get('/download{}/'.format(i), HTTP_USER_AGENT=ua),
+                            location(302, expected)))
+    for i in entries(size, 'platform'):
+        for ua, expected in ((CHROME_UA, '/desktop/'), (ANDROID_UA, '/android/'),
+                             (IPHONE_UA, '/ios/')):
+            headers.append((rf.get('/mobile{}/'.format(i), HTTP_USER_AGENT=ua),
+                            location(302, expected)))
+
+    return [('hit', hits), ('miss', misses), ('query_merge', queries), ('header', headers)]
+
+
+# returned by the next "middleware" when no redirect matches
+PASSED = object()
+
+
+def percentile(sorted_values, pct):
+    index = int(round(pct / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def measure(middleware, requests, number):
+    """Call the middleware `number` times cycling through `requests`."""
+    timer = default_timer
+    call = middleware.__call__
+    latencies = []
+    append = latencies.append
+    requests = cycle(requests)
+    for _ in range(number):
+        request = next(requests)
+        start = timer()
+        call(request)
+        append(timer() - start)
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        'requests': number,
+        'p50_us': round(percentile(latencies, 50) * 1e6, 2),
+        'p99_us': round(percentile(latencies, 99) * 1e6, 2),
+        'mean_us': round(total / number * 1e6, 2),
+        'throughput_rps': round(number / total, 1),
+    }
+
+
+def run(sizes, options, budget, miss_cache_size):
+    from redirect_urls.middleware import RedirectsMiddleware
+    from redirect_urls.utils import get_resolver
+
+    results = []
+    for size in sizes:
+        patterns = make_patterns(size)
+        build_start = default_timer()
+        middleware = RedirectsMiddleware(lambda request: PASSED,
+                                         resolver=get_resolver(patterns, **options),
+                                         miss_cache_size=miss_cache_size)
+        # the first resolve builds any pattern index
+        middleware.resolve('/build/')
+        results.append({'size': size, 'scenario': 'build',
+                        'seconds': round(default_timer() - build_start, 4)})
+
+        for scenario, cases in make_scenarios(size):
+            # also fills the view caches before timing
+            for request, check in cases:
+                if not check(middleware(request)):
+                    raise AssertionError('unexpected response in {} scenario for {}'
+                                         .format(scenario, request.get_full_path()))
+
+            # fewer calls for the bigger tables so each size takes about as long
+            number = max(len(cases) * 10, min(20000, budget // size))
+            result = measure(middleware, [request for request, check in cases], number)
+            result.update(size=size, scenario=scenario)
+            results.append(result)
+
+    return results
+
+
+def metadata(options, miss_cache_size):
+    import django
+
+    import redirect_urls
+
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'django': django.get_version(),
+        'redirect_urls': redirect_urls.__version__,
+        'machine': platform.machine(),
+        'resolver_options': options,
+        'miss_cache_size': miss_cache_size,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Return rows comparing `results` with the `baseline` results and whether any
+    p50 latency got slower than `threshold` times the baseline. The p99 ratio is
+    shown but is too noisy on a shared machine to fail a run.
+    """
+    previous = dict(((r['size'], r['scenario']), r) for r in baseline['results'])
+    rows = []
+    regressed = False
+    for result in results:
+        old = previous.get((result['size'], result['scenario']))
+        if old is None or 'p50_us' not in result:
+            continue
+
+        ratios = [result[key] / old[key] if old[key] else 1.0 for key in ('p50_us', 'p99_us')]
+        slower = ratios[0] > threshold
+        regressed = regressed or slower
+        rows.append([result['size'], result['scenario'],
+                     old['p50_us'], result['p50_us'], '{:.2f}x'.format(ratios[0]),
+                     old['p99_us'], result['p99_us'], '{:.2f}x'.format(ratios[1]),
+                     'SLOWER' if slower else ''])
+
+    return rows, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help='number of entries in each redirect table')
+    parser.add_argument('--options', type=json.loads, default={},
+                        help='JSON object of options for get_resolver()')
+    parser.add_argument('--miss-cache-size', type=int, default=0,
+                        help='size of the middleware miss cache, off by default')
+    parser.add_argument('--budget', type=int, default=2000000,
+                        help='calls per scenario times table size, capped at 20000 calls')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='JSON results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='p50 slowdown ratio over the baseline counted as a regression')
+    args = parser.parse_args(argv)
+
+    setup()
+
+    results = run(args.sizes, args.options, args.budget, args.miss_cache_size)
+    print_table(['size', 'scenario', 'p50 us', 'p99 us', 'mean us', 'req/s'],
+                [[r['size'], r['scenario'], r['p50_us'], r['p99_us'], r['mean_us'],
+                  r['throughput_rps']] for r in results if 'p50_us' in r])
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump({'meta': metadata(args.options, args.miss_cache_size),
+                       'results': results}, fp, indent=2, sort_keys=True)
+            fp.write('\n')
+
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+
+        rows, regressed = compare(results, baseline, args.threshold)
+        print()
+        print_table(['size', 'scenario', 'old p50', 'p50', 'ratio',
+                     'old p99', 'p99', 'ratio', ''], rows)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
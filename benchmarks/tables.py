@@ -0,0 +1,111 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Compare the startup time and memory of a table of exact path redirects written as
+`redirect()` calls and loaded from a CSV file with `redirect_table()`. Each one is
+built in a new process, which reports the time to create the patterns and build
+the resolver index, how much the peak RSS grew, and the latency of a first and a
+repeated hit.
+
+    python -m benchmarks.tables
+    python -m benchmarks.tables --sizes 1000 100000
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+from timeit import default_timer
+
+from benchmarks.common import best_of, print_table, setup
+
+
+SIZES = (1000, 10000, 100000)
+KINDS = ('redirect', 'table')
+
+
+def rss_kb():
+    # kilobytes on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def write_csv(filename, size):
+    with open(filename, 'w') as fp:
+        fp.write('path,to,status\n')
+        for i in range(size):
+            fp.write('/legacy/{}/page.html,/new/{}/,301\n'.format(i, i))
+
+
+def child(kind, size, filename):
+    setup()
+
+    from django.test import RequestFactory
+
+    from redirect_urls.middleware import RedirectsMiddleware
+    from redirect_urls.tables import redirect_table
+    from redirect_urls.utils import get_resolver, redirect
+
+    requests = [RequestFactory().get('/legacy/{}/page.html'.format(i))
+                for i in (size // 3, size // 2)]
+    before = rss_kb()
+    start = default_timer()
+    if kind == 'redirect':
+        patterns = [redirect(r'^legacy/{}/page\.html$'.format(i), '/new/{}/'.format(i))
+                    for i in range(size)]
+    else:
+        patterns = [redirect_table(filename)]
+
+    resolver = get_resolver(patterns)
+    resolver.warm()
+    startup = default_timer() - start
+    rss = rss_kb() - before
+
+    middleware = RedirectsMiddleware(resolver=resolver)
+    start = default_timer()
+    middleware(requests[0])
+    first_hit = default_timer() - start
+    hit = best_of(lambda: middleware(requests[1]), 1000)
+    print(json.dumps({'startup': startup, 'rss_kb': rss, 'first_hit': first_hit, 'hit': hit}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--child', nargs=3, metavar=('KIND', 'SIZE', 'FILE'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        kind, size, filename = args.child
+        return child(kind, int(size), filename)
+
+    directory = tempfile.mkdtemp()
+    rows = []
+    try:
+        for size in args.sizes:
+            filename = os.path.join(directory, 'redirects{}.csv'.format(size))
+            write_csv(filename, size)
+            for kind in KINDS:
+                output = subprocess.check_output([sys.executable, '-m', 'benchmarks.tables',
+                                                  '--child', kind, str(size), filename])
+                result = json.loads(output.decode().strip().splitlines()[-1])
+                rows.append([size, kind, '{:.3f}'.format(result['startup']),
+                             '{:.1f}'.format(result['rss_kb'] / 1024),
+                             '{:.1f}'.format(result['first_hit'] * 1e6),
+                             '{:.1f}'.format(result['hit'] * 1e6)])
+    finally:
+        shutil.rmtree(directory)
+
+    print_table(['size', 'source', 'startup s', 'rss MB', 'first hit us', 'hit us'], rows)
+
+
+if __name__ == '__main__':
+    main()
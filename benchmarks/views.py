@@ -0,0 +1,88 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Time the views created by `redirect()` for a few common kinds of redirects.
+
+    python -m benchmarks.views
+"""
+
+from benchmarks.common import best_of, print_table, setup
+
+
+NUMBER = 20000
+
+
+def legacy_url(to_value, args, kwargs, prepend_locale=True):
+    """How the destination URL was computed on every request before `Destination`."""
+    from django.urls import NoReverseMatch, reverse
+    from django.utils.encoding import force_text
+    from django.utils.html import strip_tags
+
+    from redirect_urls.utils import HTTP_RE
+
+    if to_value.startswith('/') or HTTP_RE.match(to_value):
+        redirect_url = to_value
+    else:
+        try:
+            redirect_url = reverse(to_value)
+        except NoReverseMatch:
+            redirect_url = to_value
+
+    if prepend_locale and redirect_url.startswith('/') and kwargs.get('locale'):
+        redirect_url = '/{locale}' + redirect_url.lstrip('/')
+
+    if args or kwargs:
+        redirect_url = strip_tags(force_text(redirect_url).format(*args, **kwargs))
+
+    return redirect_url
+
+
+def main():
+    setup()
+
+    from django.test import RequestFactory, override_settings
+
+    from redirect_urls.utils import Destination, redirect
+
+    rf = RequestFactory()
+    request = rf.get('/de/iam/the/walrus/')
+    kwargs = {'locale': 'de/', 'name': 'walrus'}
+
+    rows = []
+    destination = Destination()
+    for label, to in [('path', '/donnie/the/{name}/'), ('url name', 'donnie.the')]:
+        legacy = best_of(lambda: legacy_url(to, [], kwargs), NUMBER)
+        compiled = best_of(lambda: destination.url(to, [], kwargs), NUMBER)
+        rows.append(['destination ' + label,
+                     '{:.2f}'.format(legacy * 1e6),
+                     '{:.2f}'.format(compiled * 1e6)])
+
+    print_table(['', 'per request us', 'compiled us'], rows)
+    print()
+
+    def decider(request, *args, **kwargs):
+        return '/donnie/the/{name}/'
+
+    views = [
+        ('static', redirect(r'^iam/the/(?P<name>\w+)/$', '/donnie/the/{name}/')),
+        ('static query', redirect(r'^iam/the/(?P<name>\w+)/$', '/donnie/the/{name}/',
+                                  query={'utm_source': 'walrus'})),
+        ('callable', redirect(r'^iam/the/(?P<name>\w+)/$', decider)),
+    ]
+    with override_settings(REDIRECT_URLS_STATIC_CACHE_SIZE=0):
+        views.append(('static uncached',
+                      redirect(r'^iam/the/(?P<name>\w+)/$', '/donnie/the/{name}/')))
+
+    rows = []
+    for label, pattern in views:
+        view = pattern.callback
+        view_time = best_of(lambda: view(request, **kwargs), NUMBER)
+        rows.append([label, '{:.2f}'.format(view_time * 1e6)])
+
+    print_table(['view', 'us'], rows)
+
+
+if __name__ == '__main__':
+    main()
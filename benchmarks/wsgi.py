@@ -0,0 +1,73 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Compare a Django WSGI application with `RedirectsMiddleware` to the same
+application wrapped with `redirect_urls.wsgi.RedirectsApplication`, using the
+tables of `benchmarks.suite`. Requests that aren't redirected end in a 404.
+
+    python -m benchmarks.wsgi
+"""
+
+from benchmarks.common import best_of, print_table, setup
+from benchmarks.suite import CHROME_UA, make_patterns
+
+
+SIZES = (100, 1000, 10000)
+
+
+def scenario_environs(size):
+    from django.test import RequestFactory
+
+    rf = RequestFactory()
+    return [
+        ('hit', [rf.get('/docs{}/intro/'.format(i)).environ for i in range(0, size, 100)]),
+        ('gone', [rf.get('/retired{}/page.html'.format(i)).environ
+                  for i in range(6, size, 100)]),
+        ('header', [rf.get('/download{}/'.format(i), HTTP_USER_AGENT=CHROME_UA).environ
+                    for i in range(8, size, 100)]),
+        ('miss', [rf.get('/en-US/not/redirected/').environ]),
+    ]
+
+
+def main():
+    setup()
+
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import override_settings
+
+    from redirect_urls.utils import redirectpatterns
+    from redirect_urls.wsgi import RedirectsApplication
+
+    def start_response(status, headers):
+        pass
+
+    rows = []
+    with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'],
+                           MIDDLEWARE=['redirect_urls.middleware.RedirectsMiddleware']):
+        for size in SIZES:
+            redirectpatterns[:] = make_patterns(size)
+            django_app = WSGIHandler()
+            applications = [django_app, RedirectsApplication(django_app)]
+            for scenario, environs in scenario_environs(size):
+                row = [size, scenario]
+                for application in applications:
+                    # the wrapper adds to the environ, keep the runs apart
+                    copies = [environ.copy() for environ in environs]
+
+                    def run():
+                        for environ in copies:
+                            application(environ, start_response)
+
+                    run()
+                    row.append('{:.2f}'.format(best_of(run, max(1, 200 // len(copies)))
+                                               / len(copies) * 1e6))
+                rows.append(row)
+
+    del redirectpatterns[:]
+    print_table(['size', 'scenario', 'middleware us', 'wsgi wrapper us'], rows)
+
+
+if __name__ == '__main__':
+    main()
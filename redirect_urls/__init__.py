@@ -1,4 +1,5 @@
 from redirect_urls.utils import (
+    decision_redirector,
     gone,
     header_redirector,
     is_firefox_redirector,
@@ -6,7 +7,10 @@ from redirect_urls.utils import (
     platform_redirector,
     redirect,
     ua_redirector,
+    warm_redirects,
 )
+from redirect_urls.database import database_redirects
+from redirect_urls.tables import redirect_table
 
 
 __version__ = '1.0'
@@ -0,0 +1,15 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from django.contrib import admin
+
+from redirect_urls.models import Redirect
+
+
+@admin.register(Redirect)
+class RedirectAdmin(admin.ModelAdmin):
+    list_display = ('pattern', 'to', 'permanent', 'gone', 'order', 'enabled')
+    list_editable = ('order', 'enabled')
+    list_filter = ('enabled', 'permanent', 'gone')
+    search_fields = ('pattern', 'to')
@@ -1,6 +1,10 @@
-from django.apps import AppConfig, apps
-from django.utils.module_loading import import_string
+from django.apps import AppConfig
+from django.conf import settings
 
+from redirect_urls.chains import collapse_chains
+from redirect_urls.database import database_redirects
+from redirect_urls.reload import RedirectsReloader, redirects_modules
+from redirect_urls.tables import redirect_table
 from redirect_urls.utils import register
 
 
@@ -9,10 +13,20 @@ class RedirectsConfig(AppConfig):
     label = 'Redirect URLs'
 
     def ready(self):
-        for app in apps.get_app_configs():
-            try:
-                patterns = import_string(app.name + '.redirects.redirectpatterns')
-            except ImportError:
-                continue
+        modules = redirects_modules()
+        for module in modules:
+            register(module.redirectpatterns)
 
-            register(patterns)
+        # after the patterns of the apps
+        register(redirect_table(filename)
+                 for filename in getattr(settings, 'REDIRECT_URLS_DATA_FILES', ()))
+        if getattr(settings, 'REDIRECT_URLS_DATABASE', False):
+            register([database_redirects()])
+
+        if getattr(settings, 'REDIRECT_URLS_COLLAPSE_CHAINS', False):
+            collapse_chains()
+
+        interval = getattr(settings, 'REDIRECT_URLS_RELOAD_INTERVAL', None)
+        if interval:
+            self.reloader = RedirectsReloader(modules, interval)
+            self.reloader.start()
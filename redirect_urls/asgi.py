@@ -0,0 +1,83 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Async support for `RedirectsMiddleware`.
+
+Under ASGI Django 3.1+ hands an async capable middleware an async `get_response`
+and awaits whatever it returns. Matching and building a redirect is pure CPU
+work, so the middleware does it right in the event loop and only awaits the
+next handler for the requests it doesn't redirect. This saves the thread pool
+hop `sync_to_async` would add to every request. Only the checks of database
+redirects for changes, every `REDIRECT_URLS_DATABASE_INTERVAL` seconds, run in
+the thread pool, since Django refuses queries in the event loop.
+
+This module needs Python 3.5+ and is only imported by the middleware there.
+"""
+
+import asyncio
+
+try:
+    from asgiref.sync import sync_to_async
+except ImportError:
+    # no asgiref with Django < 3.0, which doesn't refuse queries in the event loop
+    sync_to_async = None
+
+try:
+    from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+except ImportError:
+    # asgiref < 3.6, or none at all with Django < 3.0
+    iscoroutinefunction = asyncio.iscoroutinefunction
+
+    def markcoroutinefunction(func):
+        func._is_coroutine = asyncio.coroutines._is_coroutine
+        return func
+
+
+# returned instead of calling `get_response` for requests that aren't redirected
+PASSED = object()
+
+
+def passed(request):
+    return PASSED
+
+
+def mark_async(middleware, get_response):
+    """
+    Mark `middleware` as a coroutine function if `get_response` is one and
+    return whether it is.
+    """
+    if get_response is not None and iscoroutinefunction(get_response):
+        markcoroutinefunction(middleware)
+        return True
+
+    return False
+
+
+async def acall(middleware, request):
+    """The async version of `RedirectsMiddleware.__call__`."""
+    if sync_to_async is not None:
+        for source in middleware.database_sources:
+            if source.due():
+                await sync_to_async(source.refresh)()
+
+    if middleware.stats is not None:
+        response = middleware.call_with_stats(request, passed)
+    else:
+        resolver_match = middleware.resolve_request(request)
+        if resolver_match is None:
+            response = PASSED
+        else:
+            callback, callback_args, callback_kwargs = resolver_match
+            request.resolver_match = resolver_match
+            response = callback(request, *callback_args, **callback_kwargs)
+
+    if response is PASSED:
+        return await middleware.get_response(request)
+
+    # the redirect views are plain functions, but decorators may make them async
+    if asyncio.iscoroutine(response):
+        response = await response
+
+    return response
@@ -0,0 +1,156 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Check large numbers of URLs, e.g. from logs or sitemaps, against the redirects.
+
+`audit_urls()` runs the URLs through `resolve_many()` in chunks, in a pool of
+processes if asked to, and yields a row per URL in the order they were given. The
+URLs are read as the rows are consumed and only a few chunks per process are in
+flight at a time, so memory stays flat however many there are. The processes are
+forked after the resolver is warmed up, so they share its index.
+"""
+
+from collections import deque
+from itertools import islice
+import multiprocessing
+
+try:
+    from urllib.parse import unquote, urlsplit
+except ImportError:
+    from urllib import unquote as unquote_bytes
+    from urlparse import urlsplit
+
+    def unquote(path):
+        # like py3, which decodes the percent-encoded UTF-8
+        return unquote_bytes(path.encode('utf-8')).decode('utf-8', 'replace')
+
+import django
+from django.apps import apps
+from django.db import connections
+
+from redirect_urls.stats import pattern_label
+from redirect_urls.utils import default_resolver, resolve_many
+
+
+# URLs sent to a process at a time by default
+CHUNK_SIZE = 1000
+# chunks waiting for or being worked on per process at most
+CHUNKS_PER_PROCESS = 2
+# status of the URLs whose redirect raised an error, like Django would answer
+ERROR_STATUS = 500
+
+
+class AuditRow(object):
+    """The answer to a URL. `status` and `location` are None if it isn't redirected."""
+    __slots__ = ('url', 'status', 'location', 'pattern')
+
+    def __init__(self, url, status, location, pattern):
+        self.url = url
+        self.status = status
+        self.location = location
+        self.pattern = pattern
+
+    def __iter__(self):
+        return iter((self.url, self.status, self.location, self.pattern))
+
+
+class AuditSummary(object):
+    """Counts of the rows of an audit by status and by pattern."""
+    def __init__(self):
+        self.total = 0
+        self.statuses = {}
+        self.patterns = {}
+
+    def add(self, row):
+        self.total += 1
+        self.statuses[row.status] = self.statuses.get(row.status, 0) + 1
+        if row.pattern is not None:
+            self.patterns[row.pattern] = self.patterns.get(row.pattern, 0) + 1
+
+    def top_patterns(self, limit=None):
+        ranked = sorted(self.patterns.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit else ranked
+
+
+def parse_url(url):
+    """Return `(path, query)` of a full URL or a path, with the path percent-decoded."""
+    parts = urlsplit(url)
+    return unquote(parts.path or '/'), parts.query
+
+
+def read_urls(lines):
+    """Yield the URLs in an iterable of lines, skipping blank lines and # comments."""
+    for line in lines:
+        url = line.strip()
+        if url and not url.startswith('#'):
+            yield url
+
+
+def init_worker():
+    # processes that are spawned rather than forked start from scratch
+    if not apps.ready:
+        django.setup()
+
+
+def audit_chunk(urls, headers=None):
+    """Return the `AuditRow`s of a list of URLs."""
+    resolver = default_resolver()
+    rows = []
+    for url in urls:
+        path, query = parse_url(url)
+        try:
+            status, location, pattern = next(resolve_many([(path, query, headers)], resolver))
+        except Exception:
+            status, location, pattern = ERROR_STATUS, None, None
+
+        if pattern is not None:
+            # the patterns themselves don't go through pickle
+            pattern = pattern_label(pattern)
+        rows.append(AuditRow(url, status, location, pattern))
+
+    return rows
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def audit_urls(urls, headers=None, processes=1, chunk_size=CHUNK_SIZE):
+    """
+    Yield the `AuditRow` of each URL in the `urls` iterable, checked against the
+    redirects registry with `headers` in `processes` processes.
+    """
+    # built before the processes are forked so that they all share it
+    default_resolver().warm()
+    chunks = chunked(urls, chunk_size)
+    if processes == 1:
+        for chunk in chunks:
+            for row in audit_chunk(chunk, headers):
+                yield row
+        return
+
+    # forked processes would share the connections, see `DatabaseRedirects`
+    connections.close_all()
+    pool = multiprocessing.Pool(processes, initializer=init_worker)
+    try:
+        # Pool.imap() would read all of the URLs as fast as it can
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(audit_chunk, (chunk, headers)))
+            if len(pending) >= processes * CHUNKS_PER_PROCESS:
+                for row in pending.popleft().get():
+                    yield row
+
+        while pending:
+            for row in pending.popleft().get():
+                yield row
+    finally:
+        pool.terminate()
+        pool.join()
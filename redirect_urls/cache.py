@@ -0,0 +1,116 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    Keep at most `maxsize` items, evicting the least recently used ones first.
+
+    Counters of hits, misses, and evictions are kept for monitoring. They are not
+    locked so they may be slightly off when the cache is used from several threads.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        data = self._data
+        try:
+            value = data[key]
+            # another thread may evict the key in between, hence no move_to_end()
+            data[key] = data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        data = self._data
+        data.pop(key, None)
+        data[key] = value
+        while len(data) > self.maxsize:
+            try:
+                data.popitem(last=False)
+            except KeyError:
+                break
+
+            self.evictions += 1
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class ClassificationCache(object):
+    """
+    Remember the results of classifying strings, e.g. whether a User-Agent is Firefox,
+    for the `maxsize` most recently classified strings.
+
+    Results are kept per string so that every classifier of the same string shares
+    one entry. Strings longer than `max_length` are classified every time.
+    """
+    def __init__(self, maxsize, max_length=1024):
+        self.values = LRUCache(maxsize)
+        self.max_length = max_length
+        self.hits = 0
+        self.misses = 0
+
+    def classify(self, value, key, func):
+        """Return `func(value)`, remembered as the result of `key` for `value`."""
+        values = self.values
+        if not values.maxsize or len(value) > self.max_length:
+            self.misses += 1
+            return func(value)
+
+        results = values.get(value)
+        if results is None:
+            results = {}
+            values.set(value, results)
+        else:
+            try:
+                result = results[key]
+            except KeyError:
+                pass
+            else:
+                self.hits += 1
+                return result
+
+        self.misses += 1
+        result = results[key] = func(value)
+        return result
+
+    def clear(self):
+        self.values.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.values),
+            'maxsize': self.values.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.values.evictions,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+        }
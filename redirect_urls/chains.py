@@ -0,0 +1,362 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Find the redirects whose destination is redirected again, and have them redirect
+straight to the end of the chain.
+
+A redirect to `/b/` where another redirect sends `/b/` on to `/c/` costs every
+user an extra round trip. `find_chains()` follows the static destinations of the
+redirects and redirect tables in the registry through the registry itself, and
+`collapse_chains()` has them redirect to the end of each chain instead.
+
+A redirect in the middle of a chain is only skipped if it sends every request to
+the same place the same way: it is permanent and not decorated, its destination
+is neither callable, nor built from captures, nor depends on headers, and it keeps
+the query string as it is. Chains going on past one that isn't are collapsed up
+to it and reported with the reason, and so are loops, which are left alone. So are
+chains through a path that a pattern only matching without a locale prefix, like
+`redirect(r'^de/b/$', '/x/', locale_prefix=False)`, takes with a locale prefix.
+
+Redirects after `database_redirects()` in the list are never skipped, as the
+database could take their paths at any time. Named `redirect()` patterns with
+decorators aren't followed either.
+"""
+
+import logging
+import re
+
+from django.http import HttpResponsePermanentRedirect
+from django.urls import Resolver404
+
+from redirect_urls import utils
+from redirect_urls.database import DatabaseRedirects, UnknownRedirects
+from redirect_urls.resolvers import body_prefix, pattern_regex
+from redirect_urls.tables import RedirectTable
+from redirect_urls.utils import (HTTP_RE, LOCALE_PREFIX_RE, LOCALE_RE, SAMPLE_LOCALE, Destination,
+                                 RedirectPattern, get_resolver)
+
+
+# redirects followed at most after the first one
+MAX_CHAIN_LENGTH = 20
+FLAGS_RE = re.compile(r'^\(\?[a-zA-Z]+\)')
+log = logging.getLogger(__name__)
+
+
+class Chain(object):
+    """
+    The redirects the destination of a redirect leads through.
+
+    label: the regex of the redirect, or the table file and path of a table row.
+    urls: the URL the redirect leads to, then the one each followed redirect leads
+        to, for a request without a locale prefix.
+    skipped: the number of followed redirects that can be skipped.
+    collapsed: `(to, destination)` of the last of those, to redirect to instead.
+    reason: why the chain can't be collapsed past the last skipped redirect.
+    loop: whether the chain leads back to a redirect it went through.
+    """
+    def __init__(self, label):
+        self.label = label
+        self.urls = []
+        self.skipped = 0
+        self.collapsed = None
+        self.reason = None
+        self.loop = False
+
+    def __repr__(self):
+        return '<Chain {} -> {}>'.format(self.label, ' -> '.join(self.urls))
+
+    @property
+    def destination(self):
+        """The URL the redirect leads to once collapsed."""
+        return self.urls[self.skipped]
+
+    def as_dict(self):
+        return {'redirect': self.label, 'urls': self.urls, 'skipped': self.skipped,
+                'destination': self.destination, 'reason': self.reason, 'loop': self.loop}
+
+
+def matches_any_locale(regex):
+    """Return whether `regex` starts with the optional locale prefix of `redirect()`."""
+    return FLAGS_RE.sub('', regex).startswith(LOCALE_RE)
+
+
+def is_local(url):
+    return url.startswith('/') and not url.startswith('//')
+
+
+def is_literal(to):
+    return to.startswith('/') or bool(HTTP_RE.match(to))
+
+
+def redirect_of(match):
+    """Return the `RedirectPattern` that `match` calls, or None."""
+    if isinstance(match.func, RedirectPattern):
+        return match.func
+
+    url_pattern = getattr(match, 'redirect_pattern', None)
+    if isinstance(url_pattern, RedirectPattern):
+        # decorated
+        return url_pattern
+
+    return None
+
+
+def redirect_sources(patterns):
+    """
+    Yield `(label, url_pattern, table, row)` for every redirect in `patterns` with a
+    static destination, where `url_pattern` is None for table rows.
+    """
+    for url_pattern in patterns:
+        if isinstance(url_pattern, RedirectTable):
+            for row, to in enumerate(url_pattern.destinations):
+                if url_pattern.statuses[row] != 410:
+                    label = '{} /{}'.format(url_pattern.filename or 'table',
+                                            url_pattern.row_paths[row])
+                    yield label, None, url_pattern, row
+            continue
+
+        # named redirects are the view of a regular URL pattern
+        callback = getattr(url_pattern, 'callback', None)
+        if isinstance(callback, RedirectPattern):
+            url_pattern = callback
+
+        if isinstance(url_pattern, RedirectPattern) and not callable(url_pattern.to):
+            yield pattern_regex(url_pattern), url_pattern, None, None
+
+
+def skip_reason(hop, kwargs, keep_locale):
+    """
+    Return why requests can't be sent past `hop`, a redirect that matched with
+    `kwargs`, or None. `keep_locale` tells whether the requests of the chain can
+    have any locale prefix.
+    """
+    if hop.callback is not hop:
+        return 'decorated'
+    if callable(hop.to):
+        return 'callable destination'
+    if hop.vary:
+        return 'depends on headers'
+    if hop.status_code != HttpResponsePermanentRedirect.status_code:
+        return 'temporary redirect'
+    if hop.query is not None or hop.anchor:
+        return 'changes the query string or anchor'
+
+    template = hop.destination.compile(hop.to)[0]
+    if '{' in template or '}' in template:
+        return 'destination built from captures'
+    if '?' in template or '#' in template:
+        return 'changes the query string or anchor'
+    if keep_locale and not matches_any_locale(pattern_regex(hop)):
+        return 'only matches without a locale prefix'
+    if keep_locale and kwargs.get('locale'):
+        # e.g. a path starting with /the/, which a locale prefix would come before
+        return 'matched part of the path as a locale'
+    if (not keep_locale and kwargs.get('locale') and hop.destination.prepend_locale and
+            not is_literal(hop.to)):
+        # the URL name would have to be reversed for the locale now
+        return 'reverses a URL name for a locale'
+
+    return None
+
+
+def probe_locales(patterns):
+    """
+    Return the locale prefixes to check that the paths of chains are redirected the
+    same way with: a sample one, and those starting the patterns and table rows that
+    only match without a locale prefix, which could take a path with that locale.
+    """
+    locales = set([SAMPLE_LOCALE])
+    for url_pattern in patterns:
+        if isinstance(url_pattern, RedirectTable):
+            paths = [] if url_pattern.locale_prefix else url_pattern.row_paths
+        else:
+            regex = pattern_regex(url_pattern)
+            if regex is None or matches_any_locale(regex):
+                continue
+            paths = [body_prefix(regex) or '']
+
+        for path in paths:
+            locale = LOCALE_PREFIX_RE.match(path).group('locale')
+            if locale:
+                locales.add(locale)
+
+    return sorted(locales)
+
+
+def same_for_locales(resolver, url, hop, locales):
+    """Return whether `hop` also matches `url` after each of the `locales` first."""
+    for locale in locales:
+        try:
+            match = resolver.resolve('/' + locale + url[1:])
+        except Resolver404:
+            return False
+
+        if redirect_of(match) is not hop or match.kwargs.get('locale') != locale:
+            return False
+
+    return True
+
+
+def follow(resolver, label, to, destination, keep_locale, source=None, source_path=None,
+           locales=()):
+    """
+    Return the `Chain` of a redirect to `to` with `destination`, or None if its
+    destination isn't redirected again or can't be followed. The redirect is
+    `source` or the table row for `source_path`. If the locale is kept, the paths
+    are also checked with the prefixes in `locales`.
+    """
+    url = destination.compile(to)[0]
+    if not is_local(url) or set(url) & set('{}?#'):
+        return None
+
+    # the locale of the request is only kept if every hop keeps it
+    keep_locale = keep_locale and destination.prepend_locale
+    chain = Chain(label)
+    chain.urls.append(url)
+    visited = set([url, source_path])
+    while len(chain.urls) <= MAX_CHAIN_LENGTH:
+        try:
+            match = resolver.resolve(url)
+        except Resolver404:
+            break
+
+        hop = redirect_of(match)
+        if hop is None:
+            break
+
+        if hop is source:
+            chain.loop = True
+            break
+
+        chain.reason = skip_reason(hop, match.kwargs, keep_locale)
+        if (chain.reason is None and keep_locale and
+                not same_for_locales(resolver, url, hop, locales)):
+            chain.reason = 'a pattern before it takes the path with a locale'
+        if chain.reason is not None:
+            if callable(hop.to):
+                chain.urls.append('<callable>')
+            else:
+                chain.urls.append(hop.destination.compile(hop.to)[0])
+            break
+
+        url = hop.destination.url(hop.to, (), match.kwargs)
+        chain.urls.append(url)
+        chain.skipped += 1
+        if keep_locale or not (match.kwargs.get('locale') and hop.destination.prepend_locale):
+            chain.collapsed = (hop.to, Destination(hop.destination.to_args,
+                                                   hop.destination.to_kwargs,
+                                                   keep_locale and hop.destination.prepend_locale))
+        else:
+            chain.collapsed = (url, Destination(prepend_locale=False))
+
+        keep_locale = keep_locale and hop.destination.prepend_locale
+        if not is_local(url) or url in visited:
+            chain.loop = url in visited
+            break
+
+        visited.add(url)
+    else:
+        chain.reason = 'longer than {} redirects'.format(MAX_CHAIN_LENGTH)
+
+    if chain.loop:
+        chain.skipped = 0
+        chain.collapsed = None
+    elif len(chain.urls) == 1:
+        return None
+
+    return chain
+
+
+def chain_resolver(patterns):
+    # database redirects aren't known at build time, and may take any path at any time
+    return get_resolver([UnknownRedirects(barrier=True)
+                         if isinstance(url_pattern, DatabaseRedirects) else url_pattern
+                         for url_pattern in patterns])
+
+
+def table_destination(table):
+    kwargs = table.redirect_kwargs
+    return Destination(kwargs.get('to_args'), kwargs.get('to_kwargs'),
+                       kwargs.get('prepend_locale', True))
+
+
+def find_sources_chains(patterns):
+    """Yield `(url_pattern, table, row, chain)` for every chain in `patterns`."""
+    resolver = chain_resolver(patterns)
+    locales = probe_locales(patterns)
+    destinations = {}
+    for label, url_pattern, table, row in redirect_sources(patterns):
+        if url_pattern is not None:
+            chain = follow(resolver, label, url_pattern.to, url_pattern.destination,
+                           matches_any_locale(pattern_regex(url_pattern)), url_pattern,
+                           locales=locales)
+        else:
+            destination = destinations.get(table)
+            if destination is None:
+                destination = destinations[table] = table_destination(table)
+            chain = follow(resolver, label, table.destinations[row], destination,
+                           table.locale_prefix, source_path='/' + table.row_paths[row],
+                           locales=locales)
+
+        if chain is not None:
+            yield url_pattern, table, row, chain
+
+
+def find_chains(patterns=None):
+    """
+    Return the `Chain` of every redirect in `patterns`, the registry by default,
+    whose destination is redirected again.
+    """
+    if patterns is None:
+        patterns = utils.redirectpatterns
+
+    return [chain for _, _, _, chain in find_sources_chains(patterns)]
+
+
+def collapse_chains(patterns=None):
+    """
+    Have every redirect in `patterns`, the registry by default, redirect straight
+    to the end of its chain, or as far as it can be collapsed, and return the
+    chains. Redirects that no longer lead to a chain redirect to their own
+    destination again, so this can run again after the patterns changed.
+    """
+    if patterns is None:
+        patterns = utils.redirectpatterns
+
+    chains = []
+    collapsed = {}
+    table_rows = dict((table, {}) for table in patterns if isinstance(table, RedirectTable))
+    for url_pattern, table, row, chain in find_sources_chains(patterns):
+        chains.append(chain)
+        if chain.collapsed is None:
+            continue
+
+        if url_pattern is not None:
+            collapsed[url_pattern] = chain.collapsed
+            continue
+
+        to, destination = chain.collapsed
+        # rows only have a `to` of their own
+        table_dest = table_destination(table)
+        if is_literal(to) and destination.prepend_locale == table_dest.prepend_locale:
+            table_rows[table][row] = to
+        else:
+            chain.reason = chain.reason or 'table rows need a URL'
+            chain.skipped = 0
+
+    for label, url_pattern, table, row in redirect_sources(patterns):
+        if url_pattern is not None:
+            url_pattern.collapse(collapsed.get(url_pattern))
+
+    for table, rows in table_rows.items():
+        table.collapse(rows)
+
+    for chain in chains:
+        if chain.loop:
+            log.warning('Redirect loop: %s -> %s', chain.label, ' -> '.join(chain.urls))
+
+    log.info('Collapsed %s of %s redirect chains', sum(1 for c in chains if c.skipped),
+             len(chains))
+    return chains
@@ -0,0 +1,135 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Redirects managed in the database with the `Redirect` model.
+
+Each worker keeps the enabled redirects in an in-memory index like the one of the
+resolver, and reads the version counter of `RedirectsVersion` at most every
+`interval` seconds to find out whether they changed. Only then are they all read
+again, so requests don't query the database otherwise. The source goes in the
+registry like any pattern, and matches where it is in the list:
+
+    redirectpatterns = [
+        redirect(r'^firefox/$', 'firefox.new'),
+        database_redirects(),
+    ]
+"""
+
+import logging
+import threading
+from timeit import default_timer
+
+from django.conf import settings
+from django.urls import Resolver404, ResolverMatch
+
+from redirect_urls.signals import redirects_changed
+
+
+# seconds between checks of the version counter by default
+DATABASE_CHECK_INTERVAL = 30
+log = logging.getLogger(__name__)
+
+
+class DatabaseRedirects(object):
+    """
+    The enabled `Redirect` models, tried in order. They are read again when the
+    version counter changed, which is checked at most every `interval` seconds.
+    """
+    def __init__(self, interval=None):
+        if interval is None:
+            interval = getattr(settings, 'REDIRECT_URLS_DATABASE_INTERVAL',
+                               DATABASE_CHECK_INTERVAL)
+        self.interval = interval
+        self.version = None
+        # `default_timer()` of the last check
+        self.checked = None
+        self.index = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.index.size if self.index else 0
+
+    def __repr__(self):
+        return '<{} version {}>'.format(self.__class__.__name__, self.version)
+
+    def load(self):
+        """Read the redirects again if their version changed."""
+        # the models need the app registry
+        from redirect_urls.models import Redirect, current_version
+        from redirect_urls.resolvers import PatternIndex
+
+        version = current_version()
+        if version != self.version or self.index is None:
+            redirects = Redirect.objects.filter(enabled=True)
+            self.index = PatternIndex([r.url_pattern() for r in redirects])
+            self.version = version
+            # e.g. paths the middleware remembered as misses may match now
+            redirects_changed.send(sender=self.__class__, version=version)
+
+    def due(self):
+        """Return whether the last check is more than `interval` seconds ago."""
+        return self.checked is None or default_timer() - self.checked >= self.interval
+
+    def refresh(self, force=False):
+        """
+        Check the version if the last check is more than `interval` seconds ago, or
+        now with `force`. Return the current index, which may be None.
+        """
+        if not force and not self.due():
+            return self.index
+
+        # other threads go on with the current index while one checks
+        if not self._lock.acquire(self.index is None):
+            return self.index
+
+        try:
+            if force or self.due():
+                self.load()
+        except Exception:
+            # keep the redirects there are until the next check
+            log.exception('Could not load the redirects from the database')
+        finally:
+            self.checked = default_timer()
+            self._lock.release()
+
+        return self.index
+
+    def warm(self):
+        """Load the redirects now rather than on the first request."""
+        return self.refresh(force=True)
+
+    def resolve(self, path):
+        """Return a ResolverMatch for `path` like a URL pattern would, or None."""
+        index = self.refresh()
+        if index is None:
+            return None
+
+        try:
+            # the index tells which redirect matched, for the stats
+            return index.resolve(path)
+        except Resolver404:
+            return None
+
+
+class UnknownRedirects(DatabaseRedirects):
+    """
+    Stands in for database redirects where they can't be known in advance, like in
+    the checks of the registry. It resolves no path, or every path as a `barrier`
+    for redirects that the database could take over at any time.
+    """
+    def __init__(self, barrier=False):
+        super(UnknownRedirects, self).__init__()
+        self.barrier = barrier
+
+    def resolve(self, path):
+        return ResolverMatch(self, (), {}) if self.barrier else None
+
+
+def database_redirects(interval=None):
+    """
+    Return a `DatabaseRedirects` source of the `Redirect` models, which can go in a
+    list of redirect patterns.
+    """
+    return DatabaseRedirects(interval)
@@ -2,9 +2,11 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import time
 from functools import wraps
 
 from django.utils.cache import patch_response_headers
+from django.utils.http import http_date
 
 
 def cache_control_expires(num_hours):
@@ -24,3 +26,28 @@ def cache_control_expires(num_hours):
         return inner
 
     return decorator
+
+
+class CacheHeaders(object):
+    """
+    The Cache-Control and Expires headers `cache_control_expires` would set for the
+    given number of hours, computed once. Expires is updated at most once a second.
+    """
+    def __init__(self, num_hours):
+        self.num_seconds = max(int(num_hours * 60 * 60), 0)
+        self.cache_control = 'max-age={}'.format(self.num_seconds)
+        self._expires = (None, None)
+
+    def expires(self):
+        now = int(time.time())
+        second, expires = self._expires
+        if second != now:
+            expires = http_date(now + self.num_seconds)
+            self._expires = (now, expires)
+
+        return expires
+
+    def patch(self, response):
+        """Set the headers on a response that doesn't have any caching headers yet."""
+        response['Expires'] = self.expires()
+        response['Cache-Control'] = self.cache_control
@@ -0,0 +1,379 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Export the redirects that don't need Django to map files for nginx and Apache,
+so that the edge servers can answer them before a request reaches the app.
+
+Every path of an exact path redirect or table row, with each of the exported
+locales for those with a locale prefix, gets an entry with the answer the
+registry gives for it, whichever pattern that comes from. Regex redirects with a
+constant destination become nginx regex entries, in the order of the registry,
+after which nginx tries them. Patterns that can't be exported get an entry that
+leaves their paths to Django, as long as later regex entries could match them.
+
+nginx gets a `map` of `$uri` to `"<status> <location>"`, Apache a text
+`RewriteMap` of `<path> <status>:<location>` with the exact paths only. Redirects
+depending on the request, other than on the query string passed on as it is,
+are left to Django, and so is everything after database redirects, which can
+change at any time. The edge servers don't add the cache headers of the redirects.
+"""
+
+import re
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+
+from django.conf import settings
+from django.urls import Resolver404
+from django.utils.encoding import iri_to_uri
+
+from redirect_urls import utils
+from redirect_urls.chains import FLAGS_RE, chain_resolver
+from redirect_urls.database import DatabaseRedirects
+from redirect_urls.resolvers import exact_path, pattern_label, pattern_regex
+from redirect_urls.tables import RedirectTable
+from redirect_urls.utils import PROTOCOL_RELATIVE_RE, RedirectPattern, gone_view, no_redirect_view
+
+
+LOCALE_CODE_RE = re.compile(r'^\w{2,3}(?:-\w{2})?$')
+# Python regex syntax that PCRE doesn't have or reads differently
+PYTHON_ONLY_SYNTAX = ('(?P=', '\\Z', '(?#')
+# flags without a PCRE equivalent
+PYTHON_ONLY_FLAGS = frozenset('Lau')
+FIELD_RE = re.compile(r'\{([^{}]*)\}')
+# paths that start with something that could be a locale prefix
+LOCALE_PATH_REGEX = r'^/\w{2,3}(?:-\w{2})?/'
+
+
+class EdgeRedirect(object):
+    """
+    The answer of an edge server for a path: a `status`, and for redirects the
+    `url`, the `query` string to add to it or None to keep the requested one, and
+    the `anchor`. The url of a regex entry has the captures as `${name}`. Requests
+    are left to Django if `status` is None.
+    """
+    def __init__(self, status=None, url=None, query='', anchor=None):
+        self.status = status
+        self.url = url
+        self.query = query
+        self.anchor = anchor
+
+    def __repr__(self):
+        return '<EdgeRedirect {} {}>'.format(self.status, self.url)
+
+
+# leave the request to Django
+PASS = EdgeRedirect()
+
+
+class EdgeExport(object):
+    """
+    exact: dict of path -> `EdgeRedirect`, which edge servers look up first.
+    regexes: list of `(regex, EdgeRedirect)` tried in order for other paths, where
+        the PCRE `regex` matches the whole path.
+    skipped: list of `(label, reason)` of the patterns left to Django.
+    """
+    def __init__(self):
+        self.exact = {}
+        self.regexes = []
+        self.skipped = []
+
+    def nginx_map(self, variable='$redirect_urls'):
+        """Return an nginx `map` of `$uri` to `variable` for the http block."""
+        lines = ['# exported by ./manage.py redirect_export',
+                 'map $uri {} {{'.format(variable),
+                 '    default "";']
+        for path, edge in self.exact.items():
+            lines.append('    {} {};'.format(nginx_quote(path), nginx_quote(nginx_value(edge))))
+
+        for regex, edge in self.regexes:
+            lines.append('    {} {};'.format(nginx_quote('~' + regex),
+                                             nginx_quote(nginx_value(edge))))
+
+        lines.append('}')
+        return '\n'.join(lines) + '\n'
+
+    def apache_map(self):
+        """Return a text `RewriteMap` of the exact paths that Apache can answer."""
+        lines = ['# exported by ./manage.py redirect_export']
+        for path, edge in self.exact.items():
+            value = apache_value(edge)
+            if value is not None and ' ' not in path:
+                lines.append('{} {}'.format(path, value))
+
+        return '\n'.join(lines) + '\n'
+
+
+def nginx_quote(value):
+    return '"{}"'.format(value.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def nginx_value(edge):
+    if edge.status is None:
+        return ''
+    if edge.status == 410:
+        return '410'
+
+    url = edge.url
+    if edge.query is None:
+        url += '$is_args$args'
+    elif edge.query:
+        url += '?' + edge.query
+
+    if edge.anchor:
+        url += '#' + edge.anchor
+
+    return '{} {}'.format(edge.status, url)
+
+
+def apache_value(edge):
+    """Return the map value for `edge`, or None if Apache can't answer like Django."""
+    if edge.status is None:
+        return None
+    if edge.status == 410:
+        return '410'
+
+    url = edge.url
+    if edge.query is None:
+        # Apache adds the requested query string at the end, after any anchor
+        if edge.anchor:
+            return None
+    else:
+        # a trailing ? drops the requested query string
+        url += '?' + edge.query
+
+    if edge.anchor:
+        url += '#' + edge.anchor
+
+    if ' ' in url:
+        return None
+
+    return '{}:{}'.format(edge.status, url)
+
+
+def export_locales(locales=None):
+    """
+    Return the locale prefixes to export paths for, by default those in the
+    `REDIRECT_URLS_EXPORT_LOCALES` setting or else the codes of `LANGUAGES`.
+    """
+    if locales is None:
+        locales = getattr(settings, 'REDIRECT_URLS_EXPORT_LOCALES', None)
+        if locales is None:
+            locales = [code for code, name in settings.LANGUAGES]
+
+    return [locale for locale in locales if LOCALE_CODE_RE.match(locale)]
+
+
+def redirect_pattern_of(url_pattern):
+    """Return the `RedirectPattern` of a pattern, also of named redirects, or None."""
+    callback = getattr(url_pattern, 'callback', None)
+    if isinstance(callback, RedirectPattern):
+        return callback
+
+    return None
+
+
+def dynamic_reason(redirect_pattern):
+    """Return why the location of a redirect depends on more than the path, or None."""
+    if redirect_pattern.callback is not redirect_pattern:
+        return 'decorated'
+    if callable(redirect_pattern.to):
+        return 'callable destination'
+    if redirect_pattern.vary:
+        return 'depends on headers'
+    if redirect_pattern.query and redirect_pattern.merge_query:
+        return 'merges the query string'
+
+    return None
+
+
+def edge_query(redirect_pattern):
+    query = redirect_pattern.query
+    if query is None:
+        return None
+
+    return urlencode(query, doseq=True) if query else ''
+
+
+def path_edge_redirect(resolver, path):
+    """Return the `EdgeRedirect` of the answer to `path`, given the registry."""
+    try:
+        match = resolver.resolve(path)
+    except Resolver404:
+        return PASS
+
+    if match.func is gone_view:
+        return EdgeRedirect(410)
+
+    redirect_pattern = match.func
+    if not isinstance(redirect_pattern, RedirectPattern) or dynamic_reason(redirect_pattern):
+        return PASS
+
+    # as in `RedirectPattern.build_location()`
+    kwargs = dict((k, v or '') for k, v in match.kwargs.items())
+    args = [x or '' for x in match.args]
+    url = redirect_pattern.destination.url(redirect_pattern.to, args, kwargs)
+    if PROTOCOL_RELATIVE_RE.match(url):
+        url = '/' + url.lstrip('/')
+
+    url = iri_to_uri(url)
+    if '$' in url:
+        return PASS
+
+    return EdgeRedirect(redirect_pattern.status_code, url, edge_query(redirect_pattern),
+                        redirect_pattern.anchor)
+
+
+def pcre_regex(regex):
+    """Return a PCRE regex of the whole path for the regex of a pattern, or None."""
+    if any(syntax in regex for syntax in PYTHON_ONLY_SYNTAX):
+        return None
+
+    flags = FLAGS_RE.match(regex)
+    flags = flags.group(0) if flags else ''
+    if PYTHON_ONLY_FLAGS & set(flags):
+        return None
+
+    body = regex[len(flags):]
+    # Django matches at the start of the path without the slash
+    if body.startswith('^'):
+        body = body[1:]
+
+    return '{}^/(?:{})'.format(flags, body)
+
+
+def regex_edge_redirect(url_pattern):
+    """
+    Return `(EdgeRedirect, reason)` for the paths a pattern matches, with a reason
+    why they are left to Django if they are.
+    """
+    callback = getattr(url_pattern, 'callback', None)
+    if callback is gone_view:
+        return EdgeRedirect(410), None
+    if callback is no_redirect_view:
+        return PASS, None
+
+    redirect_pattern = redirect_pattern_of(url_pattern)
+    if redirect_pattern is None:
+        return PASS, 'not a redirect'
+
+    reason = dynamic_reason(redirect_pattern)
+    if reason is not None:
+        return PASS, reason
+
+    regex = redirect_pattern.regex
+    redirect_url, locale_url = redirect_pattern.destination.compile(redirect_pattern.to)
+    template = redirect_url
+    if locale_url is not None and 'locale' in regex.groupindex:
+        template = locale_url
+
+    # Django only formats the destination with captured values
+    if regex.groups:
+        parts = FIELD_RE.split(template)
+        fields = parts[1::2]
+        if any(field not in regex.groupindex for field in fields):
+            return PASS, 'destination template'
+
+        url = ''.join('${{{}}}'.format(part) if n % 2 else iri_to_uri(part)
+                      for n, part in enumerate(parts))
+        if '{' in ''.join(parts[::2]) or '}' in ''.join(parts[::2]):
+            return PASS, 'destination template'
+        if '$' in ''.join(parts[::2]):
+            return PASS, 'destination has a $'
+        if url.startswith('/${') and not url.startswith('/${locale}'):
+            # Django makes protocol relative URLs relative to the site
+            return PASS, 'destination starts with a capture'
+    else:
+        if '$' in template:
+            return PASS, 'destination has a $'
+
+        url = iri_to_uri(template)
+
+    if PROTOCOL_RELATIVE_RE.match(url):
+        url = '/' + url.lstrip('/')
+
+    return EdgeRedirect(redirect_pattern.status_code, url, edge_query(redirect_pattern),
+                        redirect_pattern.anchor), None
+
+
+def export_redirects(patterns=None, locales=None):
+    """
+    Return the `EdgeExport` of `patterns`, the registry by default, with the paths
+    of exact path redirects with a locale prefix exported for each of `locales`,
+    see `export_locales()`.
+    """
+    if patterns is None:
+        patterns = utils.redirectpatterns
+
+    locales = export_locales(locales)
+    resolver = chain_resolver(patterns)
+    export = EdgeExport()
+
+    def add_paths(locale_prefix, path):
+        paths = ['/' + path]
+        if locale_prefix:
+            paths.extend('/{}/{}'.format(locale, path) for locale in locales)
+
+        for path in paths:
+            if path not in export.exact:
+                export.exact[path] = path_edge_redirect(resolver, path)
+
+    # `(regex, EdgeRedirect, exported)`, where the others only keep later regexes
+    # from matching the paths of earlier patterns
+    entries = []
+    # the pattern after which regex entries can't be tried, as it could match anything
+    blocked = None
+    for url_pattern in patterns:
+        label = pattern_label(url_pattern)
+        if isinstance(url_pattern, RedirectTable):
+            for path in url_pattern.row_paths:
+                add_paths(url_pattern.locale_prefix, path)
+            if url_pattern.locale_prefix and blocked is None:
+                # the rows with the locales that aren't exported
+                entries.append((LOCALE_PATH_REGEX, PASS, False))
+            continue
+
+        if isinstance(url_pattern, DatabaseRedirects):
+            regex, exact = None, None
+            edge, reason = PASS, 'can change at any time'
+        else:
+            regex = pattern_regex(url_pattern)
+            exact = exact_path(regex)
+            edge, reason = regex_edge_redirect(url_pattern)
+
+        if exact is not None:
+            add_paths(*exact)
+            if not exact[0]:
+                # all of its paths are in the exact entries
+                if reason:
+                    export.skipped.append((label, reason))
+                continue
+
+        if blocked is not None:
+            if exact is None:
+                export.skipped.append((label, reason or 'after {}'.format(blocked)))
+            elif reason:
+                export.skipped.append((label, reason))
+            continue
+
+        pcre = pcre_regex(regex) if regex is not None else None
+        if pcre is None:
+            blocked = label
+            entries.append(('^/', PASS, False))
+            export.skipped.append((label, reason or 'regex'))
+            continue
+
+        if reason:
+            export.skipped.append((label, reason))
+
+        entries.append((pcre, edge, exact is None and edge.status is not None))
+
+    # only what comes before the last exported regex matters
+    while entries and not entries[-1][2]:
+        entries.pop()
+
+    export.regexes = [(regex, edge) for regex, edge, exported in entries]
+    return export
@@ -0,0 +1,368 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Find redirect regexes that could backtrack catastrophically.
+
+The middleware tries the regexes of the redirects before the rest of the URLconf,
+so a single one that takes exponential time on some paths slows down, or hangs,
+every request it doesn't match. `lint_patterns()` parses each regex to flag the
+usual suspects:
+
+- a quantifier inside a quantified group without a separator between the
+  repetitions, like `(\\w+)+` or `(\\w+-?)+`, which can split the same text in
+  exponentially many ways,
+- alternatives that can start with the same character inside a quantifier, like
+  `(\\w-|\\d\\.)*`, and
+- a wildcard at the start, like `.*old/`, which has to be tried at every length.
+
+It then times the regexes that have an unbounded quantifier on typical paths and
+on paths made to make them backtrack, which get longer until one takes more than
+the time budget. Set `REDIRECT_URLS_LINT` to 'warn' to log the problems when the
+redirects are registered or reloaded, or to 'error' to also refuse patterns that
+go over `REDIRECT_URLS_LINT_BUDGET`, in seconds per match.
+"""
+
+import logging
+import re
+import string
+from timeit import default_timer
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:
+    # before Python 3.11
+    import sre_constants
+    import sre_parse
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from redirect_urls.resolvers import URLResolver, body_prefix, pattern_regex
+
+
+# seconds a regex may take to match one path by default
+LINT_BUDGET = 0.001
+# lengths of the repeated part of the adversarial paths, tried in order
+ADVERSARIAL_LENGTHS = (4, 8, 12, 16, 20, 24, 32, 64, 128, 256)
+TYPICAL_PATHS = (
+    'firefox/',
+    'en-US/firefox/new/',
+    'de/firefox/93.0/releasenotes/',
+    'docs/Web/JavaScript/Reference/Global_Objects/Array/prototype/map/',
+    '/'.join(['some-long-path-segment'] * 12) + '/',
+)
+# characters the static analysis knows about, plus one that isn't ASCII
+ALPHABET = frozenset(string.printable + u'\xe9')
+CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT: frozenset(string.digits),
+    sre_constants.CATEGORY_WORD: frozenset(string.ascii_letters + string.digits + u'_\xe9'),
+    sre_constants.CATEGORY_SPACE: frozenset(string.whitespace),
+}
+CATEGORIES.update({
+    sre_constants.CATEGORY_NOT_DIGIT: ALPHABET - CATEGORIES[sre_constants.CATEGORY_DIGIT],
+    sre_constants.CATEGORY_NOT_WORD: ALPHABET - CATEGORIES[sre_constants.CATEGORY_WORD],
+    sre_constants.CATEGORY_NOT_SPACE: ALPHABET - CATEGORIES[sre_constants.CATEGORY_SPACE],
+})
+REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+# characters tried after the repeated part of adversarial paths, which shouldn't match
+FAILING_CHARS = u'\x00!~ '
+log = logging.getLogger(__name__)
+
+# py3 compat
+try:
+    unichr
+except NameError:
+    unichr = chr
+
+
+class LintProblem(object):
+    """A `message` about `regex`, which took too long to match if `over_budget`."""
+    def __init__(self, regex, message, over_budget=False):
+        self.regex = regex
+        self.message = message
+        self.over_budget = over_budget
+
+    def __str__(self):
+        return '{}: {}'.format(self.regex, self.message)
+
+    def __repr__(self):
+        return '<LintProblem {}>'.format(self)
+
+
+def item_chars(op, av):
+    """Return the characters a single character item matches, or None if it isn't one."""
+    if op == sre_constants.LITERAL:
+        return frozenset([unichr(av)])
+    if op == sre_constants.NOT_LITERAL:
+        return ALPHABET - frozenset([unichr(av)])
+    if op == sre_constants.ANY:
+        return ALPHABET - frozenset('\n')
+    if op == sre_constants.IN:
+        chars = set()
+        negate = False
+        for item_op, item_av in av:
+            if item_op == sre_constants.NEGATE:
+                negate = True
+            elif item_op == sre_constants.LITERAL:
+                chars.add(unichr(item_av))
+            elif item_op == sre_constants.RANGE:
+                chars.update(c for c in ALPHABET if item_av[0] <= ord(c) <= item_av[1])
+            elif item_op == sre_constants.CATEGORY:
+                chars.update(CATEGORIES.get(item_av, ALPHABET))
+            else:
+                chars.update(ALPHABET)
+
+        return ALPHABET - chars if negate else frozenset(chars)
+
+    return None
+
+
+def first_chars(items):
+    """
+    Return `(chars, nullable)`: the characters that a match of the parsed `items`
+    can start with, and whether it can be empty.
+    """
+    chars = set()
+    for op, av in items:
+        single = item_chars(op, av)
+        if single is not None:
+            return chars | single, False
+
+        if op in REPEATS:
+            body_chars, nullable = first_chars(av[2])
+            chars |= body_chars
+            if av[0] and not nullable:
+                return chars, False
+        elif op == sre_constants.SUBPATTERN:
+            body_chars, nullable = first_chars(av[-1])
+            chars |= body_chars
+            if not nullable:
+                return chars, False
+        elif op == sre_constants.BRANCH:
+            branch_nullable = False
+            for branch in av[1]:
+                body_chars, nullable = first_chars(branch)
+                chars |= body_chars
+                branch_nullable = branch_nullable or nullable
+            if not branch_nullable:
+                return chars, False
+        elif op != sre_constants.AT:
+            # lookarounds, backreferences...
+            return chars | ALPHABET, False
+
+    return chars, True
+
+
+def is_unbounded(op, av):
+    return op in REPEATS and av[1] == sre_constants.MAXREPEAT
+
+
+def inner_repeats(items):
+    """Yield the unbounded repeats in `items`, in groups and alternatives too."""
+    for op, av in items:
+        if is_unbounded(op, av):
+            yield op, av
+        if op in REPEATS:
+            for repeat in inner_repeats(av[2]):
+                yield repeat
+        elif op == sre_constants.SUBPATTERN:
+            for repeat in inner_repeats(av[-1]):
+                yield repeat
+        elif op == sre_constants.BRANCH:
+            for branch in av[1]:
+                for repeat in inner_repeats(branch):
+                    yield repeat
+
+
+def unwrap(items):
+    """Return the items of the group if `items` are a single group."""
+    while len(items) == 1 and items[0][0] == sre_constants.SUBPATTERN:
+        items = items[0][1][-1]
+
+    return items
+
+
+def has_separator(items, chars):
+    """
+    Return whether `items` have a character that every match needs and that isn't
+    one of `chars`, so that the repetitions of a group of them can't overlap.
+    """
+    for op, av in unwrap(items):
+        single = item_chars(op, av)
+        if single is not None and not single & chars:
+            return True
+
+    return False
+
+
+def branches_of(items):
+    """Return the alternatives of `items` if they are one alternation, else None."""
+    items = unwrap(items)
+    if len(items) == 1 and items[0][0] == sre_constants.BRANCH:
+        return items[0][1][1]
+
+    return None
+
+
+def construct_problems(items, problems):
+    """Add the messages about risky constructs in the parsed `items` to `problems`."""
+    for op, av in items:
+        if op in REPEATS:
+            body = av[2]
+            if av[1] == sre_constants.MAXREPEAT:
+                for inner_op, inner_av in inner_repeats(body):
+                    inner_chars = first_chars(inner_av[2])[0]
+                    if not has_separator(body, inner_chars):
+                        problems.add('nested quantifier')
+
+                branches = branches_of(body) or []
+                seen = set()
+                for branch in branches:
+                    chars = first_chars(branch)[0]
+                    if chars & seen:
+                        problems.add('overlapping alternatives in a quantifier')
+                    seen |= chars
+
+            construct_problems(body, problems)
+        elif op == sre_constants.SUBPATTERN:
+            construct_problems(av[-1], problems)
+        elif op == sre_constants.BRANCH:
+            for branch in av[1]:
+                construct_problems(branch, problems)
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            construct_problems(av[1], problems)
+
+
+def leading_wildcard(items):
+    """Return whether the parsed `items` start with a wildcard across path segments."""
+    for op, av in items:
+        if op == sre_constants.AT:
+            continue
+        if op in REPEATS and av[1] == 1:
+            # an optional group like the locale prefix
+            continue
+        if op == sre_constants.SUBPATTERN:
+            return leading_wildcard(av[-1])
+
+        if is_unbounded(op, av):
+            chars = first_chars(av[2])[0]
+            return '/' in chars and 'a' in chars
+
+        return False
+
+    return False
+
+
+def adversarial_paths(regex, items):
+    """Yield paths made to make the unbounded quantifiers of `regex` backtrack."""
+    prefix = body_prefix(regex) or ''
+    pump = set()
+    for op, av in inner_repeats(items):
+        chars = first_chars(av[2])[0]
+        # a letter, a digit, punctuation and a slash if the quantifier matches them
+        for kind in (string.ascii_lowercase, string.digits, '-_.', '/'):
+            for char in kind:
+                if char in chars:
+                    pump.add(char)
+                    break
+
+    failing = [char for char in FAILING_CHARS if char not in pump][:1]
+    for length in ADVERSARIAL_LENGTHS:
+        for char in sorted(pump):
+            for end in [''] + failing:
+                yield prefix + char * length + end
+
+
+def match_time(compiled, path, budget, repeat=3):
+    """
+    Return the shortest time of up to `repeat` matches of `path`, stopping at the
+    first one within `budget`.
+    """
+    best = None
+    for _ in range(repeat):
+        start = default_timer()
+        compiled.match(path)
+        elapsed = default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+        if best <= budget:
+            break
+
+    return best
+
+
+def lint_regex(regex, budget=None):
+    """Return the `LintProblem`s of a regex string."""
+    if budget is None:
+        budget = getattr(settings, 'REDIRECT_URLS_LINT_BUDGET', LINT_BUDGET)
+
+    try:
+        items = sre_parse.parse(regex)
+    except Exception:
+        # Django reports invalid regexes
+        return []
+
+    messages = set()
+    construct_problems(items, messages)
+    if leading_wildcard(items):
+        messages.add('leading wildcard')
+
+    problems = [LintProblem(regex, message) for message in sorted(messages)]
+    if next(inner_repeats(items), None) is None:
+        # can't backtrack more than a few characters
+        return problems
+
+    compiled = re.compile(regex)
+    for path in TYPICAL_PATHS + tuple(adversarial_paths(regex, items)):
+        elapsed = match_time(compiled, path, budget)
+        if elapsed > budget:
+            problems.append(LintProblem(regex, '{:.1f}ms to match {!r}'.format(
+                elapsed * 1e3, path if len(path) < 40 else path[:37] + '...'), True))
+            # longer paths would only take longer
+            break
+
+    return problems
+
+
+def pattern_regexes(url_patterns):
+    """Yield the regexes of URL patterns, and of the patterns of included resolvers."""
+    for url_pattern in url_patterns:
+        regex = pattern_regex(url_pattern)
+        if regex is not None:
+            yield regex
+        if isinstance(url_pattern, URLResolver):
+            for regex in pattern_regexes(url_pattern.url_patterns):
+                yield regex
+
+
+def lint_patterns(url_patterns, budget=None):
+    """Return the `LintProblem`s of the regexes of `url_patterns`."""
+    problems = []
+    seen = set()
+    for regex in pattern_regexes(url_patterns):
+        if regex not in seen:
+            seen.add(regex)
+            problems.extend(lint_regex(regex, budget))
+
+    return problems
+
+
+def check_patterns(url_patterns):
+    """
+    Log the problems of `url_patterns` if `REDIRECT_URLS_LINT` is set, and raise
+    ImproperlyConfigured for those over the budget if it is 'error'.
+    """
+    mode = getattr(settings, 'REDIRECT_URLS_LINT', None)
+    if not mode:
+        return
+
+    problems = lint_patterns(url_patterns)
+    for problem in problems:
+        log.warning('Risky redirect regex %s', problem)
+
+    slow = [str(problem) for problem in problems if problem.over_budget]
+    if slow and mode == 'error':
+        raise ImproperlyConfigured('Redirect regexes over the time budget: {}'.format(
+            '; '.join(slow)))
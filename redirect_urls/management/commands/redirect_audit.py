@@ -0,0 +1,77 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import io
+import multiprocessing
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.encoding import force_text
+
+from redirect_urls.audit import CHUNK_SIZE, AuditSummary, audit_urls, read_urls
+
+
+class Command(BaseCommand):
+    help = ('Check a file of URLs or paths, one per line, against the registered redirects '
+            'in a pool of processes and write the status, location and pattern for each of '
+            'them as tab separated values.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='file of URLs to check, - for stdin')
+        parser.add_argument('--output', help='file to write the results to instead of stdout')
+        parser.add_argument('--header', action='append', default=[],
+                            help='header to send with every URL, e.g. "User-Agent: Firefox"')
+        parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+                            help='number of processes, the number of CPUs by default')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='number of URLs sent to a process at a time')
+        parser.add_argument('--top', type=int, default=10,
+                            help='number of the most matched patterns in the summary')
+
+    def handle(self, *args, **options):
+        headers = {}
+        for header in options['header']:
+            name, sep, value = header.partition(':')
+            if not sep:
+                raise CommandError('Headers look like "Name: value", not {!r}.'.format(header))
+            headers[name.strip()] = value.strip()
+
+        if options['processes'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--processes and --chunk-size must be at least 1.')
+
+        if options['input'] == '-':
+            lines = sys.stdin
+        else:
+            lines = io.open(options['input'], encoding='utf-8', errors='replace')
+
+        output = None
+        if options['output']:
+            output = io.open(options['output'], 'w', encoding='utf-8')
+
+        summary = AuditSummary()
+        try:
+            rows = audit_urls(read_urls(lines), headers or None, options['processes'],
+                              options['chunk_size'])
+            for row in rows:
+                summary.add(row)
+                line = u'\t'.join(u'' if value is None else force_text(value) for value in row)
+                if output is None:
+                    self.stdout.write(line)
+                else:
+                    output.write(line + u'\n')
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+            if output is not None:
+                output.close()
+
+        self.write_summary(summary, options['top'])
+
+    def write_summary(self, summary, top):
+        counts = ', '.join('{}: {}'.format(status or 'not redirected', count)
+                           for status, count in sorted(summary.statuses.items(),
+                                                       key=lambda item: item[0] or 0))
+        self.stderr.write(u'Checked {} URLs. {}'.format(summary.total, counts))
+        for pattern, count in summary.top_patterns(top):
+            self.stderr.write(u'{:>8}  {}'.format(count, pattern))
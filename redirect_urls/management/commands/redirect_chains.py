@@ -0,0 +1,44 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from redirect_urls.chains import find_chains
+
+
+class Command(BaseCommand):
+    help = ('Print the registered redirects whose destination is redirected again, '
+            'where the chain can be collapsed to, and the loops.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='print the chains as JSON')
+        parser.add_argument('--fail', action='store_true',
+                            help='exit with an error if there are loops')
+
+    def handle(self, *args, **options):
+        chains = find_chains()
+        if options['json']:
+            self.stdout.write(json.dumps([chain.as_dict() for chain in chains], indent=2))
+        else:
+            for chain in chains:
+                self.stdout.write(self.describe(chain))
+
+        loops = sum(1 for chain in chains if chain.loop)
+        if loops and options['fail']:
+            raise CommandError('Found {} redirect loops.'.format(loops))
+
+    def describe(self, chain):
+        line = '{} -> {}'.format(chain.label, ' -> '.join(chain.urls))
+        if chain.loop:
+            return line + '  [loop]'
+
+        notes = []
+        if chain.skipped:
+            notes.append('collapses to {}'.format(chain.destination))
+        if chain.reason:
+            notes.append('stops at {}: {}'.format(chain.urls[chain.skipped], chain.reason))
+
+        return '{}  [{}]'.format(line, ', '.join(notes))
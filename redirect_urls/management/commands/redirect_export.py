@@ -0,0 +1,43 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import io
+
+from django.core.management.base import BaseCommand
+
+from redirect_urls.export import export_redirects
+
+
+class Command(BaseCommand):
+    help = ('Write the registered redirects that an edge server can answer without Django '
+            'to an nginx map or an Apache RewriteMap text file.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('format', choices=['nginx', 'apache'])
+        parser.add_argument('--output', help='file to write the map to instead of stdout')
+        parser.add_argument('--locales', nargs='+', default=None,
+                            help='locale prefixes to export the paths of exact path redirects '
+                                 'for, REDIRECT_URLS_EXPORT_LOCALES or the LANGUAGES by default')
+        parser.add_argument('--report', action='store_true',
+                            help='list the redirects left to Django and why')
+
+    def handle(self, *args, **options):
+        export = export_redirects(locales=options['locales'])
+        if options['format'] == 'nginx':
+            output = export.nginx_map()
+        else:
+            output = export.apache_map()
+
+        if options['output']:
+            with io.open(options['output'], 'w', encoding='utf-8') as fp:
+                fp.write(output)
+        else:
+            self.stdout.write(output, ending='')
+
+        paths = sum(1 for edge in export.exact.values() if edge.status is not None)
+        self.stderr.write('Exported {} paths and {} regexes, left {} redirects to Django.'.format(
+            paths, len(export.regexes), len(export.skipped)))
+        if options['report']:
+            for label, reason in export.skipped:
+                self.stderr.write('{}  [{}]'.format(label, reason))
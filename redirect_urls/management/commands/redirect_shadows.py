@@ -0,0 +1,46 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from redirect_urls.shadows import find_shadows
+
+
+class Command(BaseCommand):
+    help = ('Print the registered redirects that can never match because of a pattern '
+            'before them, and the no_redirect patterns that protect nothing, with the time '
+            'each of them costs the requests that get to them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='print the findings as JSON')
+        parser.add_argument('--fail', action='store_true',
+                            help='exit with an error if there is anything to remove')
+
+    def handle(self, *args, **options):
+        findings = find_shadows()
+        if options['json']:
+            self.stdout.write(json.dumps([finding.as_dict() for finding in findings], indent=2))
+        else:
+            for finding in findings:
+                self.stdout.write(self.describe(finding))
+
+            self.stdout.write('Removing {} patterns saves about {:.1f} us on every request '
+                              'no redirect matches.'.format(
+                                  len(findings), sum(f.cost for f in findings) * 1e6))
+
+        if findings and options['fail']:
+            raise CommandError('Found {} patterns to remove.'.format(len(findings)))
+
+    def describe(self, finding):
+        if finding.kind == 'duplicate':
+            reason = 'duplicate of #{} {}'.format(*finding.cover)
+        elif finding.kind == 'shadowed':
+            reason = 'shadowed by #{} {}'.format(*finding.cover)
+        else:
+            reason = 'no_redirect that protects nothing'
+
+        return '#{} {}  [{}, {:.1f} us per request]'.format(
+            finding.position, finding.label, reason, finding.cost * 1e6)
@@ -0,0 +1,86 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from redirect_urls import utils
+from redirect_urls.stats import MISS, clear_stats, load_stats, registered_labels
+
+
+ORDERS = {
+    'hits': lambda s: s['hits'],
+    'resolve': lambda s: s['resolve_time'],
+    'view': lambda s: s['view_time'],
+}
+
+
+class Command(BaseCommand):
+    help = ('Print the redirect patterns ranked by hits or time from the stats the '
+            'middleware processes wrote to REDIRECT_URLS_STATS_DIR.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=getattr(settings, 'REDIRECT_URLS_STATS_DIR', None),
+                            help='directory of the stats files, REDIRECT_URLS_STATS_DIR by '
+                                 'default')
+        parser.add_argument('--order', choices=sorted(ORDERS), default='hits',
+                            help='rank by number of hits, total resolve time or total view '
+                                 'time')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='only print this many patterns')
+        parser.add_argument('--dead', action='store_true',
+                            help='also list the registered redirects that were never hit')
+        parser.add_argument('--json', action='store_true', help='print the stats as JSON')
+        parser.add_argument('--reset', action='store_true',
+                            help='remove the stats files after printing them')
+
+    def handle(self, *args, **options):
+        directory = options['dir']
+        if not directory:
+            raise CommandError('Set REDIRECT_URLS_STATS_DIR or pass --dir.')
+
+        stats = load_stats(directory)
+        stats.sort(key=ORDERS[options['order']], reverse=True)
+        if options['dead']:
+            hit = set(s['pattern'] for s in stats)
+            # the registry is replaced when it is reloaded
+            for label in registered_labels(utils.redirectpatterns):
+                if label not in hit:
+                    hit.add(label)
+                    stats.append({'pattern': label, 'hits': 0, 'resolve_time': 0.0,
+                                  'view_time': 0.0})
+
+        if options['limit'] is not None:
+            stats = stats[:options['limit']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(stats, indent=2))
+        else:
+            self.write_table(stats)
+
+        if options['reset']:
+            clear_stats(directory)
+
+    def write_table(self, stats):
+        rows = [['rank', 'hits', 'resolve ms', 'avg resolve us', 'view ms', 'avg view us',
+                 'pattern']]
+        for rank, s in enumerate(stats, 1):
+            hits = s['hits'] or 1
+            rows.append([
+                str(rank),
+                str(s['hits']),
+                '{:.1f}'.format(s['resolve_time'] * 1e3),
+                '{:.1f}'.format(s['resolve_time'] / hits * 1e6),
+                '{:.1f}'.format(s['view_time'] * 1e3),
+                # misses don't run a view
+                '' if s['pattern'] == MISS else '{:.1f}'.format(s['view_time'] / hits * 1e6),
+                s['pattern'],
+            ])
+
+        widths = [max(len(row[n]) for row in rows) for n in range(len(rows[0]) - 1)]
+        for row in rows:
+            cells = [cell.rjust(width) for cell, width in zip(row, widths)]
+            self.stdout.write('  '.join(cells + [row[-1]]))
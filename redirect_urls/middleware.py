@@ -1,18 +1,80 @@
+import sys
+import threading
+from timeit import default_timer
+
+from django.conf import settings
 from django.urls import Resolver404
 
-from redirect_urls.utils import get_resolver
+from redirect_urls.cache import LRUCache
+from redirect_urls.database import DatabaseRedirects
+from redirect_urls.signals import redirects_changed, redirects_registered, redirects_reloaded
+from redirect_urls.stats import get_stats, match_key
+from redirect_urls.utils import default_resolver, warm_redirects
+from redirect_urls.wsgi import RESOLVED_KEY
+
+if sys.version_info < (3, 5):
+    # no async def
+    acall = mark_async = None
+else:
+    from redirect_urls.asgi import acall, mark_async
+
+
+# seconds between reorderings of the patterns by default
+REORDER_INTERVAL = 60
 
 
 class RedirectsMiddleware(object):
-    def __init__(self, get_response=None, resolver=None):
+    # Django 3.1+ passes an async `get_response` under ASGI, see `redirect_urls.asgi`
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, resolver=None, miss_cache_size=None, stats=None):
         self.get_response = get_response
-        self.resolver = resolver or get_resolver()
+        self.async_mode = mark_async is not None and mark_async(self, get_response)
+        self.resolver = resolver
+        if resolver is None:
+            self.resolver = default_resolver()
+            # follow `set_redirectpatterns()` when using the registry
+            redirects_reloaded.connect(self.reload_resolver)
+            if getattr(settings, 'REDIRECT_URLS_WARM', False):
+                warm_redirects()
+
+        if miss_cache_size is None:
+            miss_cache_size = getattr(settings, 'REDIRECT_URLS_MISS_CACHE_SIZE', 0)
+
+        # paths known not to match any redirect pattern
+        self.miss_cache = None
+        # checked for changes before the miss cache, which they clear, and outside
+        # of the event loop under ASGI, where Django refuses queries
+        self.database_sources = self.find_database_sources()
+        # `register()` can add database redirects
+        redirects_registered.connect(self.clear_miss_cache)
+        if miss_cache_size:
+            self.miss_cache = LRUCache(miss_cache_size)
+            redirects_changed.connect(self.clear_miss_cache)
+
+        # per-pattern counters, see `redirect_urls.stats`
+        self.stats = stats or get_stats()
+        # promote the most matched patterns of resolvers with a `hot_size` every so often
+        self.reorder_interval = getattr(settings, 'REDIRECT_URLS_REORDER_INTERVAL',
+                                        REORDER_INTERVAL)
+        self.reorder_at = float('inf')
+        self.reorder_lock = threading.Lock()
+        self.reorder_thread = None
+        if self.stats is not None and getattr(self.resolver, 'hot_size', 0):
+            self.reorder_at = default_timer() + self.reorder_interval
+
         super(RedirectsMiddleware, self).__init__()
 
     def __call__(self, request):
-        try:
-            resolver_match = self.resolver.resolve(request.path_info)
-        except Resolver404:
+        if self.async_mode:
+            return acall(self, request)
+
+        if self.stats is not None:
+            return self.call_with_stats(request)
+
+        resolver_match = self.resolve_request(request)
+        if resolver_match is None:
             if self.get_response is None:
                 return None
             else:
@@ -21,3 +83,98 @@ class RedirectsMiddleware(object):
         callback, callback_args, callback_kwargs = resolver_match
         request.resolver_match = resolver_match
         return callback(request, *callback_args, **callback_kwargs)
+
+    def call_with_stats(self, request, get_response=None):
+        """
+        Same as `__call__` but records the match and timings in `self.stats`.
+        Requests that aren't redirected are passed to `get_response` if given,
+        and only counted since timing them costs about as much as resolving them.
+        """
+        stats = self.stats
+        start = default_timer()
+        resolver_match = self.resolve_request(request)
+        if resolver_match is None:
+            stats.count_miss()
+            if stats.directory and default_timer() >= stats.publish_at:
+                stats.publish()
+
+            get_response = get_response or self.get_response
+            if get_response is None:
+                return None
+            else:
+                return get_response(request)
+
+        resolved = default_timer()
+        callback, callback_args, callback_kwargs = resolver_match
+        request.resolver_match = resolver_match
+        response = callback(request, *callback_args, **callback_kwargs)
+        end = default_timer()
+        stats.record(match_key(resolver_match), resolved - start, end - resolved)
+        if end >= stats.publish_at:
+            stats.publish()
+
+        if end >= self.reorder_at:
+            self.reorder_at = end + self.reorder_interval
+            # telling which patterns can be promoted takes a while for long lists
+            self.reorder_thread = threading.Thread(target=self.reorder)
+            self.reorder_thread.daemon = True
+            self.reorder_thread.start()
+
+        return response
+
+    def reorder(self):
+        """Have the resolver try the patterns with the most hits so far first."""
+        # skip it if the last one is still running
+        if self.reorder_lock.acquire(False):
+            try:
+                self.resolver.reorder(self.stats.hits())
+            finally:
+                self.reorder_lock.release()
+
+    def resolve_request(self, request):
+        """
+        Return the ResolverMatch of the redirect pattern matching the request or None,
+        reusing the one `redirect_urls.wsgi.RedirectsApplication` found.
+        """
+        resolved = request.META.get(RESOLVED_KEY)
+        if resolved is not None and resolved[0] is self.resolver.url_patterns:
+            return resolved[1]
+
+        return self.resolve(request.path_info)
+
+    def resolve(self, path):
+        """Return the ResolverMatch of the redirect pattern matching `path` or None."""
+        miss_cache = self.miss_cache
+        if miss_cache is not None:
+            for source in self.database_sources:
+                source.refresh()
+
+            if miss_cache.get(path):
+                return None
+
+        try:
+            return self.resolver.resolve(path)
+        except Resolver404:
+            if miss_cache is not None:
+                miss_cache.set(path, True)
+
+            return None
+
+    def reload_resolver(self, patterns, **kwargs):
+        """Swap in the resolver for the new registry, built before any request uses it."""
+        resolver = default_resolver()
+        resolver.warm()
+        self.resolver = resolver
+        self.database_sources = self.find_database_sources()
+        # after the resolver so that misses of the old one can't end up in it
+        if self.miss_cache is not None:
+            self.miss_cache = LRUCache(self.miss_cache.maxsize)
+
+    def clear_miss_cache(self, **kwargs):
+        self.database_sources = self.find_database_sources()
+        if self.miss_cache is not None:
+            self.miss_cache.clear()
+
+    def find_database_sources(self):
+        return [pattern for pattern in getattr(self.resolver, 'url_patterns', ())
+                if isinstance(pattern, DatabaseRedirects)]
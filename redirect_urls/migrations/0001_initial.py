@@ -0,0 +1,47 @@
+# Generated by Django 2.2.28 on 2026-10-16 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Redirect',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pattern', models.CharField(help_text='Regex of the paths to redirect, e.g. ^firefox/old/$, without the locale prefix.', max_length=500)),
+                ('to', models.CharField(blank=True, help_text='URL name or URL to redirect to. Not needed if gone.', max_length=1000)),
+                ('permanent', models.BooleanField(default=True, help_text='301 rather than 302.')),
+                ('gone', models.BooleanField(default=False, help_text='Return a 410 instead of redirecting.')),
+                ('locale_prefix', models.BooleanField(default=True, help_text='Also match after a locale prefix.')),
+                ('anchor', models.CharField(blank=True, max_length=200)),
+                ('query', models.CharField(blank=True, help_text='Query string for the destination. Empty removes the requested one and null keeps it.', max_length=1000, null=True)),
+                ('merge_query', models.BooleanField(default=False, help_text='Merge the query with the requested one.')),
+                ('cache_timeout', models.PositiveIntegerField(blank=True, default=12, help_text='Hours to cache the redirect.', null=True)),
+                ('re_flags', models.CharField(blank=True, help_text='Any of "iLmsux".', max_length=6)),
+                ('prepend_locale', models.BooleanField(default=True, help_text='Add the requested locale to the URL.')),
+                ('order', models.IntegerField(db_index=True, default=0, help_text='Redirects are tried in this order.')),
+                ('enabled', models.BooleanField(default=True)),
+            ],
+            options={
+                'db_table': 'redirect_urls_redirect',
+                'ordering': ['order', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RedirectsVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'redirect_urls_redirectsversion',
+            },
+        ),
+    ]
@@ -0,0 +1,126 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import re
+try:
+    from urllib.parse import parse_qs
+except ImportError:
+    from urlparse import parse_qs
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from redirect_urls.utils import LOCALE_RE, gone, redirect
+
+
+class Redirect(models.Model):
+    """
+    A redirect managed in the database, with the same options as `redirect()`.
+    The `database_redirects()` source serves the enabled ones in `order`.
+    """
+    pattern = models.CharField(max_length=500, help_text='Regex of the paths to redirect, '
+                               'e.g. ^firefox/old/$, without the locale prefix.')
+    to = models.CharField(max_length=1000, blank=True,
+                          help_text='URL name or URL to redirect to. Not needed if gone.')
+    permanent = models.BooleanField(default=True, help_text='301 rather than 302.')
+    gone = models.BooleanField(default=False, help_text='Return a 410 instead of redirecting.')
+    locale_prefix = models.BooleanField(default=True,
+                                        help_text='Also match after a locale prefix.')
+    anchor = models.CharField(max_length=200, blank=True)
+    query = models.CharField(max_length=1000, null=True, blank=True,
+                             help_text='Query string for the destination. Empty removes the '
+                                       'requested one and null keeps it.')
+    merge_query = models.BooleanField(default=False,
+                                      help_text='Merge the query with the requested one.')
+    cache_timeout = models.PositiveIntegerField(null=True, blank=True, default=12,
+                                                help_text='Hours to cache the redirect.')
+    re_flags = models.CharField(max_length=6, blank=True, help_text='Any of "iLmsux".')
+    prepend_locale = models.BooleanField(default=True,
+                                         help_text='Add the requested locale to the URL.')
+    order = models.IntegerField(default=0, db_index=True,
+                                help_text='Redirects are tried in this order.')
+    enabled = models.BooleanField(default=True)
+
+    class Meta:
+        db_table = 'redirect_urls_redirect'
+        ordering = ['order', 'id']
+
+    def __str__(self):
+        return '{} -> {}'.format(self.pattern, 'gone' if self.gone else self.to)
+
+    def clean(self):
+        try:
+            re.compile(self.url_pattern_regex())
+        except re.error as e:
+            raise ValidationError({'pattern': 'Not a valid regex: {}'.format(e)})
+
+        if not (self.to or self.gone):
+            raise ValidationError({'to': 'Needed unless the redirect is gone.'})
+
+    def url_pattern_regex(self):
+        pattern = self.pattern
+        if self.locale_prefix:
+            pattern = LOCALE_RE + pattern.lstrip('^/')
+
+        if self.re_flags:
+            pattern = '(?{})'.format(self.re_flags) + pattern
+
+        return pattern
+
+    def url_pattern(self):
+        """Return the `redirect()` or `gone()` pattern of this redirect."""
+        if self.gone:
+            return gone(self.url_pattern_regex())
+
+        query = self.query
+        if query:
+            query = parse_qs(query, keep_blank_values=True)
+        elif query is not None:
+            query = {}
+
+        return redirect(self.pattern, self.to, permanent=self.permanent,
+                        locale_prefix=self.locale_prefix, anchor=self.anchor or None,
+                        query=query, cache_timeout=self.cache_timeout,
+                        re_flags=self.re_flags or None, prepend_locale=self.prepend_locale,
+                        merge_query=self.merge_query)
+
+
+class RedirectsVersion(models.Model):
+    """
+    A counter in a single row, bumped whenever a `Redirect` is saved or deleted, so
+    that the workers can tell with one cheap query whether to load them again.
+    """
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'redirect_urls_redirectsversion'
+
+
+def current_version():
+    """Return the version of the redirects in the database."""
+    versions = RedirectsVersion.objects.filter(pk=1).values_list('version', flat=True)
+    for version in versions:
+        return version
+
+    return 0
+
+
+def bump_version():
+    """
+    Have the workers load the redirects again. Done when a `Redirect` is saved or
+    deleted, but not by queryset `update()`, `bulk_create()` or raw SQL.
+    """
+    if not RedirectsVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        version, created = RedirectsVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+        if not created:
+            RedirectsVersion.objects.filter(pk=1).update(version=F('version') + 1)
+
+
+@receiver(post_save, sender=Redirect)
+@receiver(post_delete, sender=Redirect)
+def redirect_changed(sender, **kwargs):
+    bump_version()
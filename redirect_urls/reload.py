@@ -0,0 +1,200 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Reload the redirects registry when the `redirects.py` modules of the apps or the
+data files of the redirect tables in it change.
+
+Set `REDIRECT_URLS_RELOAD_INTERVAL` to a number of seconds and a background thread
+checks the files that often. When a module changed it is imported again, and when
+a data file changed its table is loaded again. The registry is then replaced with
+one where the old patterns and tables are swapped for the new ones. The middleware
+build their new resolvers in that thread before switching to them, so requests are
+never held up or served by a half built table. Patterns registered by other code
+stay where they were.
+
+Threads don't survive a fork, so a server that loads the application before
+forking its workers, like gunicorn with `--preload`, would leave them without
+one. On Python 3.7+ a started reloader starts a thread of its own in every
+process forked from it. Before that, call `after_fork()` in the workers.
+"""
+
+import logging
+import os
+import threading
+from importlib import import_module
+
+try:
+    from importlib import reload
+except ImportError:
+    # py2 builtin
+    pass
+
+from django.apps import apps
+from django.conf import settings
+
+from redirect_urls import utils
+from redirect_urls.chains import collapse_chains
+from redirect_urls.lint import check_patterns
+from redirect_urls.tables import RedirectTable
+
+
+log = logging.getLogger(__name__)
+
+
+def redirects_modules():
+    """Return the `redirects` modules of the installed apps that have redirect patterns."""
+    modules = []
+    for app in apps.get_app_configs():
+        try:
+            module = import_module(app.name + '.redirects')
+        except ImportError:
+            continue
+
+        if hasattr(module, 'redirectpatterns'):
+            modules.append(module)
+
+    return modules
+
+
+def source_mtime(module):
+    filename = getattr(module, '__file__', None)
+    if not filename:
+        return None
+
+    if filename.endswith('.pyc'):
+        filename = filename[:-1]
+
+    try:
+        return os.stat(filename).st_mtime
+    except OSError:
+        return None
+
+
+class RedirectsReloader(object):
+    def __init__(self, modules, interval):
+        self.modules = list(modules)
+        self.interval = interval
+        # module name -> the patterns it had when it was last loaded
+        self.loaded = dict((module.__name__, list(module.redirectpatterns))
+                           for module in self.modules)
+        self.mtimes = self.current_mtimes()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.fork_hook = False
+
+    def current_mtimes(self):
+        return dict((module.__name__, source_mtime(module)) for module in self.modules)
+
+    def check(self):
+        """Reload the files that changed since the last check. Return whether any did."""
+        mtimes = self.current_mtimes()
+        changed = [module for module in self.modules
+                   if mtimes[module.__name__] != self.mtimes[module.__name__]]
+        registry = utils.redirectpatterns
+        tables = [table for table in registry
+                  if isinstance(table, RedirectTable) and table.filename and table.changed()]
+        if not (changed or tables):
+            return False
+
+        # module name or table -> its new patterns
+        fresh = {}
+        # id of a pattern that is reloaded -> module name or table
+        owners = {}
+        for module in changed:
+            name = module.__name__
+            try:
+                reload(module)
+                # refused like a module that doesn't import
+                check_patterns(module.redirectpatterns)
+            except Exception:
+                log.exception('Could not reload the redirects in %s', name)
+                # a broken module isn't tried again until it changes again
+                self.mtimes[name] = mtimes[name]
+                continue
+
+            fresh[name] = list(module.redirectpatterns)
+            for pattern in self.loaded[name]:
+                owners[id(pattern)] = name
+
+        for table in tables:
+            try:
+                fresh[table] = [table.reloaded()]
+            except Exception:
+                log.exception('Could not reload the redirects in %s', table.filename)
+                # like a module, not tried again until it changes again
+                table.mtime = table.file_mtime()
+                continue
+
+            owners[id(table)] = table
+
+        if not fresh:
+            return False
+
+        patterns = self.merge(registry, fresh, owners)
+        if getattr(settings, 'REDIRECT_URLS_COLLAPSE_CHAINS', False):
+            # before the new patterns serve any request
+            collapse_chains(patterns)
+
+        utils.set_redirectpatterns(patterns)
+        # only now, so that the files are tried again if the patterns couldn't be set
+        for module in changed:
+            name = module.__name__
+            if name in fresh:
+                self.loaded[name] = fresh[name]
+                self.mtimes[name] = mtimes[name]
+
+        return True
+
+    def merge(self, registry, fresh, owners):
+        """
+        Return a copy of `registry` where the patterns in `owners`, a dict of pattern
+        id -> owner, are replaced by the patterns in `fresh`, a dict of owner -> new
+        patterns. The owners are module names or tables.
+        """
+        patterns = []
+        replaced = set()
+        for pattern in registry:
+            owner = owners.get(id(pattern))
+            if owner is None:
+                patterns.append(pattern)
+            elif owner not in replaced:
+                replaced.add(owner)
+                patterns.extend(fresh[owner])
+
+        # modules that had no patterns before
+        for owner in fresh:
+            if owner not in replaced:
+                patterns.extend(fresh[owner])
+
+        return patterns
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                # keep checking, the next change may well work
+                log.exception('Could not reload the redirects')
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='redirect-urls-reload')
+        self.thread.daemon = True
+        self.thread.start()
+        if not self.fork_hook and hasattr(os, 'register_at_fork'):
+            # py3.7+
+            os.register_at_fork(after_in_child=self.after_fork)
+            self.fork_hook = True
+
+    def after_fork(self):
+        """Start a thread in a process forked from the one the reloader was started in."""
+        if self.thread is None or self.thread.is_alive() or self.stopped.is_set():
+            return
+
+        # the one of the parent may be waited on by its thread, which is gone
+        self.stopped = threading.Event()
+        self.start()
+
+    def stop(self):
+        self.stopped.set()
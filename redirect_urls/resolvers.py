@@ -0,0 +1,798 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import re
+from bisect import bisect_left
+
+from django.urls import Resolver404
+from django.utils.encoding import force_text
+try:
+    from django.urls import RegexURLPattern as URLPattern, RegexURLResolver as URLResolver
+    RegexPattern = None
+except ImportError:
+    # Names changed in Django 2.0
+    from django.urls.resolvers import RegexPattern, URLPattern, URLResolver
+
+from redirect_urls.database import DatabaseRedirects
+from redirect_urls.tables import RedirectTable
+from redirect_urls.utils import LOCALE_PREFIX_RE, LOCALE_RE, basestring
+
+
+# sources of many redirects that go in the list of patterns and resolve like them
+REDIRECT_SOURCES = (RedirectTable, DatabaseRedirects)
+# text that could be the start of a locale prefix
+PARTIAL_LOCALE_RE = re.compile(r'\w{0,3}(?:-\w{0,2})?$', re.UNICODE)
+# characters that mean something other than themselves in a regex unless escaped
+REGEX_SPECIAL_CHARS = frozenset('.^$*+?{}[]|()')
+# number of regex patterns combined into one alternation by default
+COMBINED_CHUNK_SIZE = 100
+# number of the most matched patterns tried first by default when reordering
+HOT_LANE_SIZE = 16
+
+
+def resolver_pattern(regex):
+    """Return the pattern for a URLResolver matching `regex`."""
+    if RegexPattern:
+        return RegexPattern(regex)
+    return regex
+
+
+def pattern_label(url_pattern):
+    """Return the regex of a pattern, or what a redirect table or the database is called."""
+    if isinstance(url_pattern, RedirectTable):
+        return url_pattern.filename or 'table'
+    if isinstance(url_pattern, DatabaseRedirects):
+        return 'database redirects'
+
+    return pattern_regex(url_pattern) or repr(url_pattern)
+
+
+def pattern_regex(url_pattern):
+    """Return the regex string of a URL pattern or None if it isn't regex based."""
+    # Django 2.0+ keeps the regex on a separate pattern object
+    regex = getattr(getattr(url_pattern, 'pattern', url_pattern), '_regex', None)
+    # lazy translated patterns can be different for every request
+    if isinstance(regex, basestring):
+        return regex
+
+    return None
+
+
+def compile_regexes(url_pattern):
+    """
+    Compile the regexes of a URL pattern, or of a resolver and all of its patterns,
+    which Django otherwise does the first time each of them is tried.
+    """
+    # Django 2.0+ keeps the regex on a separate pattern object
+    getattr(getattr(url_pattern, 'pattern', url_pattern), 'regex', None)
+    if isinstance(url_pattern, URLResolver):
+        for sub_pattern in url_pattern.url_patterns:
+            compile_regexes(sub_pattern)
+
+
+def regex_literal(regex):
+    """
+    Return the string matched by `regex` if it is made only of plain and escaped
+    punctuation characters, otherwise None.
+    """
+    chars = []
+    escaped = False
+    for char in regex:
+        if escaped:
+            # escaped letters and digits are classes (\d, \w) or backreferences (\1)
+            if char.isalnum():
+                return None
+            chars.append(char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char in REGEX_SPECIAL_CHARS:
+            return None
+        else:
+            chars.append(char)
+
+    if escaped:
+        return None
+
+    return ''.join(chars)
+
+
+def regex_prefix(regex):
+    """Return the literal text at the start of every string `regex` matches."""
+    chars = []
+    escaped = False
+    for char in regex:
+        if escaped:
+            if char.isalnum():
+                break
+            chars.append(char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char in REGEX_SPECIAL_CHARS:
+            # the last character is optional or repeated
+            if char in '*+?{' and chars:
+                chars.pop()
+            break
+        else:
+            chars.append(char)
+
+    return ''.join(chars)
+
+
+def body_prefix(regex):
+    """
+    Return the literal text at the start of every path `regex` can match, without
+    the optional locale prefix added by `redirect()` and `no_redirect()`, or None
+    if the start of the path isn't literal.
+    """
+    if not regex:
+        return None
+
+    if regex.startswith(LOCALE_RE):
+        body = regex[len(LOCALE_RE):]
+    elif regex.startswith('^'):
+        body = regex[1:]
+    else:
+        return None
+
+    # a top level alternation may not start with the same prefix
+    if uncaptured_regex('^' + body, validate=False) is None:
+        return None
+
+    return regex_prefix(body)
+
+
+def first_segment(regex):
+    """
+    Return the first segment of the path, without the optional locale prefix added
+    by `redirect()` and `no_redirect()`, that `regex` can match or None if it isn't
+    a literal followed by a slash.
+    """
+    prefix = body_prefix(regex)
+    if not prefix or '/' not in prefix:
+        return None
+
+    return prefix.split('/', 1)[0]
+
+
+def segment_prefix(regex):
+    """
+    Return the literal start of the paths `regex` can match, as `body_prefix()`,
+    if it can't be taken for a locale prefix or the start of one. Otherwise None.
+
+    A path can only have one locale, so two patterns with such prefixes can't match
+    the same path unless one of the prefixes starts with the other.
+    """
+    prefix = body_prefix(regex)
+    if not prefix or LOCALE_PREFIX_RE.match(prefix).group('locale'):
+        return None
+
+    if '/' not in prefix and PARTIAL_LOCALE_RE.match(prefix):
+        return None
+
+    return prefix
+
+
+def exact_path(regex):
+    """
+    Return a `(locale_prefix, path)` tuple if `regex` can only match `path`, optionally
+    preceded by the locale added by `redirect()` and `no_redirect()`. Otherwise None.
+    """
+    if not regex:
+        return None
+
+    if regex.startswith(LOCALE_RE):
+        locale_prefix = True
+        body = regex[len(LOCALE_RE):]
+    elif regex.startswith('^'):
+        locale_prefix = False
+        body = regex[1:]
+    else:
+        return None
+
+    if not body.endswith('$'):
+        return None
+
+    path = regex_literal(body[:-1])
+    if path is None:
+        return None
+
+    return locale_prefix, path
+
+
+def uncaptured_regex(regex, validate=True):
+    """
+    Return `regex` with all of its groups made non-capturing so that it can be one
+    alternative in a larger regex matched at the start of the path. Return None if
+    it isn't anchored or uses backreferences, global flags, or a top level `|`.
+    Unless `validate` is False, also return None if the result doesn't compile.
+    """
+    if not regex or not regex.startswith('^'):
+        return None
+
+    parts = []
+    depth = 0
+    i = 0
+    while i < len(regex):
+        char = regex[i]
+        if char == '\\':
+            escaped = regex[i + 1:i + 2]
+            if escaped.isdigit() and escaped != '0':
+                return None
+
+            parts.append(regex[i:i + 2])
+            i += 2
+        elif char == '[':
+            end = i + 1
+            if regex[end:end + 1] == '^':
+                end += 1
+            # a ] right after the opening is part of the set
+            if regex[end:end + 1] == ']':
+                end += 1
+            while end < len(regex) and regex[end] != ']':
+                end += 2 if regex[end] == '\\' else 1
+
+            if end >= len(regex):
+                return None
+
+            parts.append(regex[i:end + 1])
+            i = end + 1
+        elif char == '(':
+            depth += 1
+            group = regex[i + 1:i + 3]
+            if group == '?P':
+                end = regex.find('>', i)
+                if regex[i + 3:i + 4] != '<' or end == -1:
+                    return None
+
+                parts.append('(?:')
+                i = end + 1
+            elif group[:1] != '?':
+                parts.append('(?:')
+                i += 1
+            elif group[1:] in (':', '=', '!', '>') or regex[i + 2:i + 4] in ('<=', '<!'):
+                parts.append('(?')
+                i += 2
+            elif group[1:] == '#':
+                end = regex.find(')', i)
+                if end == -1:
+                    return None
+
+                depth -= 1
+                parts.append(regex[i:end + 1])
+                i = end + 1
+            else:
+                # only scoped flags like (?i:...) are local to the pattern
+                end = i + 2
+                while end < len(regex) and (regex[end].isalpha() or regex[end] == '-'):
+                    end += 1
+
+                if regex[end:end + 1] != ':':
+                    return None
+
+                parts.append(regex[i:end + 1])
+                i = end + 1
+        else:
+            if char == ')':
+                depth -= 1
+            elif char == '|' and depth == 0:
+                return None
+
+            parts.append(char)
+            i += 1
+
+    uncaptured = ''.join(parts)
+    if validate:
+        try:
+            re.compile(uncaptured)
+        except re.error:
+            return None
+
+    return uncaptured
+
+
+class Alternation(object):
+    """
+    A list of regexes combined into a single one to find out with one match whether
+    any of them match a path at a given position.
+    """
+    def __init__(self, regexes, offset=0):
+        self.regexes = regexes
+        self.offset = offset
+        # the patterns are compiled with re.UNICODE too
+        self.regex = re.compile('|'.join('(?:{})'.format(regex) for regex in regexes),
+                                re.UNICODE)
+        self._halves = None
+
+    def first(self, path, pos=0):
+        """Return the position of the first regex matching `path` or None."""
+        if not self.regex.match(path, pos):
+            return None
+
+        if len(self.regexes) == 1:
+            return self.offset
+
+        # tagging every alternative with a group makes each match much slower,
+        # so bisect the alternation on a hit instead.
+        halves = self._halves
+        if halves is None:
+            middle = len(self.regexes) // 2
+            halves = self._halves = (
+                Alternation(self.regexes[:middle], self.offset),
+                Alternation(self.regexes[middle:], self.offset + middle),
+            )
+
+        position = halves[0].first(path, pos)
+        if position is None:
+            position = halves[1].first(path, pos)
+
+        return position
+
+
+class PatternLane(object):
+    """Patterns from the list tried one at a time in order."""
+    def __init__(self, entries):
+        # (index, resolve) for each pattern
+        self.entries = entries
+
+    def first(self, path, limit=None, locale=None):
+        """
+        Return `(index, ResolverMatch)` for the first pattern before `limit` that
+        matches `path`, or None.
+        """
+        for i, resolve in self.entries:
+            if limit is not None and i >= limit:
+                break
+
+            match = resolve(path)
+            if match:
+                return i, match
+
+        return None
+
+
+class HotLane(object):
+    """
+    The most matched patterns, tried before all others with one combined regex.
+
+    Each of them can't match any path a pattern before it in the list can, so no
+    two of them match the same path and a match is the first match in the list
+    unless an exact path pattern before it matches too.
+    """
+    def __init__(self, entries, regexes):
+        # (index, resolve) for each pattern, the most matched first
+        self.entries = entries
+        self.alternation = Alternation(regexes)
+
+    def first(self, path, limit=None, locale=None):
+        position = self.alternation.first(path)
+        if position is None:
+            return None
+
+        i, resolve = self.entries[position]
+        if limit is not None and i >= limit:
+            return None
+
+        match = resolve(path)
+        if match:
+            return i, match
+
+        return None
+
+
+class Promotions(object):
+    """
+    Tells which patterns can be tried before all others without changing which
+    pattern matches first, based on the literal start of the paths they match.
+    """
+    def __init__(self, url_patterns, dynamic):
+        # pattern -> (index, prefix, regex) of the patterns that could be promoted
+        self.candidates = {}
+        # literal prefix -> index of the first pattern with it
+        self.prefixes = {}
+        # index of the first pattern that could match paths with any prefix
+        self.unprovable = len(url_patterns)
+        for i, _ in dynamic:
+            url_pattern = url_patterns[i]
+            prefix = None
+            if isinstance(url_pattern, URLPattern):
+                regex = pattern_regex(url_pattern)
+                prefix = segment_prefix(regex)
+
+            if prefix is None:
+                self.unprovable = min(self.unprovable, i)
+                continue
+
+            self.prefixes.setdefault(prefix, i)
+            if i < self.unprovable:
+                self.candidates.setdefault(url_pattern, (i, prefix, regex))
+
+        self.sorted_prefixes = sorted(self.prefixes)
+
+    def position(self, url_pattern):
+        """
+        Return `(index, regex)` for `url_pattern` if no pattern before it in the list
+        can match a path it matches, otherwise None.
+        """
+        i, prefix, regex = self.candidates.get(url_pattern, (None, None, None))
+        if i is None:
+            return None
+
+        # earlier patterns whose prefixes `prefix` starts with, including itself
+        for end in range(1, len(prefix) + 1):
+            first = self.prefixes.get(prefix[:end])
+            if first is not None and first < i:
+                return None
+
+        # earlier patterns whose prefixes start with `prefix`
+        sorted_prefixes = self.sorted_prefixes
+        pos = bisect_left(sorted_prefixes, prefix)
+        while pos < len(sorted_prefixes) and sorted_prefixes[pos].startswith(prefix):
+            if self.prefixes[sorted_prefixes[pos]] < i:
+                return None
+
+            pos += 1
+
+        regex = uncaptured_regex(regex)
+        if regex is None:
+            return None
+
+        return i, regex
+
+
+class CombinedLane(PatternLane):
+    """
+    Patterns from the list tried in chunks with one combined regex per chunk.
+
+    With `locale` set the regexes are the patterns without the locale prefix, which
+    are matched after the locale found in the path and from the start of the path.
+    """
+    def __init__(self, entries, regexes, chunk_size, locale=False):
+        super(CombinedLane, self).__init__(entries)
+        self.locale = locale
+        self.chunks = []
+        self.matchers = None
+        if chunk_size == 1:
+            # skip the bookkeeping of chunks if each pattern is on its own
+            self.matchers = [re.compile(regex, re.UNICODE).match for regex in regexes]
+            return
+
+        for start in range(0, len(entries), chunk_size):
+            self.chunks.append((entries[start:start + chunk_size],
+                                Alternation(regexes[start:start + chunk_size])))
+
+    def first(self, path, limit=None, locale=None):
+        start = len(locale) if self.locale and locale else 0
+        positions = (start, 0) if start else (0,)
+        if self.matchers is not None:
+            for (i, resolve), match in zip(self.entries, self.matchers):
+                if limit is not None and i >= limit:
+                    break
+
+                if match(path, start) or (start and match(path)):
+                    resolver_match = resolve(path)
+                    if resolver_match:
+                        return i, resolver_match
+
+            return None
+
+        for entries, alternation in self.chunks:
+            if limit is not None and entries[0][0] >= limit:
+                break
+
+            found = [alternation.first(path, pos) for pos in positions]
+            found = [position for position in found if position is not None]
+            if not found:
+                continue
+
+            # the combined regex only finds the candidate. the pattern itself has
+            # the final say and provides the captured arguments.
+            for i, resolve in entries[min(found):]:
+                if limit is not None and i >= limit:
+                    return None
+
+                match = resolve(path)
+                if match:
+                    return i, match
+
+        return None
+
+
+class PatternIndex(object):
+    """
+    A snapshot of a list of URL patterns. Patterns that can only match a single path
+    are kept in dicts keyed by that path, `RedirectTable`s are looked up in their own
+    dicts, and all others are tried in order in lanes:
+
+    * with `chunk_size` set, regexes are tried that many at a time with one combined
+      regex per chunk.
+    * with `locale_dispatch` set, the locale prefix is matched once per path and
+      only the rest of each locale prefixed regex is tried.
+    * with `sharded` set, regexes starting with a literal path segment are only
+      tried for paths starting with that segment.
+    """
+    def __init__(self, url_patterns, chunk_size=None, locale_dispatch=False, sharded=False):
+        self.size = len(url_patterns)
+        self.patterns = list(url_patterns)
+        self.resolvers = [self._entry_resolver(p) for p in self.patterns]
+        # path -> index of the first pattern matching exactly that path
+        self.paths = {}
+        # same but for patterns with the optional locale prefix
+        self.locale_paths = {}
+        # (index, table) of the redirect tables
+        self.tables = []
+        # (index, resolve) for everything else
+        self.dynamic = []
+        for i, url_pattern in enumerate(self.patterns):
+            if isinstance(url_pattern, RedirectTable):
+                self.tables.append((i, url_pattern))
+                continue
+
+            exact = None
+            if isinstance(url_pattern, URLPattern):
+                exact = exact_path(pattern_regex(url_pattern))
+
+            if exact is None:
+                self.dynamic.append((i, self.resolvers[i]))
+            else:
+                locale_prefix, path = exact
+                paths = self.locale_paths if locale_prefix else self.paths
+                paths.setdefault(path, i)
+
+        # first path segment -> lanes of the patterns starting with it
+        self.shards = {}
+        unsharded = self.dynamic
+        if sharded:
+            unsharded = []
+            sharded_entries = {}
+            for i, resolve in self.dynamic:
+                segment = None
+                if isinstance(self.patterns[i], URLPattern):
+                    segment = first_segment(pattern_regex(self.patterns[i]))
+
+                if segment is None:
+                    unsharded.append((i, resolve))
+                else:
+                    sharded_entries.setdefault(segment, []).append((i, resolve))
+
+            for segment, entries in sharded_entries.items():
+                self.shards[segment] = self._lanes(entries, chunk_size, locale_dispatch)
+
+        self.lanes = self._lanes(unsharded, chunk_size, locale_dispatch)
+        # the most matched patterns that can be tried before all others, see `promote()`
+        self.hot = None
+        self._promotions = None
+
+    def _lanes(self, dynamic, chunk_size, locale_dispatch):
+        if not (chunk_size or locale_dispatch):
+            return [PatternLane(dynamic)] if dynamic else []
+
+        plain, combined, localized = [], [], []
+        for i, resolve in dynamic:
+            regex = None
+            if isinstance(self.patterns[i], URLPattern):
+                regex = pattern_regex(self.patterns[i])
+
+            if locale_dispatch and regex and regex.startswith(LOCALE_RE):
+                body = uncaptured_regex('^' + regex[len(LOCALE_RE):])
+                if body is not None:
+                    # Pattern.match() anchors at the position it is given
+                    localized.append((i, resolve, body[1:]))
+                    continue
+
+            if chunk_size:
+                regex = uncaptured_regex(regex)
+                if regex is not None:
+                    combined.append((i, resolve, regex))
+                    continue
+
+            plain.append((i, resolve))
+
+        lanes = []
+        for entries, locale in [(localized, True), (combined, False)]:
+            if entries:
+                lanes.append(CombinedLane([(i, resolve) for i, resolve, _ in entries],
+                                          [regex for _, _, regex in entries],
+                                          chunk_size or 1, locale=locale))
+
+        if plain:
+            lanes.append(PatternLane(plain))
+
+        return lanes
+
+    @staticmethod
+    def _entry_resolver(url_pattern):
+        if isinstance(url_pattern, (URLPattern,) + REDIRECT_SOURCES):
+            return url_pattern.resolve
+
+        # an include() or other resolver. wrap it so that namespaces, routes,
+        # and captured arguments are merged just like the full resolver would.
+        wrapper = URLResolver(resolver_pattern(r'^'), [url_pattern])
+
+        def resolve(path):
+            try:
+                return wrapper.resolve(path)
+            except Resolver404:
+                return None
+
+        return resolve
+
+    def compile(self):
+        """
+        Compile the regexes of the patterns tried in order, see `compile_regexes()`.
+        An exact path pattern only compiles its regex the first time it matches.
+        """
+        for i, _ in self.dynamic:
+            # the patterns of redirect sources are created on demand
+            if not isinstance(self.patterns[i], REDIRECT_SOURCES):
+                compile_regexes(self.patterns[i])
+
+    def promote(self, hits, size=HOT_LANE_SIZE):
+        """
+        Try the `size` patterns with the most `hits`, a dict of pattern -> number of
+        matches, before all others. A pattern is only promoted if it can't match any
+        path a pattern before it in the list can. Replaces the previous ones at once.
+        """
+        promotions = self._promotions
+        if promotions is None:
+            promotions = self._promotions = Promotions(self.patterns, self.dynamic)
+
+        entries, regexes = [], []
+        for url_pattern, count in sorted(hits.items(), key=lambda item: -item[1]):
+            if len(entries) >= size:
+                break
+
+            position = promotions.position(url_pattern)
+            if position is not None:
+                i, regex = position
+                entries.append((i, self.resolvers[i]))
+                regexes.append(regex)
+
+        self.hot = HotLane(entries, regexes) if entries else None
+
+    def lookup(self, path, locale=None):
+        """
+        Return the index of the first exact pattern matching `path` or None.
+        `locale` is the locale prefix of the path if it has one.
+        """
+        found = [self.paths.get(path), self.locale_paths.get(path)]
+        if locale:
+            found.append(self.locale_paths.get(path[len(locale):]))
+
+        for i, table in self.tables:
+            if table.find(path, locale) is not None:
+                # the tables are in order
+                found.append(i)
+                break
+
+        found = [i for i in found if i is not None]
+        return min(found) if found else None
+
+    def path_lanes(self, path, locale=None):
+        """Return lists of the lanes with patterns that could match `path`."""
+        path_lanes = [self.lanes]
+        if not self.shards:
+            return path_lanes
+
+        # the first segment with and without the locale
+        segments = set()
+        for start in ((0, len(locale)) if locale else (0,)):
+            end = path.find('/', start)
+            if end != -1:
+                segments.add(path[start:end])
+
+        for segment in segments:
+            lanes = self.shards.get(segment)
+            if lanes:
+                path_lanes.append(lanes)
+
+        return path_lanes
+
+    def resolve(self, path):
+        """
+        Return the ResolverMatch of the first pattern in the list matching `path`
+        or raise Resolver404.
+        """
+        # `$` also matches before a trailing newline, which the dicts can't know about
+        if '\n' in path:
+            for i, resolve in enumerate(self.resolvers):
+                match = resolve(path)
+                if match:
+                    return self.matched(i, match)
+
+            raise Resolver404({'path': path})
+
+        locale = LOCALE_PREFIX_RE.match(path).group('locale')
+        limit = self.lookup(path, locale)
+        hot = self.hot
+        if hot is not None:
+            found = hot.first(path, limit)
+            if found is not None:
+                return self.matched(*found)
+
+        found = None
+        for lanes in self.path_lanes(path, locale):
+            for lane in lanes:
+                # each lane only needs to look for a match before the best one so far
+                lane_found = lane.first(path, limit, locale)
+                if lane_found is not None:
+                    found = lane_found
+                    limit = found[0]
+
+        if found is not None:
+            return self.matched(*found)
+
+        if limit is not None:
+            return self.matched(limit, self.resolvers[limit](path))
+
+        raise Resolver404({'path': path})
+
+    def matched(self, i, match):
+        # lets the middleware tell which pattern matched, e.g. for the stats. sources
+        # already tell which of their redirects did.
+        if not isinstance(self.patterns[i], REDIRECT_SOURCES):
+            match.redirect_pattern = self.patterns[i]
+
+        return match
+
+
+class RedirectResolver(URLResolver):
+    """
+    URLResolver that finds the same match as a regular resolver would, but serves
+    patterns that can only match a single path from a dict instead of trying every
+    regex in order.
+
+    With `combined` set, the remaining regexes are also tried `chunk_size` at a time
+    with one combined regex per chunk. With `locale_dispatch` set, the locale prefix
+    is matched once per path instead of once per pattern. With `sharded` set, regexes
+    starting with a literal path segment are only tried for paths starting with it.
+    With `hot_size` set, `reorder()` tries up to that many of the most matched
+    patterns before all others.
+    """
+    def __init__(self, *args, **kwargs):
+        self.combined = kwargs.pop('combined', False)
+        self.chunk_size = kwargs.pop('chunk_size', COMBINED_CHUNK_SIZE)
+        self.locale_dispatch = kwargs.pop('locale_dispatch', False)
+        self.sharded = kwargs.pop('sharded', False)
+        self.hot_size = kwargs.pop('hot_size', 0)
+        super(RedirectResolver, self).__init__(*args, **kwargs)
+        self._index = None
+
+    @property
+    def index(self):
+        url_patterns = self.url_patterns
+        index = self._index
+        # patterns can be added to the registry after the resolver is created
+        if index is None or index.size != len(url_patterns):
+            chunk_size = self.chunk_size if self.combined else None
+            index = self._index = PatternIndex(url_patterns, chunk_size, self.locale_dispatch,
+                                               self.sharded)
+
+        return index
+
+    def warm(self):
+        """
+        Build the pattern index and compile the regexes tried for every path now
+        rather than on the first requests, and return the index.
+        """
+        index = self.index
+        index.compile()
+        return index
+
+    def resolve(self, path):
+        path = force_text(path)
+        # equivalent to matching the r'^/' pattern from `get_resolver()`
+        if not path.startswith('/'):
+            raise Resolver404({'path': path})
+
+        return self.index.resolve(path[1:])
+
+    def reorder(self, hits):
+        """
+        Promote the most matched patterns according to `hits`, a dict of pattern ->
+        number of matches, if `hot_size` is set.
+        """
+        if self.hot_size:
+            self.index.promote(hits, self.hot_size)
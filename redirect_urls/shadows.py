@@ -0,0 +1,237 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Find the redirect patterns that can never match and the `no_redirect()` patterns
+that don't keep any path from being redirected.
+
+Every pattern tried in order costs a regex match on each request that gets past
+it, which is every request no redirect matches. `find_shadows()` reports:
+
+- duplicates, with the same regex as a pattern before them,
+- shadowed patterns, whose paths all match a pattern before them, and
+- `no_redirect()` patterns with no path that a pattern after them would match.
+
+Whether a pattern is shadowed, or a `no_redirect()` protects anything, is found by
+generating paths from the regexes and resolving them with the patterns, so a
+pattern that only matches a few more paths than the one before it can be taken
+for a shadowed one. Check the pattern named in the finding before removing one.
+Database redirects aren't known in advance, so they never shadow a pattern, and
+`no_redirect()` patterns before them are kept.
+"""
+
+import random
+import re
+import string
+from timeit import default_timer
+
+from django.urls import Resolver404
+
+from redirect_urls import utils
+from redirect_urls.database import DatabaseRedirects, UnknownRedirects
+from redirect_urls.lint import TYPICAL_PATHS, item_chars, sre_constants, sre_parse
+from redirect_urls.resolvers import PatternIndex, URLPattern, exact_path, pattern_label
+from redirect_urls.tables import RedirectTable
+from redirect_urls.utils import SAMPLE_LOCALE, no_redirect_view
+
+
+# paths generated for each regex
+SAMPLE_SIZE = 12
+# times a generated path repeats a part of a regex with no upper limit at most
+MAX_SAMPLE_REPEAT = 4
+# characters for the parts of generated paths that can be almost anything
+PATH_CHARS = string.ascii_letters + string.digits + '-_.~/%'
+
+
+class Finding(object):
+    """
+    A pattern that can be removed from the list.
+
+    kind: 'duplicate', 'shadowed', or 'unneeded' for a `no_redirect()` that doesn't
+        protect any path.
+    position: the index of the pattern in the list.
+    label: the regex of the pattern.
+    cover: `(position, label)` of the pattern before it that matches its paths.
+    cost: seconds the pattern takes on each request that gets to it.
+    """
+    def __init__(self, kind, position, label, cover=None, cost=0.0):
+        self.kind = kind
+        self.position = position
+        self.label = label
+        self.cover = cover
+        self.cost = cost
+
+    def __repr__(self):
+        return '<Finding {} #{} {}>'.format(self.kind, self.position, self.label)
+
+    def as_dict(self):
+        return {'kind': self.kind, 'position': self.position, 'pattern': self.label,
+                'cover': list(self.cover) if self.cover else None, 'cost': self.cost}
+
+
+class WinnerIndex(PatternIndex):
+    """A `PatternIndex` that resolves a path to the index of the first pattern matching it."""
+    def matched(self, i, match):
+        return i
+
+    def winner(self, path):
+        try:
+            return self.resolve(path)
+        except Resolver404:
+            return None
+
+
+def generate(items, rand, minimal, groups):
+    """Return a string made to match the parsed regex `items`."""
+    parts = []
+    for op, av in items:
+        chars = item_chars(op, av)
+        if chars is not None:
+            if op == sre_constants.LITERAL:
+                parts.append(next(iter(chars)))
+                continue
+
+            choices = sorted(chars & set(PATH_CHARS)) or sorted(chars)
+            parts.append(choices[0] if minimal else rand.choice(choices))
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            low, high, body = av
+            high = min(high, low + MAX_SAMPLE_REPEAT)
+            count = low if minimal else rand.randint(low, high)
+            parts.extend(generate(body, rand, minimal, groups) for _ in range(count))
+        elif op == sre_constants.SUBPATTERN:
+            text = generate(av[-1], rand, minimal, groups)
+            if av[0] is not None:
+                groups[av[0]] = text
+            parts.append(text)
+        elif op == sre_constants.BRANCH:
+            branches = av[1]
+            branch = branches[0] if minimal else rand.choice(branches)
+            parts.append(generate(branch, rand, minimal, groups))
+        elif op == sre_constants.GROUPREF:
+            parts.append(groups.get(av, ''))
+
+        # anchors and lookarounds don't add anything, paths breaking them are dropped
+
+    return ''.join(parts)
+
+
+def sample_paths(regex, size=SAMPLE_SIZE):
+    """Return up to `size` different paths, without the leading slash, `regex` matches."""
+    try:
+        items = sre_parse.parse(regex)
+        compiled = re.compile(regex)
+    except Exception:
+        return []
+
+    # the same paths every time for the same regex
+    rand = random.Random(regex)
+    paths = []
+    for attempt in range(size * 3):
+        path = generate(items, rand, attempt == 0, {})
+        if path not in paths and '\n' not in path and compiled.match(path):
+            paths.append(path)
+            if len(paths) == size:
+                break
+
+    return paths
+
+
+def pattern_paths(url_pattern):
+    """Return paths that `url_pattern` matches, without the leading slash."""
+    if isinstance(url_pattern, RedirectTable):
+        paths = list(url_pattern.row_paths)
+        if url_pattern.locale_prefix:
+            paths += [SAMPLE_LOCALE + path for path in url_pattern.row_paths]
+        return paths
+
+    if isinstance(url_pattern, URLPattern):
+        return sample_paths(pattern_label(url_pattern))
+
+    return []
+
+
+def miss_cost(url_pattern, paths=TYPICAL_PATHS, number=50):
+    """
+    Return the seconds `url_pattern` takes to be tried on a path, on average over
+    `paths`, or 0 if the resolver finds it in a dict instead of trying it.
+    """
+    if not isinstance(url_pattern, URLPattern) or exact_path(pattern_label(url_pattern)):
+        return 0.0
+
+    best = None
+    for _ in range(3):
+        start = default_timer()
+        for _ in range(number):
+            for path in paths:
+                url_pattern.resolve(path)
+        elapsed = (default_timer() - start) / (number * len(paths))
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def is_no_redirect(url_pattern):
+    return getattr(url_pattern, 'callback', None) is no_redirect_view
+
+
+def find_shadows(patterns=None):
+    """
+    Return the `Finding`s for the patterns in `patterns`, the registry by default,
+    that can be removed without changing which requests are redirected where.
+    """
+    if patterns is None:
+        patterns = utils.redirectpatterns
+
+    patterns = [UnknownRedirects() if isinstance(url_pattern, DatabaseRedirects) else url_pattern
+                for url_pattern in patterns]
+    index = WinnerIndex(patterns)
+    labels = [pattern_label(url_pattern) for url_pattern in patterns]
+    samples = [pattern_paths(url_pattern) for url_pattern in patterns]
+    findings = []
+    dead = set()
+    seen = {}
+    for i, url_pattern in enumerate(patterns):
+        if not isinstance(url_pattern, URLPattern):
+            continue
+
+        label = labels[i]
+        if label in seen:
+            findings.append(Finding('duplicate', i, label, (seen[label], label)))
+            dead.add(i)
+            continue
+
+        seen[label] = i
+        winners = [index.winner(path) for path in samples[i]]
+        if winners and all(winner is not None and winner < i for winner in winners):
+            cover = min(winners)
+            findings.append(Finding('shadowed', i, label, (cover, labels[cover])))
+            dead.add(i)
+
+    for i, url_pattern in enumerate(patterns):
+        if i in dead or not is_no_redirect(url_pattern) or not samples[i]:
+            continue
+
+        later = patterns[i + 1:]
+        if any(isinstance(other, UnknownRedirects) for other in later):
+            # could keep any path in the database from being redirected
+            continue
+
+        # paths it matches that a later pattern would redirect without it
+        after = WinnerIndex(later)
+        if any(index.winner(path) == i and after.winner(path) is not None
+               for path in samples[i]):
+            continue
+
+        # paths of later patterns it keeps from being redirected
+        if any(index.winner(path) == i for other in samples[i + 1:] for path in other):
+            continue
+
+        findings.append(Finding('unneeded', i, labels[i]))
+
+    findings.sort(key=lambda finding: finding.position)
+    for finding in findings:
+        finding.cost = miss_cost(patterns[finding.position])
+
+    return findings
@@ -0,0 +1,13 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from django.dispatch import Signal
+
+
+# sent by `register()` with the list of `patterns` added to the registry
+redirects_registered = Signal()
+# sent by `set_redirectpatterns()` with the `patterns` list replacing the registry
+redirects_reloaded = Signal()
+# sent by `DatabaseRedirects` with the new `version` when the redirects in the database changed
+redirects_changed = Signal()
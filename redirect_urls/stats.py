@@ -0,0 +1,257 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Per-pattern hit counters and timings for `RedirectsMiddleware`.
+
+Turn them on with the `REDIRECT_URLS_STATS` setting. Each thread counts into its
+own dict so recording needs no locks, and the dicts are only added up when the
+stats are read. With `REDIRECT_URLS_STATS_DIR` set every process also writes its
+stats to a JSON file in that directory every `REDIRECT_URLS_STATS_INTERVAL`
+seconds so that the `redirect_stats` management command can add them all up.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from timeit import default_timer
+
+from django.conf import settings
+
+from redirect_urls.database import DatabaseRedirects
+from redirect_urls.resolvers import pattern_regex
+from redirect_urls.tables import RedirectTable
+from redirect_urls.utils import basestring
+
+
+# recorded for requests that matched no redirect pattern
+MISS = '<miss>'
+# seconds between writes of the stats file by default
+PUBLISH_INTERVAL = 60
+STATS_FILE_PREFIX = 'redirect-stats-'
+log = logging.getLogger(__name__)
+
+
+def pattern_label(key):
+    """Return the string the stats use for a recorded key."""
+    if isinstance(key, basestring):
+        return key
+
+    regex = pattern_regex(key)
+    if regex is not None:
+        return regex
+
+    return str(getattr(key, 'pattern', key))
+
+
+def registered_labels(patterns):
+    """
+    Yield the label of every redirect in `patterns`. Tables and database redirects
+    yield those of their rows, which the stats record the hits under.
+    """
+    for url_pattern in patterns:
+        if isinstance(url_pattern, RedirectTable):
+            for row in range(len(url_pattern)):
+                yield url_pattern.row_regex(row)
+        elif isinstance(url_pattern, DatabaseRedirects):
+            index = url_pattern.warm()
+            for row_pattern in (index.patterns if index is not None else ()):
+                yield pattern_label(row_pattern)
+        else:
+            yield pattern_label(url_pattern)
+
+
+def match_key(resolver_match):
+    """Return the key to record a ResolverMatch under."""
+    # set by the redirects resolver, other resolvers only tell the route or the view
+    key = getattr(resolver_match, 'redirect_pattern', None)
+    if key is None:
+        key = getattr(resolver_match, 'route', None) or resolver_match._func_path
+
+    return key
+
+
+class RedirectStats(object):
+    """
+    Count matches and add up resolution and view time per redirect pattern.
+
+    Counts recorded while the stats are being read or reset may be left out of
+    that read, but are never counted twice.
+    """
+    def __init__(self, directory=None, interval=PUBLISH_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        # recording compares against this rather than checking `directory`
+        self.publish_at = default_timer() + interval if directory else float('inf')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (thread, counts) of every thread that recorded something
+        self._threads = []
+        # counts of the threads that are gone
+        self._retired = {}
+
+    def _thread_counts(self):
+        counts = self._local.counts = {}
+        with self._lock:
+            self._threads.append((threading.current_thread(), counts))
+
+        return counts
+
+    def record(self, key, resolve_time, view_time=0.0):
+        try:
+            counts = self._local.counts
+        except AttributeError:
+            counts = self._thread_counts()
+
+        entry = counts.get(key)
+        if entry is None:
+            counts[key] = [1, resolve_time, view_time]
+        else:
+            entry[0] += 1
+            entry[1] += resolve_time
+            entry[2] += view_time
+
+    def count_miss(self):
+        """Count a request that matched no redirect, without a resolution time."""
+        try:
+            self._local.counts[MISS][0] += 1
+        except (AttributeError, KeyError):
+            self.record(MISS, 0.0)
+
+    def counts(self):
+        """Return a dict of recorded key -> [hits, resolve time, view time]."""
+        totals = {}
+
+        def add(counts):
+            # copying a dict is atomic, iterating one another thread writes to isn't
+            for key, (hits, resolve_time, view_time) in counts.copy().items():
+                total = totals.setdefault(key, [0, 0.0, 0.0])
+                total[0] += hits
+                total[1] += resolve_time
+                total[2] += view_time
+
+        with self._lock:
+            threads = []
+            for thread, counts in self._threads:
+                if thread.is_alive():
+                    threads.append((thread, counts))
+                else:
+                    for key, entry in counts.items():
+                        retired = self._retired.setdefault(key, [0, 0.0, 0.0])
+                        for n, value in enumerate(entry):
+                            retired[n] += value
+
+            self._threads = threads
+            add(self._retired)
+            for thread, counts in threads:
+                add(counts)
+
+        return totals
+
+    def hits(self):
+        """Return a dict of recorded key, e.g. the matched pattern, -> number of hits."""
+        return dict((key, entry[0]) for key, entry in self.counts().items())
+
+    def totals(self):
+        """Return a dict of pattern label -> [hits, resolve time, view time]."""
+        totals = {}
+        for key, entry in self.counts().items():
+            total = totals.setdefault(pattern_label(key), [0, 0.0, 0.0])
+            for n, value in enumerate(entry):
+                total[n] += value
+
+        return totals
+
+    def snapshot(self):
+        """Return the stats of this process as a list of dicts, most hits first."""
+        return ranked(self.totals())
+
+    def reset(self):
+        with self._lock:
+            self._retired = {}
+            for thread, counts in self._threads:
+                counts.clear()
+
+    def publish(self):
+        """Write the stats of this process to its file in `directory`."""
+        self.publish_at = default_timer() + self.interval
+        if not self.directory:
+            return
+
+        filename = os.path.join(self.directory,
+                                '{}{}.json'.format(STATS_FILE_PREFIX, os.getpid()))
+        try:
+            fd, tmp_name = tempfile.mkstemp(dir=self.directory, prefix='.' + STATS_FILE_PREFIX)
+            with os.fdopen(fd, 'w') as fp:
+                json.dump(self.totals(), fp)
+
+            # readers never see a half written file
+            os.rename(tmp_name, filename)
+        except (IOError, OSError):
+            # this usually runs in the middle of a request, which shouldn't fail for it
+            log.exception('Could not write redirect stats to %s', filename)
+
+
+def ranked(totals):
+    """Return the stats dicts for a dict of label -> counts, most hits first."""
+    stats = []
+    for label, (hits, resolve_time, view_time) in totals.items():
+        stats.append({
+            'pattern': label,
+            'hits': hits,
+            'resolve_time': resolve_time,
+            'view_time': view_time,
+        })
+
+    stats.sort(key=lambda s: (-s['hits'], s['pattern']))
+    return stats
+
+
+def stats_files(directory):
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.startswith(STATS_FILE_PREFIX) and name.endswith('.json')]
+
+
+def load_stats(directory):
+    """Return the stats written by every process to `directory`, most hits first."""
+    totals = {}
+    for filename in stats_files(directory):
+        try:
+            with open(filename) as fp:
+                counts = json.load(fp)
+        except (IOError, OSError, ValueError):
+            # removed or written by something else in the meantime
+            continue
+
+        for label, entry in counts.items():
+            total = totals.setdefault(label, [0, 0.0, 0.0])
+            for n, value in enumerate(entry):
+                total[n] += value
+
+    return ranked(totals)
+
+
+def clear_stats(directory):
+    """Remove the stats files written to `directory`."""
+    for filename in stats_files(directory):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+
+_stats = None
+
+
+def get_stats():
+    """Return the stats of this process or None if they aren't turned on."""
+    global _stats
+    if _stats is None and getattr(settings, 'REDIRECT_URLS_STATS', False):
+        _stats = RedirectStats(getattr(settings, 'REDIRECT_URLS_STATS_DIR', None),
+                               getattr(settings, 'REDIRECT_URLS_STATS_INTERVAL',
+                                       PUBLISH_INTERVAL))
+
+    return _stats
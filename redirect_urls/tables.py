@@ -0,0 +1,218 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Exact path redirects read from a CSV or JSON data file.
+
+A `redirect()` per entry costs a compiled regex, a few closures and a URL pattern
+each. A table keeps only the path, destination and status of every row and a dict
+of path -> row, and creates the `redirect()` pattern of a row the first time a
+request matches it. It goes into the registry like any pattern, and matches where
+it is in the list:
+
+    redirectpatterns = [
+        redirect(r'^firefox/$', 'firefox.new'),
+        redirect_table('legacy/redirects.csv'),
+    ]
+
+CSV files have a `path,to,status` row per redirect, and JSON files a list of
+`{"path": ..., "to": ..., "status": ...}` objects or `[path, to, status]` lists.
+The status is 301 if left out, 302 for a temporary redirect, or 410 for a path
+that is gone, which needs no `to`. A CSV header row and lines starting with `#`
+are skipped.
+"""
+
+import csv
+import io
+import json
+import os
+import re
+from array import array
+
+from django.core.exceptions import ImproperlyConfigured
+
+from redirect_urls.cache import LRUCache
+from redirect_urls.utils import LOCALE_PREFIX_RE, LOCALE_RE, basestring, gone, redirect
+
+
+# number of rows whose redirect patterns each table keeps by default
+ROW_PATTERN_CACHE_SIZE = 1024
+STATUSES = (301, 302, 410)
+
+
+try:
+    unicode
+except NameError:
+    csv_reader = csv.reader
+else:
+    def csv_reader(lines):
+        # py2 csv only reads bytes
+        for row in csv.reader(line.encode('utf-8') for line in lines):
+            yield [cell.decode('utf-8') for cell in row]
+
+
+def read_rows(filename):
+    """Yield `(line, path, to, status)` for every redirect in a CSV or JSON file."""
+    # csv handles the line endings itself
+    with io.open(filename, encoding='utf-8', newline='') as fp:
+        if filename.endswith('.json'):
+            for line, row in enumerate(json.load(fp), 1):
+                if isinstance(row, dict):
+                    row = [row.get('path'), row.get('to'), row.get('status')]
+                elif not isinstance(row, list):
+                    # reported as an entry without a path
+                    row = []
+
+                row = list(row) + [None] * (3 - len(row))
+                yield line, row[0], row[1] or '', row[2] or 301
+        else:
+            for line, row in enumerate(csv_reader(fp), 1):
+                if not row or row[0].startswith('#') or (line == 1 and row[0] == 'path'):
+                    continue
+
+                row = [cell.strip() for cell in row] + [''] * (3 - len(row))
+                yield line, row[0], row[1], row[2] or 301
+
+
+class RedirectTable(object):
+    """
+    Redirects of one exact path each, tried in the order of `rows`, a list of
+    `(path, to, status)`. The first row for a path wins, just like patterns do.
+
+    locale_prefix: also match the paths after a locale prefix, like `redirect()`.
+    redirect_kwargs: other arguments to `redirect()` for every row.
+    """
+    def __init__(self, rows, locale_prefix=True, filename=None, **redirect_kwargs):
+        self.locale_prefix = locale_prefix
+        self.filename = filename
+        self.mtime = os.stat(filename).st_mtime if filename else None
+        self.redirect_kwargs = redirect_kwargs
+        # path -> row
+        self.paths = {}
+        # the columns of the rows
+        self.row_paths = []
+        self.destinations = []
+        self.statuses = array('H')
+        for path, to, status in rows:
+            path = path.lstrip('/')
+            if path in self.paths:
+                continue
+
+            self.paths[path] = len(self.destinations)
+            self.row_paths.append(path)
+            self.destinations.append(to)
+            self.statuses.append(status)
+
+        # row -> the `to` to redirect to instead, see `collapse()`
+        self.collapsed = {}
+        # row -> its redirect pattern, see `row_pattern()`
+        self._patterns = LRUCache(ROW_PATTERN_CACHE_SIZE)
+
+    @classmethod
+    def load(cls, filename, locale_prefix=True, **redirect_kwargs):
+        rows = []
+        line = 0
+        try:
+            for line, path, to, status in read_rows(filename):
+                status = int(status)
+                if not path or status not in STATUSES or not (to or status == 410):
+                    raise ValueError('needs a path, a status of {} and a destination '
+                                     'unless gone'.format(STATUSES))
+                if not isinstance(path, basestring) or not isinstance(to, basestring):
+                    raise TypeError('the path and destination must be strings')
+
+                rows.append((path, to, status))
+        except (TypeError, ValueError) as e:
+            where = '{} entry {}'.format(filename, line) if line else filename
+            raise ImproperlyConfigured('Bad redirect in {}: {}'.format(where, e))
+
+        return cls(rows, locale_prefix, filename, **redirect_kwargs)
+
+    def __len__(self):
+        return len(self.destinations)
+
+    def __repr__(self):
+        return '<{} {}>'.format(self.__class__.__name__, self.filename or len(self))
+
+    def file_mtime(self):
+        try:
+            return os.stat(self.filename).st_mtime
+        except OSError:
+            return None
+
+    def changed(self):
+        """Return whether the file of the table changed since it was loaded."""
+        mtime = self.file_mtime()
+        return mtime is not None and mtime != self.mtime
+
+    def reloaded(self):
+        """Return a new table with the current rows of the file."""
+        return self.load(self.filename, self.locale_prefix, **self.redirect_kwargs)
+
+    def find(self, path, locale=None):
+        """
+        Return the first row matching `path`, which has the locale prefix `locale`
+        if any, or None.
+        """
+        paths = self.paths
+        row = paths.get(path)
+        if locale and self.locale_prefix:
+            locale_row = paths.get(path[len(locale):])
+            if locale_row is not None and (row is None or locale_row < row):
+                row = locale_row
+
+        return row
+
+    def collapse(self, collapsed):
+        """
+        Redirect the rows in `collapsed`, a dict of row -> `to`, to the end of the
+        chain of redirects they lead to, and the others to their own `to` again.
+        See `redirect_urls.chains`.
+        """
+        self.collapsed = collapsed
+        self._patterns = LRUCache(ROW_PATTERN_CACHE_SIZE)
+
+    def row_regex(self, row):
+        """Return the regex of the pattern of a row, which the stats record it under."""
+        prefix = LOCALE_RE if self.locale_prefix else '^'
+        return prefix + re.escape(self.row_paths[row]) + '$'
+
+    def row_pattern(self, row):
+        """Return the `redirect()` or `gone()` pattern for a row."""
+        url_pattern = self._patterns.get(row)
+        if url_pattern is None:
+            regex = re.escape(self.row_paths[row]) + '$'
+            if self.statuses[row] == 410:
+                url_pattern = gone((LOCALE_RE if self.locale_prefix else '^') + regex)
+            else:
+                to = self.collapsed.get(row, self.destinations[row])
+                url_pattern = redirect('^' + regex, to,
+                                       permanent=self.statuses[row] == 301,
+                                       locale_prefix=self.locale_prefix,
+                                       **self.redirect_kwargs)
+            self._patterns.set(row, url_pattern)
+
+        return url_pattern
+
+    def resolve(self, path):
+        """Return a ResolverMatch for `path` like a URL pattern would, or None."""
+        # `$` also matches before a trailing newline
+        lookup_path = path[:-1] if path.endswith('\n') else path
+        row = self.find(lookup_path, LOCALE_PREFIX_RE.match(lookup_path).group('locale'))
+        if row is None:
+            return None
+
+        url_pattern = self.row_pattern(row)
+        match = url_pattern.resolve(path)
+        # the stats count the rows
+        match.redirect_pattern = url_pattern
+        return match
+
+
+def redirect_table(filename, locale_prefix=True, **kwargs):
+    """
+    Return a `RedirectTable` of the redirects in a CSV or JSON file, which can go
+    in a list of redirect patterns. Other arguments are passed to `redirect()`.
+    """
+    return RedirectTable.load(filename, locale_prefix, **kwargs)
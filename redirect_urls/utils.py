@@ -2,68 +2,350 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import gc
 import logging
 import re
+import sys
+from io import BytesIO
+from timeit import default_timer
 try:
-    from urllib.parse import parse_qs, urlencode
+    from urllib.parse import parse_qs, quote_plus, unquote_plus, urlencode
 except ImportError:
-    from urllib import urlencode
+    from urllib import quote_plus, unquote_plus, urlencode
     from urlparse import parse_qs
 
-from django.urls import NoReverseMatch, reverse
+from django.urls import (NoReverseMatch, Resolver404, get_script_prefix, get_urlconf,
+                         reverse)
+from django.conf import settings
 from django.conf.urls import url
+from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.wsgi import WSGIRequest
 from django.http import HttpResponsePermanentRedirect, HttpResponseRedirect, HttpResponseGone
+from django.utils.cache import patch_vary_headers
 from django.utils.encoding import force_text
 from django.utils.html import strip_tags
+from django.utils.translation import get_language
 from django.views.decorators.vary import vary_on_headers
 try:
-    from django.urls import RegexURLResolver as URLResolver
+    from django.urls import RegexURLPattern as URLPattern
     RegexPattern = None
 except ImportError:
-    # Name changed in Django 2.0
-    from django.urls.resolvers import URLResolver, RegexPattern
+    # Names changed in Django 2.0
+    from django.urls.resolvers import RegexPattern, URLPattern
 
-from redirect_urls.decorators import cache_control_expires
+from redirect_urls.cache import ClassificationCache, LRUCache
+from redirect_urls.decorators import CacheHeaders, cache_control_expires
+from redirect_urls.signals import redirects_registered, redirects_reloaded
 
 
 # py3 compat
 try:
-    isinstance('dude', basestring)
+    basestring = basestring
 except NameError:
     basestring = str
 
+if sys.version_info < (3, 6):
+    # dicts only keep their order from Python 3.6
+    from collections import OrderedDict as ordered_dict
+else:
+    ordered_dict = dict
+
 LOCALE_RE = r'^(?P<locale>\w{2,3}(?:-\w{2})?/)?'
+LOCALE_PREFIX_RE = re.compile(LOCALE_RE, re.UNICODE)
+# locale prefix the offline checks try paths of locale prefixed patterns with
+SAMPLE_LOCALE = 'en-US/'
 HTTP_RE = re.compile(r'^https?://', re.IGNORECASE)
 PROTOCOL_RELATIVE_RE = re.compile(r'^//+')
+# query string names and values that decode and encode back to themselves
+QUERY_SAFE_RE = re.compile(r'^[A-Za-z0-9_.-]*$')
+# number of redirect locations each static redirect remembers by default
+STATIC_REDIRECT_CACHE_SIZE = 64
+# number of destinations from a callable `to` each redirect remembers
+DESTINATION_CACHE_SIZE = 16
+# number of header values, e.g. User-Agents, whose classifications are remembered
+HEADER_CACHE_SIZE = 1000
+FIREFOX_RE = re.compile(r'\bFirefox\b', flags=re.I)
+NOT_FIREFOX_RE = re.compile(r'\b(Camino|Iceweasel|SeaMonkey)\b', flags=re.I)
+ANDROID_RE = re.compile(r'\bAndroid\b', flags=re.I)
+IOS_RE = re.compile(r'\b(iPhone|iPad|iPod)\b', flags=re.I)
 # redirects registry
 redirectpatterns = []
+# see `get_header_cache()`
+_header_cache = None
+# number of hours -> CacheHeaders shared by the redirects with that cache timeout
+_cache_headers = {}
+# (registry, resolver options, resolver), see `default_resolver()`
+_default_resolver = None
 log = logging.getLogger(__name__)
 
 
 def register(patterns):
-    redirectpatterns.extend(patterns)
+    patterns = list(patterns)
+    if patterns:
+        if getattr(settings, 'REDIRECT_URLS_LINT', None):
+            # lint builds on the resolvers, which build on this module
+            from redirect_urls.lint import check_patterns
+            check_patterns(patterns)
+
+        redirectpatterns.extend(patterns)
+        redirects_registered.send(sender=None, patterns=patterns)
+
+
+def set_redirectpatterns(patterns):
+    """
+    Replace the redirects registry with the `patterns` list. The middleware build
+    a resolver for it and then swap it in for the one they use, so requests are
+    served by either the old or the new patterns, never a mix of them.
+    """
+    global redirectpatterns
+    redirectpatterns = patterns
+    redirects_reloaded.send(sender=None, patterns=patterns)
+
+
+def get_resolver(patterns=None, **options):
+    """
+    Return a resolver for `patterns`, or the redirects registry by default.
+
+    Options are passed on to `RedirectResolver` and default to the dict in the
+    `REDIRECT_URLS_RESOLVER` setting:
+    combined: try regex patterns with one combined regex per chunk of patterns.
+    chunk_size: the number of patterns combined into each regex.
+    locale_dispatch: match the optional locale prefix once per path and only try the
+        rest of each locale prefixed pattern.
+    sharded: only try patterns starting with a literal path segment for paths
+        starting with that segment.
+    hot_size: the number of the most matched patterns that `reorder()` can have
+        tried before all others.
+    """
+    # resolvers builds on the helpers in this module
+    from redirect_urls.resolvers import RedirectResolver, resolver_pattern
 
+    resolver_options = dict(getattr(settings, 'REDIRECT_URLS_RESOLVER', {}))
+    resolver_options.update(options)
+    return RedirectResolver(resolver_pattern(r'^/'), patterns or redirectpatterns,
+                            **resolver_options)
 
-def get_resolver(patterns=None):
-    pattern = r'^/'
-    if RegexPattern:
-        pattern = RegexPattern(pattern)
-    return URLResolver(pattern, patterns or redirectpatterns)
+
+def batch_request(path, query='', headers=None):
+    """
+    Return a GET request for `path`, as in PATH_INFO without the percent-encoding,
+    with the `query` string and a dict of `headers`, e.g. `{'User-Agent': ...}`.
+    """
+    path_info = force_text(path).encode('utf-8')
+    if not isinstance(path_info, str):
+        # py3 WSGI servers decode the path as latin-1
+        path_info = path_info.decode('iso-8859-1')
+
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path_info,
+        'QUERY_STRING': query or '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'wsgi.input': BytesIO(),
+        'wsgi.url_scheme': 'http',
+    }
+    for name, value in (headers or {}).items():
+        name = name.upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = value
+
+    return WSGIRequest(environ)
+
+
+def resolve_many(requests, resolver=None):
+    """
+    Yield `(status, location, pattern)` for each `(path, query, headers)` in the
+    `requests` iterable, as the middleware would answer a GET request for it with
+    the resolver, the one for the redirects registry by default. `query` and
+    `headers` can be None. `pattern` is the redirect pattern that matched, and
+    `status` and `location` are None if none did or it was a `no_redirect()`.
+
+    Requests are only built for the paths that match, and the results are yielded
+    as the iterable is consumed, so it can be a file of any size.
+    """
+    # stats builds on the resolvers, which build on this module
+    from redirect_urls.stats import match_key
+
+    if resolver is None:
+        resolver = get_resolver()
+        resolver.warm()
+
+    for path, query, headers in requests:
+        try:
+            resolver_match = resolver.resolve(path)
+        except Resolver404:
+            yield None, None, None
+            continue
+
+        request = batch_request(path, query, headers)
+        request.resolver_match = resolver_match
+        response = resolver_match.func(request, *resolver_match.args, **resolver_match.kwargs)
+        pattern = match_key(resolver_match)
+        if response is None:
+            yield None, None, pattern
+        else:
+            yield response.status_code, response.get('Location'), pattern
+
+
+def default_resolver():
+    """
+    Return the resolver of the redirects registry with the default options. It is
+    shared by the middleware and `RedirectsApplication`, so that its index is built
+    and its regexes compiled once per process, or once for all workers if it is
+    warmed up before they are forked, see `warm_redirects()`.
+    """
+    global _default_resolver
+    options = getattr(settings, 'REDIRECT_URLS_RESOLVER', {})
+    default = _default_resolver
+    if default is None or default[0] is not redirectpatterns or default[1] != options:
+        default = _default_resolver = (redirectpatterns, dict(options), get_resolver())
+
+    return default[2]
+
+
+def warm_redirects(freeze=False):
+    """
+    Build the index of the default resolver and compile all of its regexes now rather
+    than on the first requests, and return the resolver.
+
+    Called before the workers are forked, e.g. in a `wsgi.py` loaded with gunicorn's
+    `--preload`, they all share the result copy-on-write. With `freeze` the objects
+    created so far are also left out of garbage collections on Python 3.7+, which
+    would otherwise write to their memory and so copy it into every worker.
+    """
+    start = default_timer()
+    resolver = default_resolver()
+    resolver.warm()
+    if freeze and hasattr(gc, 'freeze'):
+        gc.collect()
+        gc.freeze()
+
+    log.info('Warmed up %s redirect patterns in %.3fs', len(resolver.url_patterns),
+             default_timer() - start)
+    return resolver
+
+
+class Destination(object):
+    """
+    Turns a `to` value into the redirect URL for the captured values.
+
+    Url names are reversed and the locale prefix is added the first time a `to`
+    value is used rather than on every request.
+    """
+    __slots__ = ('to_args', 'to_kwargs', 'prepend_locale', '_templates')
+
+    def __init__(self, to_args=None, to_kwargs=None, prepend_locale=True):
+        self.to_args = to_args
+        self.to_kwargs = to_kwargs
+        self.prepend_locale = prepend_locale
+        # created on first use, most redirects are never used in most processes
+        self._templates = None
+
+    def compile(self, to_value):
+        """
+        Return `(template, locale_template)` for `to_value` where `locale_template`
+        is None if the locale should not be prepended.
+        """
+        if to_value.startswith('/') or HTTP_RE.match(to_value):
+            redirect_url = to_value
+        else:
+            try:
+                redirect_url = reverse(to_value, args=self.to_args, kwargs=self.to_kwargs)
+            except NoReverseMatch:
+                # Assume it's a URL
+                redirect_url = to_value
+
+        redirect_url = force_text(redirect_url)
+        locale_url = None
+        if self.prepend_locale and redirect_url.startswith('/'):
+            locale_url = '/{locale}' + redirect_url.lstrip('/')
+
+        return redirect_url, locale_url
+
+    def url(self, to_value, args, kwargs):
+        # reverse() results depend on the script prefix, urlconf and language of the request
+        key = (to_value, get_script_prefix(), get_urlconf(), get_language())
+        cache = self._templates
+        if cache is None:
+            cache = self._templates = LRUCache(DESTINATION_CACHE_SIZE)
+
+        templates = cache.get(key)
+        if templates is None:
+            templates = self.compile(to_value)
+            cache.set(key, templates)
+
+        redirect_url, locale_url = templates
+        if locale_url is not None and kwargs.get('locale'):
+            redirect_url = locale_url
+
+        # use info from url captures.
+        if args or kwargs:
+            # formatting without braces could only fail on a mismatched one
+            if '{' in redirect_url or '}' in redirect_url:
+                redirect_url = redirect_url.format(*args, **kwargs)
+
+            # strip_tags() never changes a string without both of these
+            if '<' in redirect_url and '>' in redirect_url:
+                redirect_url = strip_tags(redirect_url)
+
+        return redirect_url
+
+
+def get_header_cache():
+    """
+    Return the cache of header classifications shared by the header based deciders.
+    Its size is the `REDIRECT_URLS_HEADER_CACHE_SIZE` setting, `0` turns it off.
+    """
+    global _header_cache
+    if _header_cache is None:
+        _header_cache = ClassificationCache(getattr(settings, 'REDIRECT_URLS_HEADER_CACHE_SIZE',
+                                                    HEADER_CACHE_SIZE))
+
+    return _header_cache
+
+
+def is_firefox(user_agent):
+    return bool(FIREFOX_RE.search(user_agent) and not NOT_FIREFOX_RE.search(user_agent))
+
+
+def platform(user_agent):
+    """Return 'android', 'ios', or 'desktop' for a User-Agent."""
+    if ANDROID_RE.search(user_agent):
+        return 'android'
+    elif IOS_RE.search(user_agent):
+        return 'ios'
+    else:
+        return 'desktop'
+
+
+def searcher(regex_obj):
+    """Return a function telling whether `regex_obj` is found in a string."""
+    def matches(value):
+        return regex_obj.search(value) is not None
+
+    return matches
 
 
 def header_redirector(header_name, regex, match_dest, nomatch_dest, case_sensitive=False):
     flags = 0 if case_sensitive else re.IGNORECASE
     regex_obj = re.compile(regex, flags)
     header_name = 'HTTP_' + header_name.upper().replace('-', '_')
+    # the result only depends on the regex, so deciders for the same one share it
+    key = ('search', regex_obj.pattern, regex_obj.flags)
+    classify = get_header_cache().classify
+    matches = searcher(regex_obj)
 
     def decider(request, *args, **kwargs):
         value = request.META.get(header_name, '')
-        match = regex_obj.search(value)
-        if match:
+        if classify(value, key, matches):
             return match_dest
         else:
             return nomatch_dest
 
+    decider.headers_only = True
     return decider
 
 
@@ -72,32 +354,139 @@ def ua_redirector(regex, match_dest, nomatch_dest, case_sensitive=False):
 
 
 def is_firefox_redirector(fx_dest, nonfx_dext):
-    include_re = re.compile(r'\bFirefox\b', flags=re.I)
-    exclude_re = re.compile(r'\b(Camino|Iceweasel|SeaMonkey)\b', flags=re.I)
+    classify = get_header_cache().classify
 
     def decider(request, *args, **kwargs):
         value = request.META.get('HTTP_USER_AGENT', '')
-        if include_re.search(value) and not exclude_re.search(value):
+        if classify(value, 'firefox', is_firefox):
             return fx_dest
         else:
             return nonfx_dext
 
+    decider.headers_only = True
     return decider
 
 
 def platform_redirector(desktop_dest, android_dest, ios_dest):
-    android_re = re.compile(r'\bAndroid\b', flags=re.I)
-    ios_re = re.compile(r'\b(iPhone|iPad|iPod)\b', flags=re.I)
+    destinations = {'desktop': desktop_dest, 'android': android_dest, 'ios': ios_dest}
+    classify = get_header_cache().classify
 
     def decider(request, *args, **kwargs):
         value = request.META.get('HTTP_USER_AGENT', '')
-        if android_re.search(value):
-            return android_dest
-        elif ios_re.search(value):
-            return ios_dest
-        else:
-            return desktop_dest
+        return destinations[classify(value, 'platform', platform)]
+
+    decider.headers_only = True
+    return decider
+
+
+def condition_check(source, key, matches, classify):
+    """Return a function of a request telling whether a header or cookie matches."""
+    is_cookie, name = source
+    if is_cookie:
+        # cookies are often unique per user, which would crowd out the User-Agents
+        def check(request):
+            return matches(request.COOKIES.get(name, ''))
+    else:
+        def check(request):
+            return classify(request.META.get(name, ''), key, matches)
+
+    return check
 
+
+def decision_redirector(rules, default, case_sensitive=False):
+    """
+    Return a decider sending requests to the destination of the first of `rules`
+    whose conditions all match, or to `default` if none of them do.
+
+    rules: a list of `(conditions, destination)` tuples. Conditions are a dict, or
+        a list of pairs to try them in a given order, of a header name, or 'cookie:'
+        followed by a cookie name, -> a regex to search for in its value. A missing
+        header or cookie is an empty string.
+    case_sensitive: whether the regexes are case sensitive.
+
+    The rules are compiled into a tree of conditions, so the decider tests each
+    condition at most once per request, stops at the first condition of a rule that
+    doesn't match and allocates nothing per request. It has a `vary` attribute with
+    the headers the conditions read, which `redirect()` uses unless given `vary`.
+
+    Usage:
+    redirect(r'^firefox/$', decision_redirector([
+        ({'user-agent': r'Android', 'accept-language': r'^de'}, '/de/firefox/android/'),
+        ({'user-agent': r'Android'}, '/firefox/android/'),
+        ({'cookie:beta': r'^1$'}, '/firefox/beta/'),
+    ], '/firefox/new/'), permanent=False)
+    """
+    flags = 0 if case_sensitive else re.IGNORECASE
+    classify = get_header_cache().classify
+    # a function of the request for each distinct condition
+    checks = []
+    check_ids = {}
+    # the condition indexes of each rule, in order, and its destination
+    vary = []
+    table = []
+    for conditions, destination in rules:
+        if isinstance(conditions, dict):
+            conditions = conditions.items()
+
+        rule = []
+        for name, regex in conditions:
+            if name.lower().startswith('cookie:'):
+                source = (True, name[len('cookie:'):])
+                header = 'Cookie'
+            else:
+                source = (False, 'HTTP_' + name.upper().replace('-', '_'))
+                header = '-'.join(part.capitalize() for part in name.split('-'))
+
+            if header not in vary:
+                vary.append(header)
+
+            regex_obj = re.compile(regex, flags)
+            key = ('search', regex_obj.pattern, regex_obj.flags)
+            # the same condition in several rules is only tested once per request
+            check = check_ids.get((source, key))
+            if check is None:
+                check = check_ids[source, key] = len(checks)
+                checks.append(condition_check(source, key, searcher(regex_obj), classify))
+
+            if check not in rule:
+                rule.append(check)
+
+        table.append((tuple(rule), destination))
+
+    # the rules become a tree of (check, node if it matches, node if not), or
+    # (None, destination, None) leaves, so a request needs no state of its own
+    nodes = {}
+
+    def compile_node(rules):
+        node = nodes.get(rules)
+        if node is None:
+            if not rules:
+                node = (None, default, None)
+            elif not rules[0][0]:
+                node = (None, rules[0][1], None)
+            else:
+                check = rules[0][0][0]
+                matched = tuple((tuple(c for c in rule if c != check), destination)
+                                for rule, destination in rules)
+                unmatched = tuple((rule, destination) for rule, destination in rules
+                                  if check not in rule)
+                node = (checks[check], compile_node(matched), compile_node(unmatched))
+
+            nodes[rules] = node
+
+        return node
+
+    root = compile_node(tuple(table))
+
+    def decider(request, *args, **kwargs):
+        check, matched, unmatched = root
+        while check is not None:
+            check, matched, unmatched = matched if check(request) else unmatched
+
+        return matched
+
+    decider.vary = vary
+    decider.headers_only = True
     return decider
 
 
@@ -119,10 +508,11 @@ def no_redirect(pattern, locale_prefix=True, re_flags=None):
     if re_flags:
         pattern = '(?{})'.format(re_flags) + pattern
 
-    def _view(request, *args, **kwargs):
-        return None
+    return url(pattern, no_redirect_view)
 
-    return url(pattern, _view)
+
+def no_redirect_view(request, *args, **kwargs):
+    return None
 
 
 def redirect(pattern, to, permanent=True, locale_prefix=True, anchor=None, name=None,
@@ -143,7 +533,8 @@ def redirect(pattern, to, permanent=True, locale_prefix=True, anchor=None, name=
         for use in calls to `reverse()`. Does _NOT_ work if used in a `redirects.py` file.
     query: a dict of query params to add to the destination url.
     vary: if you used an HTTP header to decide where to send users you should include that
-        header's name in the `vary` arg.
+        header's name in the `vary` arg. Defaults to the `vary` attribute of `to` if it
+        has one, like the deciders from `decision_redirector()`.
     cache_timeout: number of hours to cache this redirect. just sets the proper `cache-control`
         and `expires` headers.
     decorators: a callable (or list of callables) that will wrap the view used to redirect
@@ -166,11 +557,6 @@ def redirect(pattern, to, permanent=True, locale_prefix=True, anchor=None, name=
         redirect(r'the/dude$', 'abides', query={'aggression': 'not_stand'}),
     ]
     """
-    if permanent:
-        redirect_class = HttpResponsePermanentRedirect
-    else:
-        redirect_class = HttpResponseRedirect
-
     if locale_prefix:
         pattern = pattern.lstrip('^/')
         pattern = LOCALE_RE + pattern
@@ -178,55 +564,277 @@ def redirect(pattern, to, permanent=True, locale_prefix=True, anchor=None, name=
     if re_flags:
         pattern = '(?{})'.format(re_flags) + pattern
 
-    view_decorators = []
-    if cache_timeout is not None:
-        view_decorators.append(cache_control_expires(cache_timeout))
+    # deciders like `decision_redirector()` know which headers they depend on
+    if vary is None:
+        vary = getattr(to, 'vary', None)
+
+    redirect_pattern = RedirectPattern(pattern, to, permanent, anchor, query, vary,
+                                       cache_timeout, decorators,
+                                       Destination(to_args, to_kwargs, prepend_locale),
+                                       merge_query)
+    if name:
+        # reverse() only knows about regular URL patterns
+        return url(pattern, redirect_pattern.callback, name=name)
+
+    return redirect_pattern
 
-    if vary:
-        if isinstance(vary, basestring):
+
+def merge_query_string(querystring, params):
+    """
+    Return the `querystring` of a request merged with `params`, a dict of the
+    encoded `name=value` pairs of the `query` of a redirect by name. The same as
+    `urlencode()` of the parsed query string updated with the query, but only the
+    pairs with escapes are decoded and encoded again, and only the params of the
+    redirect replace those of the request.
+    """
+    if ';' in querystring:
+        # a separator for parse_qs() before Python 3.9.2
+        merged = parse_qs(querystring)
+        merged.update((name, None) for name in params)
+        return '&'.join(params[name] if pairs is None else urlencode({name: pairs}, doseq=True)
+                        for name, pairs in merged.items()
+                        if pairs is not None or params[name])
+
+    # encoded pairs by name in order, None for the names in `params`
+    names = ordered_dict()
+    for pair in querystring.split('&'):
+        name, _, value = pair.partition('=')
+        if not value:
+            # parse_qs() drops blank values
+            continue
+
+        if not (QUERY_SAFE_RE.match(name) and QUERY_SAFE_RE.match(value)):
+            name = unquote_plus(name)
+            pair = '='.join([quote_plus(name), quote_plus(unquote_plus(value))])
+
+        if name in params:
+            names.setdefault(name, None)
+        else:
+            pairs = names.get(name)
+            if pairs is None:
+                names[name] = [pair]
+            else:
+                pairs.append(pair)
+
+    merged = [params[name] if pairs is None else '&'.join(pairs)
+              for name, pairs in names.items()]
+    merged.extend(encoded for name, encoded in params.items() if name not in names)
+    return '&'.join(encoded for encoded in merged if encoded)
+
+
+def get_cache_headers(num_hours):
+    """Return the `CacheHeaders` for a number of hours, shared by all the redirects."""
+    cache_headers = _cache_headers.get(num_hours)
+    if cache_headers is None:
+        cache_headers = _cache_headers.setdefault(num_hours, CacheHeaders(num_hours))
+
+    return cache_headers
+
+
+class RedirectPattern(URLPattern):
+    """
+    The URL pattern of a `redirect()`, which keeps its options in slots and is also
+    its own view and its own regex pattern. That makes each redirect a single object,
+    where a regular URL pattern needs a regex pattern object and a closure per option
+    and decorator. Django uses it like any other URL pattern.
+
+    Django's URLPattern has no `__slots__`, so instances still have a `__dict__`.
+    The options don't go in it though: it stays empty until Django caches the
+    `lookup_str` of the pattern there, e.g. when it builds its reverse lookups.
+    """
+    __slots__ = ('_regex', '_compiled', 'to', 'redirect_class', 'anchor', 'query',
+                 'merge_query', 'query_string', '_query_params', 'vary', 'cache_headers',
+                 'destination', 'static_cache_size', 'collapsed', '_locations', '_view')
+    # what Django expects of URL patterns and their regex patterns, see `pattern`
+    name = None
+    default_args = {}
+    converters = {}
+    _is_endpoint = True
+    if RegexPattern is not None:
+        # the matching changed between Django versions
+        match = RegexPattern.match
+
+    def __init__(self, regex, to, permanent=True, anchor=None, query=None, vary=None,
+                 cache_timeout=12, decorators=None, destination=None, merge_query=False):
+        self._regex = regex
+        self._compiled = None
+        self.to = to
+        if permanent:
+            self.redirect_class = HttpResponsePermanentRedirect
+        else:
+            self.redirect_class = HttpResponseRedirect
+
+        self.anchor = anchor
+        self.query = query
+        self.merge_query = merge_query
+        # encoded once rather than on every request, see `build_location()`
+        self.query_string = urlencode(query, doseq=True) if query else None
+        self._query_params = None
+        if query and merge_query:
+            self._query_params = dict((name, urlencode({name: value}, doseq=True))
+                                      for name, value in query.items())
+        if vary and isinstance(vary, basestring):
             vary = [vary]
-        view_decorators.append(vary_on_headers(*vary))
+        self.vary = vary or None
+        self.cache_headers = None if cache_timeout is None else get_cache_headers(cache_timeout)
+        self.destination = destination or Destination()
+        # `(to, destination)` to redirect to instead, see `collapse()`
+        self.collapsed = None
+        # the location of redirects that don't depend on a callable, headers, or a
+        # decorator only depends on the captured values and maybe the query string.
+        self.static_cache_size = 0
+        if not (callable(to) or vary or decorators):
+            self.static_cache_size = getattr(settings, 'REDIRECT_URLS_STATIC_CACHE_SIZE',
+                                             STATIC_REDIRECT_CACHE_SIZE)
+        # created on the first match, see `location()`
+        self._locations = None
+        self._view = None
+        if decorators:
+            self._view = self.decorated_view(decorators, cache_timeout)
+
+    def decorated_view(self, decorators, cache_timeout):
+        view_decorators = []
+        if cache_timeout is not None:
+            view_decorators.append(cache_control_expires(cache_timeout))
+
+        if self.vary:
+            view_decorators.append(vary_on_headers(*self.vary))
 
-    if decorators:
         if callable(decorators):
             view_decorators.append(decorators)
         else:
             view_decorators.extend(decorators)
 
-    def _view(request, *args, **kwargs):
+        view = self.redirect_response
+        try:
+            # Decorators should be applied in reverse order so that input
+            # can be sent in the order your would write nested decorators
+            # e.g. dec1(dec2(_view)) -> [dec1, dec2]
+            for decorator in reversed(view_decorators):
+                view = decorator(view)
+        except TypeError:
+            log.exception('decorators not iterable or does not contain '
+                          'callable items')
+
+        return view
+
+    def collapse(self, collapsed):
+        """
+        Redirect to `collapsed`, a `(to, destination)` pair at the end of the chain
+        of redirects this one leads to, or to `to` again if None. See
+        `redirect_urls.chains`.
+        """
+        self.collapsed = collapsed
+        # the remembered locations are those of the previous destination
+        self._locations = None
+
+    def __str__(self):
+        return self._regex
+
+    def describe(self):
+        return "'{}'".format(self._regex)
+
+    def check(self):
+        # the checks of an equivalent regular URL pattern
+        return url(self._regex, self.callback).check()
+
+    @property
+    def pattern(self):
+        return self
+
+    @property
+    def regex(self):
+        regex = self._compiled
+        if regex is None:
+            try:
+                # like Django < 2.0, for \w and friends on py2
+                regex = self._compiled = re.compile(self._regex, re.UNICODE)
+            except re.error as e:
+                raise ImproperlyConfigured(
+                    '"{}" is not a valid regular expression: {}'.format(self._regex, e))
+
+        return regex
+
+    @property
+    def callback(self):
+        return self._view or self
+
+    @property
+    def status_code(self):
+        # what `redirect_urls.wsgi` needs to answer without a Django request, as long
+        # as the view only reads the headers and the query string
+        if self._view is None and (not callable(self.to) or
+                                   getattr(self.to, 'headers_only', False)):
+            return self.redirect_class.status_code
+
+        return None
+
+    def __call__(self, request, *args, **kwargs):
+        if self._view is not None:
+            return self._view(request, *args, **kwargs)
+
+        response = self.redirect_response(request, *args, **kwargs)
+        if self.vary:
+            patch_vary_headers(response, self.vary)
+
+        if self.cache_headers is not None:
+            self.cache_headers.patch(response)
+
+        return response
+
+    def redirect_response(self, request, *args, **kwargs):
+        return self.redirect_class(self.location(request, args, kwargs))
+
+    def location(self, request, args, kwargs):
+        """Return the URL to redirect `request` to for the captured values."""
+        cache_size = self.static_cache_size
+        if not cache_size:
+            return self.build_location(request, args, kwargs)
+
+        query = self.query
+        querystring = None
+        if query is None or (query and self.merge_query):
+            querystring = request.META.get('QUERY_STRING')
+
+        # reverse() results depend on the script prefix, urlconf and language of the request
+        key = (args, frozenset(kwargs.items()), querystring, get_script_prefix(), get_urlconf(),
+               get_language())
+        locations = self._locations
+        if locations is None:
+            locations = self._locations = LRUCache(cache_size)
+
+        redirect_url = locations.get(key)
+        if redirect_url is None:
+            redirect_url = self.build_location(request, args, kwargs)
+            locations.set(key, redirect_url)
+
+        return redirect_url
+
+    def build_location(self, request, args, kwargs):
         # don't want to have 'None' in substitutions
         kwargs = {k: v or '' for k, v in kwargs.items()}
         args = [x or '' for x in args]
 
         # If it's a callable, call it and get the url out.
+        to = self.to
+        destination = self.destination
+        if self.collapsed is not None:
+            to, destination = self.collapsed
+
         if callable(to):
             to_value = to(request, *args, **kwargs)
         else:
             to_value = to
 
-        if to_value.startswith('/') or HTTP_RE.match(to_value):
-            redirect_url = to_value
-        else:
-            try:
-                redirect_url = reverse(to_value, args=to_args, kwargs=to_kwargs)
-            except NoReverseMatch:
-                # Assume it's a URL
-                redirect_url = to_value
-
-        if prepend_locale and redirect_url.startswith('/') and kwargs.get('locale'):
-            redirect_url = '/{locale}' + redirect_url.lstrip('/')
-
-        # use info from url captures.
-        if args or kwargs:
-            redirect_url = strip_tags(force_text(redirect_url).format(*args, **kwargs))
+        redirect_url = destination.url(to_value, args, kwargs)
 
+        query = self.query
         if query:
-            if merge_query:
-                req_query = parse_qs(request.META.get('QUERY_STRING'))
-                req_query.update(query)
-                querystring = urlencode(req_query, doseq=True)
-            else:
-                querystring = urlencode(query, doseq=True)
+            querystring = self.query_string
+            if self.merge_query:
+                requested = request.META.get('QUERY_STRING')
+                if requested:
+                    querystring = merge_query_string(requested, self._query_params)
         elif query is None:
             querystring = request.META.get('QUERY_STRING')
         else:
@@ -235,32 +843,25 @@ def redirect(pattern, to, permanent=True, locale_prefix=True, anchor=None, name=
         if querystring:
             redirect_url = '?'.join([redirect_url, querystring])
 
-        if anchor:
-            redirect_url = '#'.join([redirect_url, anchor])
+        if self.anchor:
+            redirect_url = '#'.join([redirect_url, self.anchor])
 
         if PROTOCOL_RELATIVE_RE.match(redirect_url):
             redirect_url = '/' + redirect_url.lstrip('/')
 
-        return redirect_class(redirect_url)
-
-    # Apply decorators
-    try:
-        # Decorators should be applied in reverse order so that input
-        # can be sent in the order your would write nested decorators
-        # e.g. dec1(dec2(_view)) -> [dec1, dec2]
-        for decorator in reversed(view_decorators):
-            _view = decorator(_view)
-    except TypeError:
-        log.exception('decorators not iterable or does not contain '
-                      'callable items')
-
-    return url(pattern, _view, name=name)
+        return redirect_url
 
 
 def gone_view(request, *args, **kwargs):
     return HttpResponseGone()
 
 
+gone_view.status_code = HttpResponseGone.status_code
+gone_view.location = None
+gone_view.cache_headers = None
+gone_view.vary = None
+
+
 def gone(pattern):
     """Return a url matcher suitable for urlpatterns that returns a 410."""
     return url(pattern, gone_view)
@@ -0,0 +1,166 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+A WSGI application answering redirects before Django sees the request.
+
+Wrap the Django application in your wsgi.py:
+
+    from django.core.wsgi import get_wsgi_application
+    from redirect_urls.wsgi import RedirectsApplication
+
+    application = RedirectsApplication(get_wsgi_application())
+
+Redirects and `gone()` patterns whose views only need the path, the query string
+and the headers are answered straight from the WSGI environ, without building a
+request, running the middleware or creating a response object. The response has
+the same status and headers `RedirectsMiddleware` would send. Everything else is
+passed on to Django along with the resolver match, so `RedirectsMiddleware`
+doesn't resolve the same path again.
+"""
+
+from timeit import default_timer
+
+try:
+    from http.client import responses
+except ImportError:
+    from httplib import responses
+
+from django.conf import settings
+from django.core.handlers.wsgi import get_path_info, get_script_name
+from django.http import parse_cookie
+from django.http.response import HttpResponseRedirectBase
+from django.urls import Resolver404, set_script_prefix
+from django.utils.encoding import iri_to_uri
+from django.utils.functional import cached_property
+
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+from redirect_urls.cache import LRUCache
+from redirect_urls.signals import redirects_reloaded
+from redirect_urls.stats import get_stats, match_key
+from redirect_urls.utils import default_resolver, warm_redirects
+
+
+# environ key of the (patterns, resolver match or None) handed on to the middleware
+RESOLVED_KEY = 'redirect_urls.resolved'
+# views whose prebuilt response parts are kept. Table rows and database redirects
+# get new views all the time, so it has to be bounded.
+PREBUILT_CACHE_SIZE = 1024
+
+
+class EnvironRequest(object):
+    """The parts of a request the redirect views use, read from a WSGI environ."""
+    def __init__(self, environ, path_info):
+        self.META = environ
+        self.path_info = path_info
+
+    @cached_property
+    def COOKIES(self):
+        return parse_cookie(self.META.get('HTTP_COOKIE', ''))
+
+
+class RedirectsApplication(object):
+    def __init__(self, application, resolver=None, stats=None):
+        self.application = application
+        self.resolver = resolver
+        if resolver is None:
+            self.resolver = default_resolver()
+            redirects_reloaded.connect(self.reload_resolver)
+            if getattr(settings, 'REDIRECT_URLS_WARM', False):
+                warm_redirects()
+
+        self.stats = stats or get_stats()
+        # view -> (status, headers before and after the location, location function,
+        # cache headers), or False for views that need a Django request
+        self._prebuilt = LRUCache(PREBUILT_CACHE_SIZE)
+
+    def __call__(self, environ, start_response):
+        path_info = get_path_info(environ) or '/'
+        start = default_timer()
+        try:
+            resolver_match = self.resolver.resolve(path_info)
+        except Resolver404:
+            resolver_match = None
+
+        resolved = default_timer()
+
+        if resolver_match is not None:
+            prebuilt = self._prebuilt.get(resolver_match.func)
+            if prebuilt is None:
+                prebuilt = self.prebuild(resolver_match.func)
+
+            if prebuilt:
+                response = self.respond(environ, path_info, resolver_match, prebuilt)
+                if response is not None:
+                    if self.stats is not None:
+                        self.record(resolver_match, resolved - start, resolved)
+
+                    status, headers = response
+                    start_response(status, headers)
+                    return [b'']
+
+        environ[RESOLVED_KEY] = (self.resolver.url_patterns, resolver_match)
+        return self.application(environ, start_response)
+
+    def reload_resolver(self, patterns, **kwargs):
+        """Swap in the resolver for the new registry, built before any request uses it."""
+        resolver = default_resolver()
+        resolver.warm()
+        self.resolver = resolver
+        # only holds on to the views of the old patterns
+        self._prebuilt = LRUCache(PREBUILT_CACHE_SIZE)
+
+    def prebuild(self, view):
+        """
+        Return the parts of the responses of `view` that don't change between
+        requests, or False if it needs a Django request.
+        """
+        status_code = getattr(view, 'status_code', None)
+        prebuilt = False
+        if status_code is not None:
+            status = '{} {}'.format(status_code, responses[status_code])
+            content_type = [('Content-Type', 'text/html; charset={}'.format(
+                settings.DEFAULT_CHARSET))]
+            after = []
+            if view.vary:
+                after.append(('Vary', ', '.join(view.vary)))
+
+            prebuilt = (status, content_type, after, view.location, view.cache_headers)
+
+        self._prebuilt.set(view, prebuilt)
+        return prebuilt
+
+    def respond(self, environ, path_info, resolver_match, prebuilt):
+        """Return the status and headers of the response, or None to leave it to Django."""
+        status, before, after, location, cache_headers = prebuilt
+        headers = list(before)
+        if location is not None:
+            # reverse() uses the script prefix like it does in Django's handler
+            set_script_prefix(get_script_name(environ))
+            redirect_url = location(EnvironRequest(environ, path_info),
+                                    resolver_match.args, resolver_match.kwargs)
+            # the response class refuses these, leave the error handling to Django
+            scheme = urlparse(redirect_url).scheme
+            if scheme and scheme not in HttpResponseRedirectBase.allowed_schemes:
+                return None
+
+            headers.append(('Location', iri_to_uri(redirect_url)))
+
+        headers.extend(after)
+        if cache_headers is not None:
+            headers.append(('Expires', cache_headers.expires()))
+            headers.append(('Cache-Control', cache_headers.cache_control))
+
+        return status, headers
+
+    def record(self, resolver_match, resolve_time, resolved):
+        stats = self.stats
+        end = default_timer()
+        stats.record(match_key(resolver_match), resolve_time, end - resolved)
+        if end >= stats.publish_at:
+            stats.publish()
@@ -23,7 +23,8 @@ setup(
     author_email='pmac@mozilla.com',
     url='https://github.com/pmac/django-redirect-urls/',
     license='Apache-2.0',
-    packages=['redirect_urls'],
+    packages=['redirect_urls', 'redirect_urls.management', 'redirect_urls.migrations',
+              'redirect_urls.management.commands'],
     include_package_data=True,
     zip_safe=False,
     keywords='django redirects',
@@ -0,0 +1,8 @@
+from django.conf.urls import url
+from django.conf.urls.i18n import i18n_patterns
+from django.http import HttpResponse
+
+
+urlpatterns = i18n_patterns(
+    url(r'^abides/$', lambda request: HttpResponse('abides'), name='abides'),
+)
@@ -1,13 +1,17 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import sys
+
 try:
-    from urllib.parse import parse_qs, urlparse
+    from urllib.parse import parse_qs, urlencode, urlparse
 except ImportError:
+    from urllib import urlencode
     from urlparse import parse_qs, urlparse
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.test.client import RequestFactory
+from django.utils import translation
 try:
     from django.urls import RegexURLPattern as URLPattern
 except ImportError:
@@ -17,8 +21,11 @@ except ImportError:
 from mock import patch
 
 from redirect_urls.middleware import RedirectsMiddleware
-from redirect_urls.utils import (get_resolver, header_redirector, is_firefox_redirector,
-                                 no_redirect, redirect, ua_redirector, platform_redirector)
+from redirect_urls.utils import (Destination, batch_request, decision_redirector,
+                                 default_resolver, get_header_cache, get_resolver, gone,
+                                 header_redirector, is_firefox_redirector,
+                                 merge_query_string, no_redirect, redirect, resolve_many,
+                                 ua_redirector, platform_redirector, warm_redirects)
 
 
 class TestHeaderRedirector(TestCase):
@@ -85,6 +92,127 @@ class TestPlatformRedirector(TestCase):
         self.assertEqual(url, '/blue/')
 
 
+@patch('redirect_urls.utils._header_cache', None)
+class TestHeaderCache(TestCase):
+    def setUp(self):
+        self.rf = RequestFactory()
+        self.request = self.rf.get('/take/comfort/', HTTP_USER_AGENT='Mozilla/5.0 (Android 6.0.1; '
+                                   'Mobile; rv:51.0) Gecko/51.0 Firefox/51.0')
+
+    def test_deciders_share_classifications(self):
+        deciders = [
+            is_firefox_redirector('/firefox/', '/other/'),
+            is_firefox_redirector('/firefox/new/', '/other/'),
+            platform_redirector('/red/', '/green/', '/blue/'),
+            platform_redirector('/desktop/', '/android/', '/ios/'),
+            ua_redirector('android', '/abide/', '/flout/'),
+            header_redirector('user-agent', 'ANDROID', '/abide/', '/flout/'),
+        ]
+        self.assertEqual([decider(self.request) for decider in deciders],
+                         ['/firefox/', '/firefox/new/', '/green/', '/android/', '/abide/',
+                          '/abide/'])
+        stats = get_header_cache().stats()
+        self.assertEqual(stats['size'], 1)
+        # firefox, platform, and the case insensitive regexes
+        self.assertEqual(stats['misses'], 4)
+        self.assertEqual(stats['hits'], 2)
+
+    def test_repeated_requests(self):
+        decider = platform_redirector('/red/', '/green/', '/blue/')
+        for _ in range(4):
+            self.assertEqual(decider(self.request), '/green/')
+
+        self.assertEqual(get_header_cache().stats()['hit_rate'], 0.75)
+
+    @override_settings(REDIRECT_URLS_HEADER_CACHE_SIZE=0)
+    def test_size_setting(self):
+        decider = is_firefox_redirector('/firefox/', '/other/')
+        self.assertEqual(decider(self.request), '/firefox/')
+        self.assertEqual(decider(self.request), '/firefox/')
+        self.assertEqual(get_header_cache().stats()['hits'], 0)
+
+    def test_missing_header(self):
+        decider = header_redirector('accept-language', 'de', '/de/', '/en/')
+        self.assertEqual(decider(self.request), '/en/')
+
+
+class CountingDict(dict):
+    def __init__(self, *args, **kwargs):
+        super(CountingDict, self).__init__(*args, **kwargs)
+        self.reads = []
+
+    def get(self, key, default=None):
+        self.reads.append(key)
+        return super(CountingDict, self).get(key, default)
+
+
+@patch('redirect_urls.utils._header_cache', None)
+class TestDecisionRedirector(TestCase):
+    def setUp(self):
+        self.rf = RequestFactory()
+        self.decider = decision_redirector([
+            ({'user-agent': 'android', 'accept-language': '^de'}, '/de/android/'),
+            ({'user-agent': 'android'}, '/android/'),
+            ([('accept-language', '^de'), ('cookie:beta', '^1$')], '/de/beta/'),
+            ({}, '/everyone/'),
+        ], '/never/')
+
+    def get(self, **headers):
+        return self.rf.get('/take/comfort/', **headers)
+
+    def test_first_matching_rule(self):
+        self.assertEqual(self.decider(self.get(HTTP_USER_AGENT='Android',
+                                               HTTP_ACCEPT_LANGUAGE='de-DE')),
+                         '/de/android/')
+        self.assertEqual(self.decider(self.get(HTTP_USER_AGENT='Android',
+                                               HTTP_ACCEPT_LANGUAGE='en-US')),
+                         '/android/')
+        self.assertEqual(self.decider(self.get(HTTP_USER_AGENT='iPhone')), '/everyone/')
+
+    def test_cookies(self):
+        request = self.get(HTTP_ACCEPT_LANGUAGE='de')
+        self.assertEqual(self.decider(request), '/everyone/')
+        request.COOKIES['beta'] = '1'
+        self.assertEqual(self.decider(request), '/de/beta/')
+
+    def test_default(self):
+        decider = decision_redirector([({'user-agent': 'android'}, '/android/')], '/default/')
+        self.assertEqual(decider(self.get()), '/default/')
+
+    def test_reads_headers_once(self):
+        request = self.get(HTTP_USER_AGENT='iPhone', HTTP_ACCEPT_LANGUAGE='en')
+        request.META = CountingDict(request.META)
+        self.assertEqual(self.decider(request), '/everyone/')
+        self.assertEqual(sorted(request.META.reads), ['HTTP_ACCEPT_LANGUAGE', 'HTTP_USER_AGENT'])
+
+    def test_tests_conditions_once(self):
+        request = self.get(HTTP_USER_AGENT='Android', HTTP_ACCEPT_LANGUAGE='en')
+        request.META = CountingDict(request.META)
+        self.assertEqual(self.decider(request), '/android/')
+        self.assertEqual(sorted(request.META.reads), ['HTTP_ACCEPT_LANGUAGE', 'HTTP_USER_AGENT'])
+
+    def test_case_sensitive(self):
+        decider = decision_redirector([({'user-agent': 'android'}, '/android/')], '/default/',
+                                      case_sensitive=True)
+        self.assertEqual(decider(self.get(HTTP_USER_AGENT='Android')), '/default/')
+
+    def test_vary(self):
+        # in the order of the conditions, which are dicts here
+        self.assertEqual(sorted(self.decider.vary), ['Accept-Language', 'Cookie', 'User-Agent'])
+        rules = [([('user-agent', 'android'), ('accept-language', '^de')], '/de/android/')]
+        decider = decision_redirector(rules, '/default/')
+        self.assertEqual(decider.vary, ['User-Agent', 'Accept-Language'])
+
+    def test_redirect_uses_vary(self):
+        pattern = redirect(r'^take/comfort/$', self.decider, permanent=False)
+        response = pattern.callback(self.get(HTTP_USER_AGENT='Android'))
+        self.assertEqual(response['Location'], '/android/')
+        self.assertEqual(response['Vary'], ', '.join(self.decider.vary))
+        pattern = redirect(r'^take/comfort/$', self.decider, vary='User-Agent')
+        response = pattern.callback(self.get(HTTP_USER_AGENT='Android'))
+        self.assertEqual(response['Vary'], 'User-Agent')
+
+
 class TestNoRedirectUrlPattern(TestCase):
     def setUp(self):
         self.rf = RequestFactory()
@@ -142,6 +270,14 @@ class TestRedirectUrlPattern(TestCase):
         self.assertTrue(isinstance(url_pattern, URLPattern))
         self.assertEqual(url_pattern.name, 'Lebowski')
 
+    def test_unicode_classes(self):
+        """
+        Should match non-ASCII paths with \\w like Django did
+        """
+        pattern = redirect(r'^(?P<name>\w+)/$', '/dude/{name}/')
+        match = pattern.resolve(u'caf\xe9/')
+        self.assertEqual(match.kwargs['name'], u'caf\xe9')
+
     def test_no_query(self):
         """
         Should return a 301 redirect
@@ -187,6 +323,47 @@ class TestRedirectUrlPattern(TestCase):
         self.assertTrue(url.path, 'abides')
         self.assertEqual(query_dict, {'aggression': ['not_stand'], 'hates': ['the-eagles']})
 
+    def test_merge_query_order(self):
+        """
+        Should keep the requested params in order, with the colliding ones replaced in place
+        """
+        pattern = redirect(r'^the/dude$', 'abides',
+                           query={'rug': 'tied', 'drink': 'white russian'}, merge_query=True)
+        request = self.rf.get('the/dude?utm_source=bowling&rug=stolen&utm_term=the+dude'
+                              '&empty=&utm_source=alley%20lanes')
+        response = pattern.callback(request)
+        self.assertEqual(response['Location'], 'abides?utm_source=bowling&'
+                                               'utm_source=alley+lanes&rug=tied&'
+                                               'utm_term=the+dude&drink=white+russian')
+
+    def test_merge_query_without_request_query(self):
+        """
+        Should only use the pre-encoded query if the request has none
+        """
+        pattern = redirect(r'^the/dude$', 'abides', query={'rug': ['tied', 'room']},
+                           merge_query=True)
+        with patch('redirect_urls.utils.merge_query_string') as merge:
+            response = pattern.callback(self.rf.get('the/dude'))
+
+        self.assertFalse(merge.called)
+        self.assertEqual(response['Location'], 'abides?rug=tied&rug=room')
+
+    def test_merge_query_string(self):
+        """
+        Should merge like urlencode() of the parsed and updated query string
+        """
+        params = {'a': 'a=1', 'b': 'b=2&b=3', 'c': ''}
+        for querystring in ('', 'x=1&a=0&y=2&x=3', 'x=%C3%A9&a+b=c+d&a=%zz', 'x&=1&a=&y=',
+                            'c=1&x=a=b', 'x=1;a=2;y=3'):
+            merged = parse_qs(querystring)
+            merged.update({'a': '1', 'b': ['2', '3'], 'c': []})
+            result = merge_query_string(querystring, params)
+            expected = urlencode(merged, doseq=True)
+            if sys.version_info < (3, 6):
+                # urlencode() of a dict is in no particular order
+                result, expected = sorted(result.split('&')), sorted(expected.split('&'))
+            self.assertEqual(result, expected, querystring)
+
     def test_empty_query(self):
         """
         Should strip query params if called with empty query
@@ -415,3 +592,223 @@ class TestRedirectUrlPattern(TestCase):
         middleware = RedirectsMiddleware(resolver=resolver)
         resp = middleware(self.rf.get('/%2fexample.com/'))
         self.assertEqual(resp['Location'], '/example.com/')
+
+
+class TestStaticRedirectCache(TestCase):
+    def setUp(self):
+        self.rf = RequestFactory()
+
+    @patch('redirect_urls.utils.reverse')
+    def test_location_cached(self, mock_reverse):
+        """Should only compute the location of a static redirect once."""
+        mock_reverse.return_value = '/just/your/opinion/man'
+        pattern = redirect(r'^the/dude$', 'yeah.well.you.know.thats')
+        for i in range(3):
+            response = pattern.callback(self.rf.get('the/dude'))
+            self.assertEqual(response['Location'], '/just/your/opinion/man')
+
+        self.assertEqual(mock_reverse.call_count, 1)
+
+    @patch.object(Destination, 'url', autospec=True)
+    def test_query_string_in_key(self, mock_url):
+        """Should cache the location per query string when the query is passed on."""
+        mock_url.return_value = '/just/your/opinion/man'
+        pattern = redirect(r'^the/dude$', 'yeah.well.you.know.thats')
+        response = pattern.callback(self.rf.get('the/dude?white=russian'))
+        self.assertEqual(response['Location'], '/just/your/opinion/man?white=russian')
+        response = pattern.callback(self.rf.get('the/dude?aggression=not_stand'))
+        self.assertEqual(response['Location'], '/just/your/opinion/man?aggression=not_stand')
+        response = pattern.callback(self.rf.get('the/dude?white=russian'))
+        self.assertEqual(response['Location'], '/just/your/opinion/man?white=russian')
+        self.assertEqual(mock_url.call_count, 2)
+
+    @override_settings(ROOT_URLCONF='tests.i18n_urls')
+    def test_language_in_key(self):
+        """Should cache the location of a url name per language."""
+        pattern = redirect(r'^the/dude$', 'abides')
+        for language in ('en-us', 'de', 'en-us'):
+            with translation.override(language):
+                response = pattern.callback(self.rf.get('the/dude'))
+                self.assertEqual(response['Location'], '/{}/abides/'.format(language))
+
+    def test_captures_in_key(self):
+        resolver = get_resolver([redirect(r'^iam/the/(?P<name>.+)/$', '/donnie/the/{name}/')])
+        middleware = RedirectsMiddleware(resolver=resolver)
+        resp = middleware(self.rf.get('/iam/the/walrus/'))
+        self.assertEqual(resp['Location'], '/donnie/the/walrus/')
+        resp = middleware(self.rf.get('/de/iam/the/walrus/'))
+        self.assertEqual(resp['Location'], '/de/donnie/the/walrus/')
+        resp = middleware(self.rf.get('/iam/the/eggman/'))
+        self.assertEqual(resp['Location'], '/donnie/the/eggman/')
+
+    def test_same_headers_as_dynamic(self):
+        """Should set the same headers as a redirect that can't be cached."""
+        static = redirect(r'^the/dude$', 'abides', cache_timeout=2)
+        dynamic = redirect(r'^the/dude$', lambda request: 'abides', cache_timeout=2)
+        static_response = static.callback(self.rf.get('the/dude'))
+        dynamic_response = dynamic.callback(self.rf.get('the/dude'))
+        self.assertTrue(static_response.has_header('Expires'))
+        self.assertEqual(static_response.status_code, dynamic_response.status_code)
+        # Expires could be a second apart
+        del static_response['Expires']
+        del dynamic_response['Expires']
+        self.assertEqual(sorted(static_response.items()), sorted(dynamic_response.items()))
+
+    def test_no_cache_headers(self):
+        pattern = redirect(r'^the/dude$', 'abides', cache_timeout=None)
+        response = pattern.callback(self.rf.get('the/dude'))
+        self.assertFalse(response.has_header('Cache-Control'))
+        self.assertFalse(response.has_header('Expires'))
+
+    @override_settings(REDIRECT_URLS_STATIC_CACHE_SIZE=0)
+    @patch.object(Destination, 'url', autospec=True)
+    def test_disabled(self, mock_url):
+        mock_url.return_value = '/just/your/opinion/man'
+        pattern = redirect(r'^the/dude$', 'yeah.well.you.know.thats')
+        pattern.callback(self.rf.get('the/dude'))
+        response = pattern.callback(self.rf.get('the/dude'))
+        self.assertEqual(response['Location'], '/just/your/opinion/man')
+        self.assertEqual(response['Cache-Control'], 'max-age=43200')
+        self.assertEqual(mock_url.call_count, 2)
+
+
+class TestDestination(TestCase):
+    @patch('redirect_urls.utils.reverse')
+    def test_reverse_once(self, mock_reverse):
+        """Should only reverse a url name the first time it's used."""
+        mock_reverse.return_value = '/just/your/opinion/man/'
+        destination = Destination(to_args=['dude'])
+        self.assertEqual(destination.url('thats', [], {}), '/just/your/opinion/man/')
+        self.assertEqual(destination.url('thats', [], {'locale': 'de/'}),
+                         '/de/just/your/opinion/man/')
+        mock_reverse.assert_called_once_with('thats', args=['dude'], kwargs=None)
+
+    @override_settings(ROOT_URLCONF='tests.i18n_urls')
+    def test_reverse_per_language(self):
+        """Should reverse a url name again for each language."""
+        destination = Destination()
+        with translation.override('en-us'):
+            self.assertEqual(destination.url('abides', [], {}), '/en-us/abides/')
+        with translation.override('de'):
+            self.assertEqual(destination.url('abides', [], {}), '/de/abides/')
+        with translation.override('en-us'):
+            self.assertEqual(destination.url('abides', [], {}), '/en-us/abides/')
+
+    def test_callable_values(self):
+        """Should keep a template for each value from a callable."""
+        destination = Destination()
+        self.assertEqual(destination.url('/abide/{}/', ['dude'], {}), '/abide/dude/')
+        self.assertEqual(destination.url('/flout/{}/', ['dude'], {}), '/flout/dude/')
+        self.assertEqual(destination.url('/abide/{}/', ['walter'], {}), '/abide/walter/')
+
+    def test_no_prepend_locale(self):
+        destination = Destination(prepend_locale=False)
+        self.assertEqual(destination.url('/abide/', [], {'locale': 'de/'}), '/abide/')
+        self.assertEqual(destination.url('https://example.com/', [], {'locale': 'de/'}),
+                         'https://example.com/')
+
+    def test_strip_tags(self):
+        destination = Destination()
+        self.assertEqual(destination.url('/abide/{page}', [], {'page': 'dude<br>'}),
+                         '/abide/dude')
+        self.assertEqual(destination.url('/abide/{page}', [], {'page': 'dude>'}),
+                         '/abide/dude>')
+
+    def test_escaped_braces(self):
+        """Should only format if there are captures, like before."""
+        destination = Destination()
+        self.assertEqual(destination.url('/abide/{{dude}}', [], {'locale': ''}),
+                         '/abide/{dude}')
+        self.assertEqual(destination.url('/abide/{{dude}}', [], {}), '/abide/{{dude}}')
+
+
+class TestDefaultResolver(TestCase):
+    def setUp(self):
+        patcher = patch('redirect_urls.utils.redirectpatterns',
+                        [redirect(r'^dude/$', '/abides/')])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_shared(self):
+        self.assertIs(RedirectsMiddleware().resolver, RedirectsMiddleware().resolver)
+
+    def test_follows_registry_and_options(self):
+        resolver = default_resolver()
+        with override_settings(REDIRECT_URLS_RESOLVER={'combined': True}):
+            self.assertTrue(default_resolver().combined)
+
+        self.assertIsNot(default_resolver(), resolver)
+        self.assertIs(default_resolver(), default_resolver())
+        with patch('redirect_urls.utils.redirectpatterns', [redirect(r'^walter/$', '/')]):
+            self.assertTrue(default_resolver().resolve('/walter/'))
+
+    @patch('redirect_urls.utils.gc')
+    def test_warm_redirects(self, gc):
+        resolver = warm_redirects(freeze=True)
+        self.assertIs(resolver, default_resolver())
+        self.assertIsNotNone(resolver._index)
+        gc.freeze.assert_called_once_with()
+
+    @override_settings(REDIRECT_URLS_WARM=True)
+    def test_warm_setting(self):
+        with patch('redirect_urls.middleware.warm_redirects') as warm:
+            RedirectsMiddleware()
+
+        warm.assert_called_once_with()
+
+
+class TestResolveMany(TestCase):
+    def setUp(self):
+        self.patterns = [
+            redirect(r'^dude/$', '/abides/'),
+            no_redirect(r'^walter/$'),
+            gone(r'^donny/$'),
+            redirect(r'^rug/$', ua_redirector('dude', '/abide/', '/flout/'), permanent=False),
+            redirect(r'^caf\xe9/$', '/cafe/', merge_query=True, query={'x': '1'}),
+        ]
+
+    def test_answers(self):
+        requests = [
+            ('/dude/', 'rug=yes', None),
+            ('/de/dude/', None, None),
+            ('/walter/', '', None),
+            ('/donny/', '', None),
+            ('/rug/', '', {'User-Agent': 'the dude browses'}),
+            ('/rug/', '', {}),
+            (u'/caf\xe9/', 'y=2', None),
+            ('/nihilists/', '', None),
+        ]
+        results = list(resolve_many(requests, get_resolver(self.patterns)))
+        self.assertEqual([(status, location) for status, location, _ in results], [
+            (301, '/abides/?rug=yes'),
+            (301, '/de/abides/'),
+            (None, None),
+            (410, None),
+            (302, '/abide/'),
+            (302, '/flout/'),
+            (301, '/cafe/?y=2&x=1'),
+            (None, None),
+        ])
+        self.assertIs(results[0][2], self.patterns[0])
+        self.assertIs(results[2][2], self.patterns[1])
+        self.assertIsNone(results[-1][2])
+
+    def test_lazy(self):
+        def requests():
+            yield '/dude/', '', None
+            raise AssertionError('read too far')
+
+        results = resolve_many(requests(), get_resolver(self.patterns))
+        self.assertEqual(next(results)[1], '/abides/')
+
+    def test_registry(self):
+        with patch('redirect_urls.utils.redirectpatterns', self.patterns):
+            self.assertEqual(next(resolve_many([('/donny/', '', None)]))[0], 410)
+
+    def test_batch_request(self):
+        request = batch_request(u'/caf\xe9/', 'x=1', {'User-Agent': 'dude',
+                                                      'Content-Type': 'text/plain'})
+        self.assertEqual(request.path_info, u'/caf\xe9/')
+        self.assertEqual(request.GET['x'], '1')
+        self.assertEqual(request.META['HTTP_USER_AGENT'], 'dude')
+        self.assertEqual(request.META['CONTENT_TYPE'], 'text/plain')
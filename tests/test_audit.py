@@ -0,0 +1,132 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from mock import patch
+
+from redirect_urls import utils
+from redirect_urls.audit import AuditSummary, audit_urls, parse_url, read_urls
+from redirect_urls.utils import gone, redirect, set_redirectpatterns
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+URLS = '''
+# from the logs
+https://www.example.com/dude/?rug=yes
+/de/dude/
+/donny/
+/caf%C3%A9/
+/walter/
+'''
+
+
+def broken(request, *args, **kwargs):
+    raise ValueError('the rug')
+
+
+class AuditTestCase(TestCase):
+    def setUp(self):
+        self.addCleanup(set_redirectpatterns, utils.redirectpatterns)
+        set_redirectpatterns([
+            redirect(r'^dude/$', '/abides/'),
+            gone(r'^donny/$'),
+            redirect(u'^caf\xe9/$', '/cafe/'),
+            redirect(r'^walter/$', broken),
+        ])
+
+
+class TestAuditUrls(AuditTestCase):
+    def rows(self, **kwargs):
+        return [tuple(row) for row in audit_urls(read_urls(URLS.splitlines()), **kwargs)]
+
+    def test_parse_url(self):
+        self.assertEqual(parse_url('https://www.example.com/caf%C3%A9/?x=1'),
+                         (u'/caf\xe9/', 'x=1'))
+        self.assertEqual(parse_url('/dude/'), ('/dude/', ''))
+
+    def test_rows(self):
+        self.assertEqual(self.rows(chunk_size=2), [
+            ('https://www.example.com/dude/?rug=yes', 301, '/abides/?rug=yes',
+             r'^(?P<locale>\w{2,3}(?:-\w{2})?/)?dude/$'),
+            ('/de/dude/', 301, '/de/abides/', r'^(?P<locale>\w{2,3}(?:-\w{2})?/)?dude/$'),
+            ('/donny/', 410, None, r'^donny/$'),
+            ('/caf%C3%A9/', 301, '/cafe/', u'^(?P<locale>\\w{2,3}(?:-\\w{2})?/)?caf\xe9/$'),
+            ('/walter/', 500, None, None),
+        ])
+
+    @skipUnless(multiprocessing.get_start_method() == 'fork' if hasattr(
+        multiprocessing, 'get_start_method') else True, 'needs forked processes')
+    def test_processes(self):
+        self.assertEqual(self.rows(processes=2, chunk_size=1), self.rows())
+
+    def test_lazy(self):
+        def urls():
+            yield '/dude/'
+            yield '/donny/'
+            raise AssertionError('read too far')
+
+        rows = audit_urls(urls(), chunk_size=1)
+        self.assertEqual(next(rows).status, 301)
+
+    def test_summary(self):
+        summary = AuditSummary()
+        for row in audit_urls(read_urls(URLS.splitlines())):
+            summary.add(row)
+
+        self.assertEqual(summary.total, 5)
+        self.assertEqual(summary.statuses, {301: 3, 410: 1, 500: 1})
+        self.assertEqual(summary.top_patterns(1),
+                         [(r'^(?P<locale>\w{2,3}(?:-\w{2})?/)?dude/$', 2)])
+
+
+class TestRedirectAuditCommand(AuditTestCase):
+    def setUp(self):
+        super(TestRedirectAuditCommand, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.input = os.path.join(self.directory, 'urls.txt')
+        with open(self.input, 'w') as fp:
+            fp.write(URLS)
+
+    def call(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('redirect_audit', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_output(self):
+        out, err = self.call(self.input, '--processes', '1')
+        lines = out.splitlines()
+        self.assertEqual(lines[2], '/donny/\t410\t\t^donny/$')
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(err.splitlines()[0], 'Checked 5 URLs. 301: 3, 410: 1, 500: 1')
+
+    def test_output_file(self):
+        output = os.path.join(self.directory, 'results.tsv')
+        out, err = self.call(self.input, '--processes', '1', '--output', output)
+        self.assertEqual(out, '')
+        with io.open(output, encoding='utf-8') as fp:
+            self.assertEqual(len(fp.read().splitlines()), 5)
+
+    def test_headers(self):
+        with patch('redirect_urls.management.commands.redirect_audit.audit_urls',
+                   return_value=[]) as audit:
+            self.call(self.input, '--header', 'User-Agent: the dude', '--processes', '3')
+
+        self.assertEqual(audit.call_args[0][1:], ({'User-Agent': 'the dude'}, 3, 1000))
+        with self.assertRaises(CommandError):
+            self.call(self.input, '--header', 'dude')
@@ -0,0 +1,99 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from django.test import TestCase
+
+from redirect_urls.cache import ClassificationCache, LRUCache
+
+
+class TestLRUCache(TestCase):
+    def test_get_and_set(self):
+        cache = LRUCache(2)
+        self.assertIsNone(cache.get('dude'))
+        self.assertEqual(cache.get('dude', 'nope'), 'nope')
+        cache.set('dude', 'abides')
+        self.assertEqual(cache.get('dude'), 'abides')
+        self.assertIn('dude', cache)
+        self.assertEqual(len(cache), 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set('dude', 'abides')
+        cache.set('walter', 'shomer shabbos')
+        # use dude so walter is evicted next
+        cache.get('dude')
+        cache.set('donny', 'out of his element')
+        self.assertNotIn('walter', cache)
+        self.assertIn('dude', cache)
+        self.assertIn('donny', cache)
+        cache.set('bunny', 'kidnapped')
+        self.assertNotIn('dude', cache)
+
+    def test_stats(self):
+        cache = LRUCache(1)
+        cache.get('dude')
+        cache.set('dude', 'abides')
+        cache.get('dude')
+        cache.set('walter', 'shomer shabbos')
+        self.assertEqual(cache.stats(), {
+            'size': 1,
+            'maxsize': 1,
+            'hits': 1,
+            'misses': 1,
+            'evictions': 1,
+        })
+
+    def test_clear(self):
+        cache = LRUCache(2)
+        cache.set('dude', 'abides')
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class TestClassificationCache(TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def upper(self, value):
+        self.calls.append(value)
+        return value.upper()
+
+    def test_classify(self):
+        cache = ClassificationCache(2)
+        self.assertEqual(cache.classify('dude', 'upper', self.upper), 'DUDE')
+        self.assertEqual(cache.classify('dude', 'upper', self.upper), 'DUDE')
+        self.assertEqual(self.calls, ['dude'])
+        # other classifiers of the same value share its entry
+        self.assertEqual(cache.classify('dude', 'len', len), 4)
+        self.assertEqual(cache.classify('dude', 'len', len), 4)
+        self.assertEqual(cache.stats(), {
+            'size': 1,
+            'maxsize': 2,
+            'hits': 2,
+            'misses': 2,
+            'evictions': 0,
+            'hit_rate': 0.5,
+        })
+
+    def test_evicts_values(self):
+        cache = ClassificationCache(1)
+        cache.classify('dude', 'upper', self.upper)
+        cache.classify('walter', 'upper', self.upper)
+        cache.classify('dude', 'upper', self.upper)
+        self.assertEqual(self.calls, ['dude', 'walter', 'dude'])
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+    def test_long_values_not_cached(self):
+        cache = ClassificationCache(2, max_length=4)
+        cache.classify('walter', 'upper', self.upper)
+        cache.classify('walter', 'upper', self.upper)
+        self.assertEqual(self.calls, ['walter', 'walter'])
+        self.assertEqual(len(cache.values), 0)
+
+    def test_disabled(self):
+        cache = ClassificationCache(0)
+        self.assertEqual(cache.classify('dude', 'upper', self.upper), 'DUDE')
+        self.assertEqual(cache.classify('dude', 'upper', self.upper), 'DUDE')
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(cache.stats()['hit_rate'], 0.0)
@@ -0,0 +1,222 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import RequestFactory, TestCase
+
+from mock import patch
+
+from redirect_urls import utils
+from redirect_urls.chains import collapse_chains, find_chains
+from redirect_urls.database import database_redirects
+from redirect_urls.middleware import RedirectsMiddleware
+from redirect_urls.tables import RedirectTable
+from redirect_urls.utils import get_resolver, redirect, set_redirectpatterns
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class TestCollapseChains(TestCase):
+    def setUp(self):
+        self.rf = RequestFactory()
+
+    def location(self, patterns, path, **params):
+        middleware = RedirectsMiddleware(resolver=get_resolver(patterns))
+        return middleware(self.rf.get(path, params))['Location']
+
+    def chains(self, patterns):
+        return dict((chain.urls[0], chain) for chain in collapse_chains(patterns))
+
+    def test_collapses_to_the_end(self):
+        patterns = [
+            redirect(r'^dude/$', '/lebowski/'),
+            redirect(r'^lebowski/$', '/duderino/'),
+            redirect(r'^duderino/$', '/abides/'),
+        ]
+        chains = self.chains(patterns)
+        self.assertEqual(chains['/lebowski/'].urls, ['/lebowski/', '/duderino/', '/abides/'])
+        self.assertEqual(chains['/lebowski/'].skipped, 2)
+        self.assertEqual(chains['/duderino/'].destination, '/abides/')
+        self.assertEqual(self.location(patterns, '/dude/'), '/abides/')
+        self.assertEqual(self.location(patterns, '/de/dude/', rug='yes'), '/de/abides/?rug=yes')
+        # the last one isn't a chain
+        self.assertEqual(len(chains), 2)
+
+    def test_url_names(self):
+        patterns = [
+            redirect(r'^dude/$', '/lebowski/'),
+            redirect(r'^lebowski/$', 'abides'),
+        ]
+        with patch('redirect_urls.utils.reverse', return_value='/abides/'):
+            collapse_chains(patterns)
+            self.assertEqual(self.location(patterns, '/fr/dude/'), '/fr/abides/')
+
+        self.assertEqual(patterns[0].collapsed[0], 'abides')
+
+    def test_stops_at_redirects_that_cannot_be_skipped(self):
+        patterns = [
+            redirect(r'^dude/$', '/walter/'),
+            redirect(r'^walter/$', '/bowling/'),
+            redirect(r'^bowling/$', '/league/', permanent=False),
+            redirect(r'^donnie/$', '/bunny/'),
+            redirect(r'^bunny/(?P<toe>\w*)$', '/ransom/{toe}'),
+            redirect(r'^maude/$', '/art/'),
+            redirect(r'^art/$', lambda r, *a, **kw: '/studio/'),
+            redirect(r'^jackie/$', '/treehorn/'),
+            redirect(r'^treehorn/$', '/malibu/', query={'beach': 'party'}),
+            redirect(r'^smokey/$', '/over/the/line/'),
+            redirect(r'^over/the/line/$', '/mark/it/', locale_prefix=False),
+            redirect(r'^brandt/$', '/big/'),
+            redirect(r'^big/$', '/lebowski/', vary='User-Agent'),
+            redirect(r'^stranger/$', '/the/dude/'),
+            redirect(r'^dude/$', '/abides/'),
+        ]
+        chains = self.chains(patterns)
+        self.assertEqual(chains['/walter/'].reason, 'temporary redirect')
+        self.assertEqual(chains['/walter/'].destination, '/bowling/')
+        self.assertEqual(chains['/bunny/'].reason, 'destination built from captures')
+        self.assertEqual(chains['/art/'].reason, 'callable destination')
+        self.assertEqual(chains['/treehorn/'].reason, 'changes the query string or anchor')
+        self.assertEqual(chains['/over/the/line/'].reason,
+                         'only matches without a locale prefix')
+        self.assertEqual(chains['/big/'].reason, 'depends on headers')
+        self.assertEqual(chains['/the/dude/'].reason, 'matched part of the path as a locale')
+        for url in ('/bunny/', '/art/', '/treehorn/', '/over/the/line/', '/big/', '/the/dude/'):
+            self.assertEqual(chains[url].skipped, 0)
+
+        self.assertEqual(self.location(patterns, '/dude/'), '/bowling/')
+        self.assertEqual(self.location(patterns, '/jackie/'), '/treehorn/')
+
+    def test_locale_is_kept_as_requested(self):
+        patterns = [
+            redirect(r'^dude/$', '/de/lebowski/', prepend_locale=False),
+            redirect(r'^lebowski/$', '/abides/'),
+            redirect(r'^walter/$', '/donnie/', prepend_locale=False),
+            redirect(r'^donnie/$', '/bowling/'),
+        ]
+        collapse_chains(patterns)
+        self.assertEqual(self.location(patterns, '/fr/dude/'), '/de/abides/')
+        self.assertEqual(self.location(patterns, '/fr/walter/'), '/bowling/')
+
+    def test_locale_paths_taken_by_other_patterns(self):
+        patterns = [
+            redirect(r'^de/b/$', '/x/', locale_prefix=False),
+            redirect(r'^a/$', '/b/'),
+            redirect(r'^b/$', '/c/'),
+        ]
+        self.assertEqual(self.location(patterns, '/de/a/'), '/de/b/')
+        chains = self.chains(patterns)
+        self.assertEqual(chains['/b/'].reason, 'a pattern before it takes the path with a locale')
+        self.assertEqual(chains['/b/'].skipped, 0)
+        self.assertEqual(self.location(patterns, '/de/a/'), '/de/b/')
+        self.assertEqual(self.location(patterns, '/de/b/'), '/x/')
+        self.assertEqual(self.location(patterns, '/a/'), '/b/')
+
+    def test_locale_paths_of_tables(self):
+        table = RedirectTable([('/de/b/', '/x/', 301)], locale_prefix=False)
+        patterns = [
+            table,
+            redirect(r'^a/$', '/b/'),
+            redirect(r'^b/$', '/c/'),
+        ]
+        collapse_chains(patterns)
+        self.assertEqual(self.location(patterns, '/de/a/'), '/de/b/')
+
+    def test_loops(self):
+        patterns = [
+            redirect(r'^dude/$', '/walter/'),
+            redirect(r'^walter/$', '/donnie/'),
+            redirect(r'^donnie/$', '/walter/'),
+        ]
+        with patch('redirect_urls.chains.log') as log:
+            chains = self.chains(patterns)
+
+        self.assertTrue(chains['/walter/'].loop)
+        self.assertTrue(chains['/donnie/'].loop)
+        self.assertEqual(log.warning.call_count, 3)
+        self.assertIsNone(patterns[0].collapsed)
+        self.assertEqual(self.location(patterns, '/dude/'), '/walter/')
+
+    def test_tables(self):
+        patterns = [
+            RedirectTable([('dude/', '/walter/', 301), ('walter/', '/bowling/', 301),
+                           ('donnie/', '/bunny/', 301)]),
+            redirect(r'^bowling/$', '/league/'),
+            redirect(r'^maude/$', '/dude/'),
+            # not a URL name either
+            redirect(r'^bunny/$', 'ransom'),
+        ]
+        chains = self.chains(patterns)
+        self.assertEqual(chains['/walter/'].label, 'table /dude/')
+        self.assertEqual(chains['/bunny/'].reason, 'table rows need a URL')
+        self.assertEqual(self.location(patterns, '/es/dude/'), '/es/league/')
+        self.assertEqual(self.location(patterns, '/walter/'), '/league/')
+        self.assertEqual(self.location(patterns, '/maude/'), '/league/')
+        self.assertEqual(self.location(patterns, '/donnie/'), '/bunny/')
+
+    def test_database_redirects_come_first(self):
+        patterns = [
+            redirect(r'^dude/$', '/walter/'),
+            database_redirects(),
+            redirect(r'^walter/$', '/bowling/'),
+        ]
+        self.assertEqual(collapse_chains(patterns), [])
+
+    def test_collapses_again(self):
+        patterns = [
+            redirect(r'^dude/$', '/walter/'),
+            redirect(r'^walter/$', '/bowling/'),
+        ]
+        collapse_chains(patterns)
+        self.assertEqual(self.location(patterns, '/dude/'), '/bowling/')
+        del patterns[1]
+        collapse_chains(patterns)
+        self.assertEqual(self.location(patterns, '/dude/'), '/walter/')
+
+    def test_find_chains_changes_nothing(self):
+        patterns = [
+            redirect(r'^dude/$', '/walter/'),
+            redirect(r'^walter/$', '/bowling/'),
+        ]
+        self.assertEqual(len(find_chains(patterns)), 1)
+        self.assertEqual(self.location(patterns, '/dude/'), '/walter/')
+
+
+class TestRedirectChainsCommand(TestCase):
+    def setUp(self):
+        self.addCleanup(set_redirectpatterns, utils.redirectpatterns)
+        set_redirectpatterns([
+            redirect(r'^dude/$', '/walter/', locale_prefix=False),
+            redirect(r'^walter/$', '/bowling/'),
+            redirect(r'^bowling/$', '/league/', permanent=False),
+        ])
+
+    def call(self, *args):
+        out = StringIO()
+        call_command('redirect_chains', *args, stdout=out)
+        return out.getvalue()
+
+    def test_lines(self):
+        lines = self.call().splitlines()
+        self.assertEqual(lines[0], '^dude/$ -> /walter/ -> /bowling/ -> /league/  '
+                                   '[collapses to /bowling/, stops at /bowling/: '
+                                   'temporary redirect]')
+        self.assertEqual(len(lines), 2)
+
+    def test_json(self):
+        chains = json.loads(self.call('--json'))
+        self.assertEqual(chains[0]['destination'], '/bowling/')
+        self.assertEqual(chains[1]['reason'], 'temporary redirect')
+
+    def test_fail_on_loops(self):
+        self.call('--fail')
+        utils.redirectpatterns.append(redirect(r'^league/$', '/league/'))
+        with self.assertRaises(CommandError):
+            self.call('--fail')
@@ -0,0 +1,147 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from mock import patch
+
+from redirect_urls.database import UnknownRedirects, database_redirects
+from redirect_urls.middleware import RedirectsMiddleware
+from redirect_urls.models import Redirect, RedirectsVersion, bump_version, current_version
+from redirect_urls.stats import RedirectStats
+from redirect_urls.utils import get_resolver, redirect
+
+
+class TestRedirectModel(TestCase):
+    def test_version_bumped(self):
+        self.assertEqual(current_version(), 0)
+        redirect = Redirect.objects.create(pattern='^dude/$', to='/abides/')
+        self.assertEqual(current_version(), 1)
+        redirect.delete()
+        self.assertEqual(current_version(), 2)
+        bump_version()
+        self.assertEqual(RedirectsVersion.objects.get().version, 3)
+
+    def test_clean(self):
+        with self.assertRaises(ValidationError):
+            Redirect(pattern='^dude/(', to='/abides/').clean()
+
+        with self.assertRaises(ValidationError):
+            Redirect(pattern='^dude/$').clean()
+
+        Redirect(pattern='^dude/$', gone=True).clean()
+
+
+@patch('redirect_urls.database.default_timer')
+class TestDatabaseRedirects(TestCase):
+    def setUp(self):
+        self.rf = RequestFactory()
+        Redirect.objects.create(pattern='^dude/$', to='/abides/', order=2)
+        Redirect.objects.create(pattern=r'^walter/(?P<game>\w+)/$', to='/bowling/{game}/',
+                                permanent=False, query='league=1', anchor='lanes', order=1)
+        Redirect.objects.create(pattern='^donnie/$', gone=True, locale_prefix=False, order=3)
+        Redirect.objects.create(pattern='^smokey/$', to='/over/the/line/', enabled=False)
+        self.source = database_redirects(interval=30)
+        self.patterns = [
+            redirect(r'^jackie/$', '/treehorn/'),
+            self.source,
+            redirect(r'^dude/$', '/too/late/'),
+        ]
+
+    def middleware(self, **kwargs):
+        return RedirectsMiddleware(resolver=get_resolver(self.patterns), **kwargs)
+
+    def test_responses(self, timer):
+        timer.return_value = 0
+        middleware = self.middleware()
+        resp = middleware(self.rf.get('/de/dude/', {'bowling': 'yes'}))
+        self.assertEqual(resp.status_code, 301)
+        self.assertEqual(resp['Location'], '/de/abides/?bowling=yes')
+        resp = middleware(self.rf.get('/walter/roll/', {'bowling': 'yes'}))
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(resp['Location'], '/bowling/roll/?league=1#lanes')
+        self.assertEqual(middleware(self.rf.get('/donnie/')).status_code, 410)
+        self.assertIsNone(middleware(self.rf.get('/de/donnie/')))
+        self.assertIsNone(middleware(self.rf.get('/smokey/')))
+        self.assertEqual(middleware(self.rf.get('/jackie/'))['Location'], '/treehorn/')
+
+    def test_queries_at_most_every_interval(self, timer):
+        timer.return_value = 0
+        middleware = self.middleware()
+        with CaptureQueriesContext(connection) as queries:
+            middleware(self.rf.get('/dude/'))
+        # version and redirects
+        self.assertEqual(len(queries), 2)
+
+        timer.return_value = 29
+        with self.assertNumQueries(0):
+            middleware(self.rf.get('/dude/'))
+            middleware(self.rf.get('/nope/'))
+
+        Redirect.objects.filter(pattern='^dude/$').update(to='/new/abode/')
+        timer.return_value = 31
+        # same version, so the update isn't seen yet
+        with self.assertNumQueries(1):
+            resp = middleware(self.rf.get('/dude/'))
+        self.assertEqual(resp['Location'], '/abides/')
+
+        bump_version()
+        timer.return_value = 62
+        with self.assertNumQueries(2):
+            resp = middleware(self.rf.get('/dude/'))
+        self.assertEqual(resp['Location'], '/new/abode/')
+
+    def test_saving_reloads(self, timer):
+        timer.return_value = 0
+        middleware = self.middleware()
+        self.assertIsNone(middleware(self.rf.get('/maude/')))
+        Redirect.objects.create(pattern='^maude/$', to='/art/')
+        timer.return_value = 31
+        self.assertEqual(middleware(self.rf.get('/maude/'))['Location'], '/art/')
+
+    def test_changes_clear_miss_cache(self, timer):
+        timer.return_value = 0
+        middleware = self.middleware(miss_cache_size=100)
+        self.assertIsNone(middleware(self.rf.get('/en-US/promo/')))
+        self.assertEqual(len(middleware.miss_cache), 1)
+        Redirect.objects.create(pattern='^promo/$', to='/campaign/')
+        timer.return_value = 31
+        self.assertEqual(middleware(self.rf.get('/en-US/promo/'))['Location'],
+                         '/en-US/campaign/')
+
+    def test_keeps_redirects_when_loading_fails(self, timer):
+        timer.return_value = 0
+        middleware = self.middleware()
+        middleware(self.rf.get('/dude/'))
+        bump_version()
+        timer.return_value = 31
+        with patch('redirect_urls.models.Redirect.url_pattern', side_effect=ValueError), \
+                patch('redirect_urls.database.log') as log:
+            self.assertEqual(middleware(self.rf.get('/dude/'))['Location'], '/abides/')
+
+        self.assertTrue(log.exception.called)
+
+        # not tried again until the next interval
+        with self.assertNumQueries(0):
+            middleware(self.rf.get('/dude/'))
+
+    def test_stats_count_redirects(self, timer):
+        timer.return_value = 0
+        stats = RedirectStats()
+        middleware = self.middleware(stats=stats)
+        middleware(self.rf.get('/dude/'))
+        middleware(self.rf.get('/fr/dude/'))
+        self.assertEqual(stats.snapshot()[0]['hits'], 2)
+        self.assertIn('dude/$', stats.snapshot()[0]['pattern'])
+
+
+class TestUnknownRedirects(TestCase):
+    def test_resolve(self):
+        with self.assertNumQueries(0):
+            self.assertIsNone(UnknownRedirects().resolve('/dude/'))
+            barrier = UnknownRedirects(barrier=True)
+            self.assertIs(barrier.resolve('/any/path/').func, barrier)
@@ -0,0 +1,266 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import random
+import re
+
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+
+from redirect_urls import utils
+from redirect_urls.database import database_redirects
+from redirect_urls.export import export_redirects
+from redirect_urls.middleware import RedirectsMiddleware
+from redirect_urls.tables import RedirectTable
+from redirect_urls.utils import (get_resolver, gone, no_redirect, redirect,
+                                 set_redirectpatterns, ua_redirector)
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+LOCALES = ['de', 'en-US']
+NGINX_ENTRY_RE = re.compile(r'^\s+"((?:[^"\\]|\\.)*)" "((?:[^"\\]|\\.)*)";$')
+NGINX_UNESCAPE_RE = re.compile(r'\\(.)')
+QUERIES = ['', 'x=1&y=two']
+
+
+def make_patterns():
+    return [
+        redirect(r'^firefox/$', '/new/'),
+        redirect(r'^old/site/$', 'https://example.com/site/', locale_prefix=False),
+        gone(r'^dead/$'),
+        redirect(r'^promo/$', '/p/', permanent=False, query={'utm_source': 'a b'}, anchor='top'),
+        redirect(r'^clean/$', '/tidy/', query={}),
+        redirect(r'^kept/$', '/kept/new/', anchor='here'),
+        no_redirect(r'^docs/keep/$'),
+        redirect(r'^docs/(?P<page>[\w-]+)/$', '/help/{page}/'),
+        redirect(r'^shadow/(?P<x>\w+)/$', '/first/{x}/', prepend_locale=False),
+        redirect(r'^shadow/me/$', '/second/'),
+        redirect(r'^ua/(?P<x>\w+)/$', ua_redirector('Firefox', '/fx/', '/other/')),
+        redirect(r'^ua/(?P<x>\w+)/$', '/never/{x}/'),
+        redirect(r'^merge/$', '/m/', query={'a': '1'}, merge_query=True),
+        redirect(r'^shout/(?P<word>\w+)/$', '/quiet/{word}/', re_flags='i'),
+        redirect(r'^page/(\d+)/$', '/pages/{0}/'),
+        RedirectTable([('table/one/', '/uno/', 301), ('table/two/', '/dos/', 302),
+                       ('table/gone/', '', 410), ('firefox/', '/shadowed/', 301)]),
+        RedirectTable([('fixed/', '/fijo/', 301)], locale_prefix=False),
+        redirect(r'^after/(?P<x>\w+)/$', '/later/{x}/'),
+    ]
+
+
+def generate_patterns(size, seed=42):
+    """Return random redirects over a few path segments, and paths to try them with."""
+    rand = random.Random(seed)
+    words = ['firefox', 'new', 'about', 'legal', 'docs', 'mobile']
+    patterns, paths = [], []
+    for n in range(size):
+        path = '{}/{}/'.format(rand.choice(words), rand.choice(words))
+        kwargs = {
+            'permanent': rand.random() < 0.8,
+            'locale_prefix': rand.random() < 0.7,
+            'prepend_locale': rand.random() < 0.8,
+            'query': rand.choice([None, None, {}, {'n': str(n)}]),
+            'anchor': rand.choice([None, None, None, 'top']),
+        }
+        kind = rand.random()
+        if kind < 0.5:
+            patterns.append(redirect('^{}$'.format(path), '/to/{}/'.format(n), **kwargs))
+        elif kind < 0.8:
+            patterns.append(redirect(r'^{}(?P<rest>\w+)/$'.format(path),
+                                     '/to/{}/{{rest}}/'.format(n), **kwargs))
+            path += 'more/'
+        elif kind < 0.9:
+            patterns.append(redirect('^{}$'.format(path), lambda request, **kw: '/called/',
+                                     **kwargs))
+        else:
+            patterns.append(gone('^{}$'.format(path)))
+
+        paths.append('/' + path)
+
+    paths += ['/{}{}'.format(locale, path) for path in paths for locale in LOCALES + ['fr']]
+    return patterns, paths
+
+
+def make_paths():
+    paths = ['/firefox/', '/old/site/', '/dead/', '/promo/', '/clean/', '/kept/',
+             '/docs/keep/', '/docs/intro/', '/docs/a-b/', '/shadow/me/', '/shadow/you/',
+             '/ua/x/', '/merge/', '/shout/hey/', '/SHOUT/hey/', '/page/3/', '/table/one/',
+             '/table/two/', '/table/gone/', '/fixed/', '/after/it/', '/nowhere/']
+    return paths + ['/{}{}'.format(locale, path) for path in paths
+                    for locale in LOCALES + ['fr']]
+
+
+def parse_nginx(text):
+    exact, regexes = {}, []
+    for line in text.splitlines():
+        entry = NGINX_ENTRY_RE.match(line)
+        if entry:
+            key, value = [NGINX_UNESCAPE_RE.sub(r'\1', group) for group in entry.groups()]
+            if key.startswith('~'):
+                regexes.append((re.compile(key[1:]), value))
+            else:
+                exact[key] = value
+
+    return exact, regexes
+
+
+def nginx_answer(entries, path, query):
+    """Return `(status, location)` like nginx would for the map, or None."""
+    exact, regexes = entries
+    captures = {}
+    value = exact.get(path)
+    if value is None:
+        for regex, value in regexes:
+            match = regex.match(path)
+            if match:
+                captures = match.groupdict()
+                break
+        else:
+            value = ''
+
+    if not value:
+        return None
+
+    status, _, url = value.partition(' ')
+    url = url.replace('$is_args$args', '?' + query if query else '')
+    url = re.sub(r'\$\{(\w+)\}', lambda m: captures.get(m.group(1)) or '', url)
+    return int(status), url or None
+
+
+def apache_answer(text, path, query):
+    """Return `(status, location)` like mod_rewrite would for the map, or None."""
+    entries = dict(line.split(' ', 1) for line in text.splitlines()[1:])
+    value = entries.get(path)
+    if value is None:
+        return None
+
+    status, _, url = value.partition(':')
+    if not url:
+        return int(status), None
+
+    url, anchor, fragment = url.partition('#')
+    if '?' in url:
+        # replaces the requested query string, or drops it if the ? is last
+        url = url.rstrip('?')
+    elif query:
+        url += '?' + query
+
+    return int(status), url + anchor + fragment
+
+
+class TestExportRedirects(TestCase):
+    def setUp(self):
+        self.rf = RequestFactory()
+        self.patterns = make_patterns()
+        self.middleware = RedirectsMiddleware(resolver=get_resolver(self.patterns))
+        self.export = export_redirects(self.patterns, LOCALES)
+
+    def django_answer(self, path, query):
+        response = self.middleware(self.rf.get('{}?{}'.format(path, query)))
+        if response is None:
+            return None
+
+        return response.status_code, response.get('Location')
+
+    def assertSameAnswers(self, answer, paths=None):
+        answered = set()
+        for path in paths or make_paths():
+            for query in QUERIES:
+                edge = answer(path, query)
+                if edge is not None:
+                    # otherwise Django answers
+                    self.assertEqual(edge, self.django_answer(path, query), (path, query))
+                    answered.add(path)
+
+        return answered
+
+    def test_nginx_answers_like_django(self):
+        entries = parse_nginx(self.export.nginx_map())
+        answered = self.assertSameAnswers(lambda path, query: nginx_answer(entries, path, query))
+        for path in ('/firefox/', '/de/firefox/', '/fr/firefox/', '/dead/', '/promo/',
+                     '/clean/', '/kept/', '/docs/intro/', '/en-US/docs/a-b/', '/shadow/me/',
+                     '/de/shadow/me/', '/shout/hey/', '/SHOUT/hey/', '/table/one/',
+                     '/de/table/two/', '/table/gone/', '/fixed/', '/old/site/', '/after/it/'):
+            self.assertIn(path, answered)
+
+        # the table could have a row for any locale
+        for path in ('/docs/keep/', '/ua/x/', '/merge/', '/page/3/', '/fr/table/one/',
+                     '/de/after/it/', '/nowhere/'):
+            self.assertNotIn(path, answered)
+
+    def test_apache_answers_like_django(self):
+        text = self.export.apache_map()
+        answered = self.assertSameAnswers(lambda path, query: apache_answer(text, path, query))
+        for path in ('/firefox/', '/de/firefox/', '/dead/', '/promo/', '/clean/',
+                     '/shadow/me/', '/table/one/', '/en-US/table/two/', '/fixed/'):
+            self.assertIn(path, answered)
+
+        # anchors come before the kept query string, regexes aren't exported
+        for path in ('/kept/', '/fr/firefox/', '/docs/intro/', '/shout/hey/'):
+            self.assertNotIn(path, answered)
+
+    def test_generated_corpus(self):
+        self.patterns, paths = generate_patterns(300)
+        self.middleware = RedirectsMiddleware(resolver=get_resolver(self.patterns))
+        export = export_redirects(self.patterns, LOCALES)
+        entries = parse_nginx(export.nginx_map())
+        text = export.apache_map()
+        nginx = self.assertSameAnswers(lambda path, query: nginx_answer(entries, path, query),
+                                       paths)
+        apache = self.assertSameAnswers(lambda path, query: apache_answer(text, path, query),
+                                        paths)
+        # most of them are static
+        self.assertGreater(len(nginx), len(set(paths)) / 2)
+        self.assertGreater(len(apache), len(set(paths)) / 5)
+
+    def test_skipped(self):
+        skipped = dict(self.export.skipped)
+        self.assertEqual(skipped[r'^(?P<locale>\w{2,3}(?:-\w{2})?/)?ua/(?P<x>\w+)/$'],
+                         'callable destination')
+        self.assertEqual(skipped[r'^(?P<locale>\w{2,3}(?:-\w{2})?/)?merge/$'],
+                         'merges the query string')
+        self.assertEqual(skipped[r'^(?P<locale>\w{2,3}(?:-\w{2})?/)?page/(\d+)/$'],
+                         'destination template')
+
+    def test_nothing_after_database_redirects(self):
+        patterns = [
+            redirect(r'^firefox/$', '/new/'),
+            redirect(r'^docs/(?P<page>[\w-]+)/$', '/help/{page}/'),
+            database_redirects(),
+            redirect(r'^exact/$', '/new/'),
+            redirect(r'^after/(?P<x>\w+)/$', '/later/{x}/'),
+        ]
+        export = export_redirects(patterns, LOCALES)
+        self.assertEqual(export.exact['/firefox/'].url, '/new/')
+        self.assertIsNone(export.exact['/exact/'].status)
+        # the firefox one is for the locales that aren't exported
+        self.assertEqual(len(export.regexes), 2)
+        skipped = dict(export.skipped)
+        self.assertEqual(skipped['database redirects'], 'can change at any time')
+        self.assertEqual(skipped[r'^(?P<locale>\w{2,3}(?:-\w{2})?/)?after/(?P<x>\w+)/$'],
+                         'after database redirects')
+
+
+class TestRedirectExportCommand(TestCase):
+    def setUp(self):
+        self.addCleanup(set_redirectpatterns, utils.redirectpatterns)
+        set_redirectpatterns(make_patterns())
+
+    def call(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('redirect_export', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_nginx(self):
+        out, err = self.call('nginx', '--locales', 'de', '--report')
+        self.assertIn('    "/de/firefox/" "301 /de/new/$is_args$args";', out.splitlines())
+        self.assertIn('callable destination', err)
+
+    def test_apache(self):
+        out, err = self.call('apache', '--locales', 'de')
+        self.assertIn('/de/promo/ 302:/de/p/?utm_source=a+b#top', out.splitlines())
+        self.assertTrue(err.startswith('Exported '))
@@ -0,0 +1,100 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+
+from mock import patch
+
+from redirect_urls import utils
+from redirect_urls.lint import check_patterns, lint_patterns, lint_regex
+from redirect_urls.tables import RedirectTable
+from redirect_urls.utils import redirect, register, set_redirectpatterns
+
+
+def messages(regex, budget=0.01):
+    return [problem.message for problem in lint_regex(regex, budget)]
+
+
+class TestLintRegex(TestCase):
+    def test_typical_patterns(self):
+        for regex in (utils.LOCALE_RE + r'dude/$',
+                      utils.LOCALE_RE + r'docs/(?P<page>[\w-]+)/$',
+                      r'^rugs/(\d+/)+$',
+                      r'^(?:donny|walter|maude)/(?P<rest>.*)$',
+                      r'^bowling/(?P<lane>[^/]+)/(?P<frame>\d{1,2})/$'):
+            self.assertEqual(lint_regex(regex), [], regex)
+
+    def test_nested_quantifiers(self):
+        self.assertIn('nested quantifier', messages(r'^(\w+)+$'))
+        self.assertIn('nested quantifier', messages(r'^dude/(\w+-?)+/$'))
+
+    def test_overlapping_alternatives(self):
+        self.assertEqual(messages(r'^(\w-|\d\.)*$'),
+                         ['overlapping alternatives in a quantifier'])
+        self.assertEqual(messages(r'^(walter-|donny\.)*$'), [])
+
+    def test_leading_wildcard(self):
+        self.assertEqual(messages(r'^.*old/$'), ['leading wildcard'])
+        self.assertEqual(messages(utils.LOCALE_RE + r'(.*)/rug/$'), ['leading wildcard'])
+        self.assertEqual(messages(r'^[^/]*/rug/$'), [])
+
+    def test_over_budget(self):
+        problems = lint_regex(r'^(a|a)*$', 0.0005)
+        self.assertEqual(len(problems), 1)
+        self.assertTrue(problems[0].over_budget)
+        self.assertIn('ms to match', problems[0].message)
+
+    def test_invalid_regex(self):
+        self.assertEqual(lint_regex(r'^(dude/$'), [])
+
+
+class TestCheckPatterns(TestCase):
+    def setUp(self):
+        self.patterns = [
+            redirect(r'^dude/$', '/abides/'),
+            redirect(r'^(\w+)+$', '/nihilists/'),
+            RedirectTable([('walter/', '/sobchak/', 301)]),
+        ]
+
+    def test_lint_patterns(self):
+        patterns = [redirect(r'^.*old/$', '/new/')] + self.patterns[::2]
+        problems = lint_patterns(patterns + patterns, 1)
+        self.assertEqual([problem.message for problem in problems], ['leading wildcard'])
+
+    def test_off_by_default(self):
+        with patch('redirect_urls.lint.lint_patterns') as lint_patterns:
+            check_patterns(self.patterns)
+
+        self.assertFalse(lint_patterns.called)
+
+    @override_settings(REDIRECT_URLS_LINT='warn', REDIRECT_URLS_LINT_BUDGET=0)
+    def test_warn(self):
+        with patch('redirect_urls.lint.log') as log:
+            check_patterns(self.patterns)
+
+        self.assertTrue(log.warning.called)
+
+    @override_settings(REDIRECT_URLS_LINT='error', REDIRECT_URLS_LINT_BUDGET=0)
+    @patch('redirect_urls.lint.log')
+    def test_error(self, log):
+        with self.assertRaises(ImproperlyConfigured):
+            check_patterns(self.patterns)
+
+    @override_settings(REDIRECT_URLS_LINT='error')
+    def test_error_only_over_budget(self):
+        with patch('redirect_urls.lint.log') as log:
+            check_patterns([redirect(r'^.*old/$', '/new/')])
+
+        self.assertTrue(log.warning.called)
+
+    @override_settings(REDIRECT_URLS_LINT='error', REDIRECT_URLS_LINT_BUDGET=0)
+    @patch('redirect_urls.lint.log')
+    def test_register_refuses(self, log):
+        self.addCleanup(set_redirectpatterns, utils.redirectpatterns)
+        set_redirectpatterns([])
+        with self.assertRaises(ImproperlyConfigured):
+            register(self.patterns)
+
+        self.assertEqual(utils.redirectpatterns, [])
@@ -2,10 +2,19 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
-from django.test import RequestFactory, TestCase
+import sys
+from unittest import skipIf
 
-from redirect_urls.middleware import RedirectsMiddleware
-from redirect_urls.utils import get_resolver, redirect
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from mock import patch
+
+from redirect_urls.database import database_redirects
+from redirect_urls.middleware import RedirectsMiddleware, acall
+from redirect_urls.models import Redirect
+from redirect_urls.stats import RedirectStats
+from redirect_urls.utils import get_resolver, redirect, redirectpatterns, register
 
 
 patterns = [
@@ -27,3 +36,140 @@ class TestRedirectsMiddleware(TestCase):
     def test_no_redirect_match(self):
         resp = middleware(self.rf.get('/donnie/out/element/'))
         self.assertIsNone(resp)
+
+    @skipIf(acall is not None, 'the async code is only left out before Python 3.5')
+    def test_without_async_support(self):
+        self.assertNotIn('redirect_urls.asgi', sys.modules)
+        middleware = RedirectsMiddleware(lambda request: HttpResponse('abides'),
+                                         resolver=get_resolver(patterns))
+        self.assertFalse(middleware.async_mode)
+        self.assertEqual(middleware(self.rf.get('/dude/')).content, b'abides')
+        self.assertEqual(middleware(self.rf.get('/dude/already/10th/')).status_code, 301)
+
+
+class TestMissCache(TestCase):
+    def setUp(self):
+        self.rf = RequestFactory()
+        self.patterns = list(patterns)
+        self.middleware = RedirectsMiddleware(resolver=get_resolver(self.patterns),
+                                              miss_cache_size=2)
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(middleware.miss_cache)
+
+    @override_settings(REDIRECT_URLS_MISS_CACHE_SIZE=10)
+    def test_size_setting(self):
+        middleware = RedirectsMiddleware(resolver=get_resolver(patterns))
+        self.assertEqual(middleware.miss_cache.maxsize, 10)
+
+    def test_caches_misses(self):
+        self.assertIsNone(self.middleware(self.rf.get('/donnie/out/element/')))
+        self.assertIsNone(self.middleware(self.rf.get('/donnie/out/element/')))
+        resp = self.middleware(self.rf.get('/walter/prior/restraint/'))
+        self.assertEqual(resp.status_code, 301)
+        self.assertEqual(self.middleware.miss_cache.stats(), {
+            'size': 1,
+            'maxsize': 2,
+            'hits': 1,
+            'misses': 2,
+            'evictions': 0,
+        })
+
+    def test_cleared_on_register(self):
+        self.assertIsNone(self.middleware(self.rf.get('/donnie/out/element/')))
+        pattern = redirect(r'^donnie/out/element/', '/shut/up/')
+        self.patterns.append(pattern)
+        self.addCleanup(redirectpatterns.remove, pattern)
+        register([pattern])
+        self.assertEqual(len(self.middleware.miss_cache), 0)
+        resp = self.middleware(self.rf.get('/donnie/out/element/'))
+        self.assertEqual(resp.status_code, 301)
+        self.assertEqual(resp['location'], '/shut/up/')
+
+
+@override_settings(REDIRECT_URLS_REORDER_INTERVAL=0)
+class TestReorder(TestCase):
+    def setUp(self):
+        self.rf = RequestFactory()
+
+    def test_reorders_with_stats(self):
+        resolver = get_resolver(patterns, hot_size=4)
+        middleware = RedirectsMiddleware(resolver=resolver, stats=RedirectStats())
+        resp = middleware(self.rf.get('/walter/prior/restraint/'))
+        self.assertEqual(resp.status_code, 301)
+        middleware.reorder_thread.join()
+        self.assertEqual([i for i, _ in resolver.index.hot.entries], [1])
+        resp = middleware(self.rf.get('/walter/prior/restraint/'))
+        self.assertEqual(resp['location'], '/finishes/coffee/')
+
+    def test_needs_hot_size(self):
+        middleware = RedirectsMiddleware(resolver=get_resolver(patterns), stats=RedirectStats())
+        middleware(self.rf.get('/walter/prior/restraint/'))
+        self.assertIsNone(middleware.reorder_thread)
+
+
+try:
+    from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+except ImportError:
+    sync_to_async = None
+
+
+@skipIf(acall is None or sync_to_async is None, 'needs Python 3.5+ and asgiref')
+class TestAsync(TestCase):
+    def setUp(self):
+        self.rf = RequestFactory()
+        self.requests = []
+
+        def get_response(request):
+            self.requests.append(request)
+            return HttpResponse('abides')
+
+        # what Django 3.1+ passes under ASGI
+        self.get_response = sync_to_async(get_response)
+
+    def call(self, middleware, request):
+        return async_to_sync(middleware)(request)
+
+    def test_async_mode(self):
+        middleware = RedirectsMiddleware(self.get_response, resolver=get_resolver(patterns))
+        self.assertTrue(middleware.async_mode)
+        self.assertTrue(iscoroutinefunction(middleware))
+        middleware = RedirectsMiddleware(lambda request: None, resolver=get_resolver(patterns))
+        self.assertFalse(middleware.async_mode)
+        self.assertFalse(iscoroutinefunction(middleware))
+
+    def test_redirects_in_loop(self):
+        middleware = RedirectsMiddleware(self.get_response, resolver=get_resolver(patterns))
+        resp = self.call(middleware, self.rf.get('/walter/prior/restraint/'))
+        self.assertEqual(resp.status_code, 301)
+        self.assertEqual(resp['location'], '/finishes/coffee/')
+        self.assertEqual(self.requests, [])
+
+    def test_awaits_get_response(self):
+        middleware = RedirectsMiddleware(self.get_response, resolver=get_resolver(patterns))
+        request = self.rf.get('/donnie/out/element/')
+        resp = self.call(middleware, request)
+        self.assertEqual(resp.content, b'abides')
+        self.assertEqual(self.requests, [request])
+
+    def test_database_checked_in_thread_pool(self):
+        Redirect.objects.create(pattern='^dude/$', to='/abides/')
+        source = database_redirects()
+        middleware = RedirectsMiddleware(self.get_response, resolver=get_resolver([source]))
+        with patch('redirect_urls.asgi.sync_to_async', wraps=sync_to_async) as wrapper:
+            resp = self.call(middleware, self.rf.get('/dude/'))
+            self.assertEqual(resp['location'], '/abides/')
+            wrapper.assert_called_once_with(source.refresh)
+            # not again until the next interval
+            self.call(middleware, self.rf.get('/dude/'))
+            self.assertEqual(wrapper.call_count, 1)
+
+    def test_stats(self):
+        stats = RedirectStats()
+        middleware = RedirectsMiddleware(self.get_response, resolver=get_resolver(patterns),
+                                         stats=stats)
+        resp = self.call(middleware, self.rf.get('/walter/prior/restraint/'))
+        self.assertEqual(resp.status_code, 301)
+        resp = self.call(middleware, self.rf.get('/donnie/out/element/'))
+        self.assertEqual(resp.content, b'abides')
+        self.assertEqual(sorted(s['hits'] for s in stats.snapshot()), [1, 1])
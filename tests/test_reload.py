@@ -0,0 +1,199 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from importlib import import_module
+from unittest import skipUnless
+
+from django.test import RequestFactory, TestCase, override_settings
+
+from mock import patch
+
+from redirect_urls import utils
+from redirect_urls.middleware import RedirectsMiddleware
+from redirect_urls.reload import RedirectsReloader
+from redirect_urls.utils import redirect, set_redirectpatterns
+from redirect_urls.wsgi import RedirectsApplication
+
+
+MODULE = '''
+from redirect_urls import redirect
+
+redirectpatterns = [
+    redirect(r'^dude/$', '{}'),
+]
+'''
+
+
+class TestRedirectsReloader(TestCase):
+    def setUp(self):
+        self.rf = RequestFactory()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        sys.path.insert(0, self.directory)
+        self.addCleanup(sys.path.remove, self.directory)
+        self.addCleanup(sys.modules.pop, 'reloaded_redirects', None)
+        self.filename = os.path.join(self.directory, 'reloaded_redirects.py')
+        self.write('/far/out/')
+        self.module = import_module('reloaded_redirects')
+
+        # other patterns in the registry stay where they are
+        self.other = redirect(r'^walter/$', '/shomer/shabbos/')
+        self.addCleanup(set_redirectpatterns, utils.redirectpatterns)
+        set_redirectpatterns(self.module.redirectpatterns + [self.other])
+        self.reloader = RedirectsReloader([self.module], 60)
+        self.middleware = RedirectsMiddleware(miss_cache_size=10)
+
+    def write(self, destination, source=MODULE):
+        with open(self.filename, 'w') as fp:
+            fp.write(source.format(destination))
+
+        # mtimes of quick successive writes can be the same
+        mtime = time.time() + len(destination)
+        os.utime(self.filename, (mtime, mtime))
+
+    def location(self, path):
+        return self.middleware(self.rf.get(path))['Location']
+
+    def test_reloads_changed_modules(self):
+        self.assertFalse(self.reloader.check())
+        self.assertEqual(self.location('/dude/'), '/far/out/')
+        old_resolver = self.middleware.resolver
+
+        self.write('/abides/')
+        self.assertTrue(self.reloader.check())
+        self.assertIsNot(self.middleware.resolver, old_resolver)
+        self.assertEqual(self.location('/dude/'), '/abides/')
+        self.assertEqual(utils.redirectpatterns[1:], [self.other])
+        # the old resolver keeps serving the old patterns
+        self.assertEqual(old_resolver.resolve('/dude/').func(self.rf.get('/'))['Location'],
+                         '/far/out/')
+
+        self.assertFalse(self.reloader.check())
+
+    def test_new_resolver_is_built_before_swap(self):
+        self.write('/abides/')
+        with patch('redirect_urls.resolvers.PatternIndex') as PatternIndex:
+            self.reloader.check()
+
+        self.assertTrue(PatternIndex.called)
+        self.assertIs(self.middleware.resolver._index, PatternIndex.return_value)
+
+    def test_replaces_miss_cache(self):
+        self.assertIsNone(self.middleware(self.rf.get('/donnie/')))
+        self.write('/abides/', MODULE + "redirectpatterns.append(redirect(r'^donnie/$', '/in/'))")
+        self.reloader.check()
+        self.assertEqual(self.location('/donnie/'), '/in/')
+
+    @override_settings(REDIRECT_URLS_COLLAPSE_CHAINS=True)
+    def test_collapses_chains(self):
+        self.write('/walter/')
+        self.reloader.check()
+        self.assertEqual(self.location('/dude/'), '/shomer/shabbos/')
+
+    def test_keeps_patterns_when_broken(self):
+        self.write('/abides/', 'this is not python')
+        with patch('redirect_urls.reload.log') as log:
+            self.assertFalse(self.reloader.check())
+
+        self.assertTrue(log.exception.called)
+        self.assertEqual(self.location('/dude/'), '/far/out/')
+        # not tried again until it changes
+        self.assertFalse(self.reloader.check())
+        self.write('/right/man/')
+        self.assertTrue(self.reloader.check())
+        self.assertEqual(self.location('/dude/'), '/right/man/')
+
+    def test_applies_other_modules_when_one_is_broken(self):
+        filename = os.path.join(self.directory, 'other_redirects.py')
+        with open(filename, 'w') as fp:
+            fp.write(MODULE.replace('dude', 'walter').format('/shomer/shabbos/'))
+        self.addCleanup(sys.modules.pop, 'other_redirects', None)
+        other = import_module('other_redirects')
+        set_redirectpatterns(self.module.redirectpatterns + other.redirectpatterns)
+        # the broken module comes first
+        reloader = RedirectsReloader([self.module, other], 60)
+
+        self.write('/abides/', 'this is not python')
+        with open(filename, 'w') as fp:
+            fp.write(MODULE.replace('dude', 'walter').format('/vietnam/'))
+        mtime = time.time() + 10
+        os.utime(filename, (mtime, mtime))
+        with patch('redirect_urls.reload.log'):
+            self.assertTrue(reloader.check())
+
+        self.assertEqual(self.location('/walter/'), '/vietnam/')
+        self.assertEqual(self.location('/dude/'), '/far/out/')
+        self.assertFalse(reloader.check())
+        self.write('/right/man/')
+        self.assertTrue(reloader.check())
+        self.assertEqual(self.location('/dude/'), '/right/man/')
+        self.assertEqual(self.location('/walter/'), '/vietnam/')
+
+    @override_settings(REDIRECT_URLS_LINT='error', REDIRECT_URLS_LINT_BUDGET=0)
+    @patch('redirect_urls.lint.log')
+    def test_keeps_patterns_when_too_slow(self, lint_log):
+        self.write('/abides/', MODULE.replace(r'^dude/$', r'^(\w+)+$'))
+        with patch('redirect_urls.reload.log') as log:
+            self.assertFalse(self.reloader.check())
+
+        self.assertTrue(log.exception.called)
+        self.assertEqual(self.location('/dude/'), '/far/out/')
+
+    def test_wsgi_application(self):
+        application = RedirectsApplication(lambda environ, start_response: [])
+        self.write('/abides/')
+        self.reloader.check()
+        self.assertIs(application.resolver.url_patterns, self.middleware.resolver.url_patterns)
+
+    def test_given_resolvers_are_kept(self):
+        resolver = utils.get_resolver([self.other])
+        middleware = RedirectsMiddleware(resolver=resolver)
+        self.write('/abides/')
+        self.reloader.check()
+        self.assertIs(middleware.resolver, resolver)
+
+    def test_thread(self):
+        self.reloader.interval = 0.01
+        self.reloader.start()
+        self.addCleanup(self.reloader.stop)
+        self.write('/abides/')
+        for _ in range(500):
+            if self.location('/dude/') == '/abides/':
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(self.location('/dude/'), '/abides/')
+        self.reloader.stop()
+        self.reloader.thread.join()
+
+    def test_after_fork_keeps_running_thread(self):
+        self.reloader.start()
+        self.addCleanup(self.reloader.stop)
+        thread = self.reloader.thread
+        self.reloader.after_fork()
+        self.assertIs(self.reloader.thread, thread)
+
+    @skipUnless(hasattr(os, 'register_at_fork'), 'needs Python 3.7+')
+    def test_thread_in_forked_process(self):
+        self.reloader.start()
+        self.addCleanup(self.reloader.stop)
+        read, write = os.pipe()
+        pid = os.fork()
+        if not pid:
+            alive = False
+            try:
+                alive = self.reloader.thread.is_alive()
+            finally:
+                os.write(write, b'1' if alive else b'0')
+                os._exit(0)
+
+        os.waitpid(pid, 0)
+        os.close(write)
+        self.assertEqual(os.read(read, 1), b'1')
+        os.close(read)
@@ -0,0 +1,351 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import sys
+
+from django.test import TestCase
+from django.urls import Resolver404
+
+from mock import patch
+
+from redirect_urls.resolvers import (URLResolver, exact_path, first_segment, pattern_regex,
+                                     regex_literal, regex_prefix, resolver_pattern,
+                                     segment_prefix, uncaptured_regex)
+from redirect_urls.utils import LOCALE_RE, get_resolver, gone, no_redirect, redirect
+
+
+def django_resolver(patterns):
+    return URLResolver(resolver_pattern(r'^/'), patterns)
+
+
+def resolve_or_none(resolver, path):
+    try:
+        match = resolver.resolve(path)
+    except Resolver404:
+        return None
+
+    return match.func, match.args, match.kwargs
+
+
+class TestExactPath(TestCase):
+    def test_regex_literal(self):
+        self.assertEqual(regex_literal(r'firefox/os/'), 'firefox/os/')
+        self.assertEqual(regex_literal(r'firefox/os\.html'), 'firefox/os.html')
+        self.assertEqual(regex_literal(r'firefox\-os/'), 'firefox-os/')
+        self.assertIsNone(regex_literal(r'firefox/os.html'))
+        self.assertIsNone(regex_literal(r'firefox/\d+/'))
+        self.assertIsNone(regex_literal(r'firefox/(os)/'))
+        self.assertIsNone(regex_literal(r'firefox/os/?'))
+        self.assertIsNone(regex_literal('firefox\\'))
+
+    def test_exact_path(self):
+        self.assertEqual(exact_path(LOCALE_RE + r'firefox/os/$'), (True, 'firefox/os/'))
+        self.assertEqual(exact_path(r'^firefox/os/$'), (False, 'firefox/os/'))
+        # prefix matches
+        self.assertIsNone(exact_path(LOCALE_RE + r'firefox/os/'))
+        self.assertIsNone(exact_path(r'^firefox/os/\$'))
+        # unanchored
+        self.assertIsNone(exact_path(r'firefox/os/$'))
+        # flags
+        self.assertIsNone(exact_path(r'(?i)' + LOCALE_RE + r'firefox/os/$'))
+
+    def test_redirect_patterns(self):
+        pattern = redirect(r'^firefox/os/$', '/firefox/')
+        self.assertEqual(exact_path(pattern_regex(pattern)), (True, 'firefox/os/'))
+        pattern = redirect(r'^firefox/os/$', '/firefox/', locale_prefix=False)
+        self.assertEqual(exact_path(pattern_regex(pattern)), (False, 'firefox/os/'))
+        pattern = redirect(r'^firefox/os/$', '/firefox/', re_flags='i')
+        self.assertIsNone(exact_path(pattern_regex(pattern)))
+
+
+class TestFirstSegment(TestCase):
+    def test_regex_prefix(self):
+        self.assertEqual(regex_prefix(r'firefox/(?P<page>.*)$'), 'firefox/')
+        self.assertEqual(regex_prefix(r'firefox\.html'), 'firefox.html')
+        self.assertEqual(regex_prefix(r'firefox/?'), 'firefox')
+        self.assertEqual(regex_prefix(r'firefox\d+/'), 'firefox')
+        self.assertEqual(regex_prefix(r'(?:firefox)/'), '')
+
+    def test_first_segment(self):
+        self.assertEqual(first_segment(LOCALE_RE + r'firefox/(?P<page>.*)$'), 'firefox')
+        self.assertEqual(first_segment(r'^firefox/os/.*$'), 'firefox')
+        self.assertEqual(first_segment(r'^firefox/$'), 'firefox')
+        self.assertIsNone(first_segment(r'^firefox$'))
+        self.assertIsNone(first_segment(r'^firefox/?$'))
+        self.assertIsNone(first_segment(r'^fire(fox|bird)/$'))
+        self.assertIsNone(first_segment(r'^firefox/$|thunderbird/$'))
+        self.assertIsNone(first_segment(r'firefox/$'))
+        self.assertIsNone(first_segment(r'(?i)^firefox/$'))
+
+    def test_segment_prefix(self):
+        self.assertEqual(segment_prefix(LOCALE_RE + r'firefox/(?P<page>.*)$'), 'firefox/')
+        self.assertEqual(segment_prefix(r'^firefox/new/\d+/$'), 'firefox/new/')
+        self.assertEqual(segment_prefix(r'^firefox/?$'), 'firefox')
+        self.assertEqual(segment_prefix(r'^de-DEx'), 'de-DEx')
+        # could be or start a locale prefix
+        self.assertIsNone(segment_prefix(r'^de/firefox/$'))
+        self.assertIsNone(segment_prefix(r'^en-US/firefox/$'))
+        self.assertIsNone(segment_prefix(r'^fir(?P<x>.*)$'))
+        self.assertIsNone(segment_prefix(r'^de-D'))
+        self.assertIsNone(segment_prefix(r'^(?P<x>\w+)/$'))
+        self.assertIsNone(segment_prefix(r'^firefox/$|de/$'))
+        self.assertIsNone(segment_prefix(r'(?i)^firefox/$'))
+
+
+class TestUncapturedRegex(TestCase):
+    def test_groups_not_captured(self):
+        self.assertEqual(uncaptured_regex(LOCALE_RE + r'iam/the/(?P<name>\w+)/(.*)$'),
+                         r'^(?:\w{2,3}(?:-\w{2})?/)?iam/the/(?:\w+)/(?:.*)$')
+        self.assertEqual(uncaptured_regex(r'^iam/(?:the|a)/(?=w)(?!e)walrus$'),
+                         r'^iam/(?:the|a)/(?=w)(?!e)walrus$')
+        if sys.version_info >= (3, 6):
+            # scoped flags
+            self.assertEqual(uncaptured_regex(r'^iam/(?i:walrus)$'), r'^iam/(?i:walrus)$')
+        self.assertEqual(uncaptured_regex(r'^iam/[(\]]+/$'), r'^iam/[(\]]+/$')
+        self.assertEqual(uncaptured_regex(r'^iam/[]()]+/$'), r'^iam/[]()]+/$')
+
+    def test_not_combinable(self):
+        self.assertIsNone(uncaptured_regex(r'iam/the/walrus/$'))
+        self.assertIsNone(uncaptured_regex(r'(?i)^iam/the/walrus/$'))
+        self.assertIsNone(uncaptured_regex(r'^iam/(?P<x>the)/(?P=x)/$'))
+        self.assertIsNone(uncaptured_regex(r'^iam/(the)/\1/$'))
+        self.assertIsNone(uncaptured_regex(r'^iam/the/walrus/$|eggman/'))
+        self.assertIsNone(uncaptured_regex(r'^iam/(the/walrus/$'))
+
+
+class TestRedirectResolver(TestCase):
+    def setUp(self):
+        self.patterns = [
+            redirect(r'^iam/the/walrus/$', '/coo/coo/'),
+            no_redirect(r'^iam/the/eggman/$'),
+            redirect(r'^iam/the/(?P<name>[\w-]+)/$', '/donnie/{name}/'),
+            redirect(r'^iam/the/walrus/$', '/never/'),
+            redirect(r'^iam/the/ape-man/$', '/never/'),
+            redirect(r'^en-US/fake/$', '/plain/', locale_prefix=False),
+            redirect(r'^fake/$', '/locale/'),
+            redirect(r'^abide/$', '/abides/', re_flags='i'),
+            redirect(r'^abide/$', '/never/'),
+            redirect(r'^dude/$', '/dude/', locale_prefix=False),
+            gone(r'^gone/$'),
+        ]
+        self.paths = [
+            '/iam/the/walrus/',
+            '/de/iam/the/walrus/',
+            '/iam/the/eggman/',
+            '/pt-BR/iam/the/eggman/',
+            '/iam/the/ape-man/',
+            '/en-US/fake/',
+            '/fr/fake/',
+            '/fake/',
+            '/ABIDE/',
+            '/abide/',
+            '/dude/',
+            '/de/dude/',
+            '/gone/',
+            '/gone/\n',
+            '/iam/the/walrus/\n',
+            '/nothing/here/',
+            'no/slash/',
+        ]
+
+    def test_same_matches_as_django(self):
+        """Should resolve every path to the same match as the regular resolver."""
+        expected = django_resolver(self.patterns)
+        resolver = get_resolver(self.patterns)
+        for path in self.paths:
+            self.assertEqual(resolve_or_none(resolver, path),
+                             resolve_or_none(expected, path), path)
+
+    def extra_patterns(self):
+        return self.patterns + [
+            redirect(r'^iam/the/(walrus|eggman)/(?P<rest>.*)$', '/{rest}'),
+            redirect(r'iam/unanchored/$', '/anywhere/', locale_prefix=False),
+            redirect(r'^(?P<page>nothing/.*)$', '/{page}'),
+            redirect(r'^nothing/here/$', '/never/', locale_prefix=False),
+            redirect(r'^(?<=de/)iam/(?P<name>\w+)/$', '/german/{name}/'),
+            no_redirect(r'^(?P<walrus>w)alrus/(?P=walrus)/$'),
+            redirect(r'^walrus/(?P<rest>.*)$', '/{rest}'),
+            redirect(r'^iam/a/walrus/$|eggman/$', '/never/'),
+        ]
+
+    def extra_paths(self):
+        return self.paths + [
+            '/iam/the/walrus/and/more/',
+            '/fr/iam/the/eggman/again/',
+            '/some/iam/unanchored/',
+            '/nothing/here/',
+            '/de/iam/deutsch/',
+            '/fr/iam/francais/',
+            '/walrus/w/',
+            '/en-GB/walrus/w/',
+            '/en-GB/walrus/w/x',
+            '/eggman/',
+        ]
+
+    def test_combined_same_matches_as_django(self):
+        """Should resolve every path the same with combined regexes of any size."""
+        patterns = self.extra_patterns()
+        expected = django_resolver(patterns)
+        for chunk_size in (1, 2, 3, 100):
+            resolver = get_resolver(patterns, combined=True, chunk_size=chunk_size)
+            for path in self.extra_paths():
+                self.assertEqual(resolve_or_none(resolver, path),
+                                 resolve_or_none(expected, path), (chunk_size, path))
+
+    def test_locale_dispatch_same_matches_as_django(self):
+        """Should resolve every path the same when locales are matched once."""
+        patterns = self.extra_patterns()
+        expected = django_resolver(patterns)
+        for combined in (False, True):
+            resolver = get_resolver(patterns, combined=combined, chunk_size=2,
+                                    locale_dispatch=True)
+            for path in self.extra_paths():
+                self.assertEqual(resolve_or_none(resolver, path),
+                                 resolve_or_none(expected, path), (combined, path))
+
+    def test_sharded_same_matches_as_django(self):
+        """Should resolve every path the same when patterns are sharded."""
+        patterns = self.extra_patterns()
+        expected = django_resolver(patterns)
+        for options in [{}, {'combined': True}, {'combined': True, 'locale_dispatch': True}]:
+            resolver = get_resolver(patterns, sharded=True, chunk_size=2, **options)
+            for path in self.extra_paths():
+                self.assertEqual(resolve_or_none(resolver, path),
+                                 resolve_or_none(expected, path), (options, path))
+
+    def test_combined_unicode_classes(self):
+        """Should match \\w against non-ASCII paths however patterns are grouped."""
+        patterns = [redirect(r'^caf(?P<e>\w)/$', '/coffee/')]
+        for options in [{'combined': True}, {'locale_dispatch': True},
+                        {'combined': True, 'locale_dispatch': True}]:
+            resolver = get_resolver(patterns, chunk_size=2, **options)
+            for path in (u'/caf\xe9/', u'/fr/caf\xe9/'):
+                self.assertIsNotNone(resolve_or_none(resolver, path), (options, path))
+
+    def test_shards(self):
+        resolver = get_resolver(self.extra_patterns(), sharded=True)
+        index = resolver.index
+        self.assertEqual(sorted(index.shards), ['iam', 'walrus'])
+        self.assertEqual([i for i, _ in index.shards['iam'][0].entries], [2, 11])
+        self.assertEqual([i for i, _ in index.shards['walrus'][0].entries], [17])
+        self.assertEqual([i for i, _ in index.lanes[0].entries], [7, 12, 13, 15, 16, 18])
+        self.assertEqual(len(index.path_lanes('fr/iam/the/walrus/', 'fr/')), 2)
+        self.assertEqual(len(index.path_lanes('iam/walrus/x', 'iam/')), 3)
+        self.assertEqual(len(index.path_lanes('nothing/here/')), 1)
+
+    def test_combined_lanes(self):
+        resolver = get_resolver(self.patterns, combined=True, chunk_size=2)
+        combined, plain = resolver.index.lanes
+        # the pattern with flags isn't combined
+        self.assertEqual([[i for i, _ in entries] for entries, _ in combined.chunks], [[2]])
+        self.assertEqual([i for i, _ in plain.entries], [7])
+
+    def test_locale_dispatch_lanes(self):
+        patterns = self.patterns + [
+            redirect(r'^iam/(?P<name>\w+)/$', '/{name}/', locale_prefix=False),
+            redirect(r'^(?P<walrus>w)alrus/(?P=walrus)/$', '/walrus/'),
+        ]
+        resolver = get_resolver(patterns, locale_dispatch=True)
+        localized, plain = resolver.index.lanes
+        self.assertTrue(localized.locale)
+        self.assertEqual([i for i, _ in localized.entries], [2])
+        self.assertEqual([i for i, _ in plain.entries], [7, 11, 12])
+
+        resolver = get_resolver(patterns, combined=True, locale_dispatch=True)
+        localized, combined, plain = resolver.index.lanes
+        self.assertEqual(localized.chunks[0][1].regexes, [r'iam/the/(?:[\w-]+)/$'])
+        self.assertEqual([i for i, _ in combined.entries], [11])
+        self.assertEqual([i for i, _ in plain.entries], [7, 12])
+
+    def test_exact_patterns_indexed(self):
+        resolver = get_resolver(self.patterns)
+        index = resolver.index
+        self.assertEqual(index.locale_paths['iam/the/walrus/'], 0)
+        self.assertEqual(index.locale_paths['iam/the/ape-man/'], 4)
+        self.assertEqual(index.paths['en-US/fake/'], 5)
+        self.assertEqual([i for i, _ in index.dynamic], [2, 7])
+
+    def test_earlier_regex_wins(self):
+        """Should not serve an exact path if an earlier regex pattern also matches."""
+        resolver = get_resolver(self.patterns)
+        match = resolver.resolve('/iam/the/ape-man/')
+        self.assertEqual(match.kwargs['name'], 'ape-man')
+        match = resolver.resolve('/es-ES/iam/the/walrus/')
+        self.assertEqual(match.func, self.patterns[0].callback)
+        self.assertEqual(match.kwargs['locale'], 'es-ES/')
+
+    def test_registry_changes(self):
+        """Should pick up patterns added after the resolver was created."""
+        patterns = [redirect(r'^iam/the/walrus/$', '/coo/coo/')]
+        resolver = get_resolver(patterns)
+        with self.assertRaises(Resolver404):
+            resolver.resolve('/iam/the/eggman/')
+
+        patterns.append(redirect(r'^iam/the/eggman/$', '/goo/goo/'))
+        match = resolver.resolve('/iam/the/eggman/')
+        self.assertEqual(match.func, patterns[1].callback)
+
+    def test_warm_compiles_regexes(self):
+        """Should not compile regexes on misses or regex matches after warming up."""
+        resolver = get_resolver(self.extra_patterns())
+        resolver.warm()
+        with patch('django.urls.resolvers.re.compile') as compile:
+            for path in ['/nothing/', '/de/nothing/', '/iam/the/dude/', '/walrus/w/']:
+                resolve_or_none(resolver, path)
+
+        self.assertFalse(compile.called)
+
+    def promotion_patterns(self):
+        return [
+            redirect(r'^firefox/new/(?P<x>\w+)/$', '/new/{x}/'),
+            # could match paths the first one matches
+            redirect(r'^firefox/(?P<page>.*)$', '/ff/{page}'),
+            redirect(r'^fire(?P<x>\w*)/$', '/fire/{x}/'),
+            redirect(r'^thunderbird/$', '/tb/'),
+            redirect(r'^thunderbird/(?P<v>\d+)/$', '/tb/{v}/'),
+            # could match paths with any prefix after a locale
+            redirect(r'^en(?P<x>.*)$', '/en/{x}'),
+            redirect(r'^seamonkey/(?P<v>\d+)/$', '/sm/{v}/'),
+        ]
+
+    def test_promote(self):
+        """Should only promote patterns no earlier pattern can match paths of."""
+        patterns = self.promotion_patterns()
+        resolver = get_resolver(patterns, hot_size=16)
+        resolver.reorder(dict((p, n) for n, p in enumerate(patterns)))
+        self.assertEqual([i for i, _ in resolver.index.hot.entries], [4, 0])
+        resolver = get_resolver(patterns, hot_size=1)
+        resolver.reorder(dict((p, n) for n, p in enumerate(patterns)))
+        self.assertEqual([i for i, _ in resolver.index.hot.entries], [4])
+
+    def test_reorder_off_by_default(self):
+        patterns = self.promotion_patterns()
+        resolver = get_resolver(patterns)
+        resolver.reorder(dict((p, 1) for p in patterns))
+        self.assertIsNone(resolver.index.hot)
+
+    def test_reordered_same_matches_as_django(self):
+        """Should resolve every path the same with the most matched patterns first."""
+        paths = self.extra_paths() + [
+            '/firefox/new/x/',
+            '/de/firefox/new/x/',
+            '/firefox/other/',
+            '/firex/',
+            '/thunderbird/',
+            '/thunderbird/5/',
+            '/fr/thunderbird/5/',
+            '/enx/',
+            '/en/thunderbird/5/',
+            '/seamonkey/2/',
+        ]
+        for patterns in (self.promotion_patterns(), self.extra_patterns(),
+                         self.promotion_patterns() + self.extra_patterns()):
+            expected = django_resolver(patterns)
+            hits = dict((p, n) for n, p in enumerate(reversed(patterns)))
+            for options in [{}, {'combined': True, 'locale_dispatch': True, 'sharded': True}]:
+                resolver = get_resolver(patterns, hot_size=16, **options)
+                resolver.reorder(hits)
+                for path in paths:
+                    self.assertEqual(resolve_or_none(resolver, path),
+                                     resolve_or_none(expected, path), (options, path))
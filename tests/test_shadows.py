@@ -0,0 +1,134 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import re
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from redirect_urls import utils
+from redirect_urls.database import database_redirects
+from redirect_urls.shadows import find_shadows, sample_paths
+from redirect_urls.tables import RedirectTable
+from redirect_urls.utils import gone, no_redirect, redirect, set_redirectpatterns
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class TestSamplePaths(TestCase):
+    def test_paths_match(self):
+        for regex in (utils.LOCALE_RE + r'docs/(?P<page>[\w-]+)/$',
+                      r'(?i)^shout/(dude|walter)+/(\d{2,4})?$',
+                      r'^rug/(?P<x>[^/]+)/(?P=x)/$',
+                      r'^media/.*\.png$'):
+            paths = sample_paths(regex)
+            self.assertGreater(len(paths), 3, regex)
+            for path in paths:
+                self.assertTrue(re.match(regex, path), (regex, path))
+
+    def test_same_every_time(self):
+        self.assertEqual(sample_paths(r'^(\w+)/$'), sample_paths(r'^(\w+)/$'))
+
+
+class TestFindShadows(TestCase):
+    def shadows(self, patterns):
+        return [(f.kind, f.position, f.cover and f.cover[0]) for f in find_shadows(patterns)]
+
+    def test_duplicates(self):
+        self.assertEqual(self.shadows([
+            redirect(r'^dude/$', '/abides/'),
+            gone(r'^walter/(\w+)/$'),
+            redirect(r'^dude/$', '/lebowski/'),
+            redirect(r'^walter/(\w+)/$', '/sobchak/', locale_prefix=False),
+        ]), [('duplicate', 2, 0), ('duplicate', 3, 1)])
+
+    def test_shadowed(self):
+        self.assertEqual(self.shadows([
+            redirect(r'^docs/(?P<page>[\w-]+)/$', '/help/{page}/'),
+            redirect(r'^docs/intro/$', '/never/'),
+            redirect(r'^docs/(?P<page>[a-z]+)/$', '/never/'),
+            redirect(r'^docs/(?P<page>[\w-]+)/(?P<more>.+)$', '/more/'),
+            no_redirect(r'^media/'),
+            redirect(r'^media/logo\.png$', '/img/'),
+            redirect(r'^de/bowling/$', '/bowling/', locale_prefix=False),
+        ]), [('shadowed', 1, 0), ('shadowed', 2, 0), ('shadowed', 5, 4)])
+
+    def test_locale_prefix(self):
+        # only the paths without a locale are shadowed
+        self.assertEqual(self.shadows([
+            redirect(r'^bowling/$', '/alley/', locale_prefix=False),
+            redirect(r'^bowling/$', '/lanes/'),
+        ]), [])
+
+    def test_unneeded_no_redirect(self):
+        self.assertEqual(self.shadows([
+            no_redirect(r'^keep/$'),
+            no_redirect(r'^firefox/(?P<version>\d+)/$'),
+            no_redirect(r'^media/'),
+            redirect(r'^media/logo\.png$', '/img/'),
+            redirect(r'^(?P<page>\w+)/$', '/new/{page}/'),
+            RedirectTable([('firefox/12/', '/old/', 301)]),
+        ]), [('shadowed', 3, 2)])
+        self.assertEqual(self.shadows([
+            no_redirect(r'^keep/$'),
+            no_redirect(r'^firefox/(?P<version>\d+)/$'),
+            redirect(r'^dude/$', '/abides/'),
+        ]), [('unneeded', 0, None), ('unneeded', 1, None)])
+
+    def test_database_redirects(self):
+        self.assertEqual(self.shadows([
+            no_redirect(r'^keep/$'),
+            database_redirects(),
+            redirect(r'^dude/$', '/abides/'),
+        ]), [])
+
+    def test_cost(self):
+        findings = find_shadows([
+            redirect(r'^docs/(?P<page>[\w-]+)/$', '/help/{page}/'),
+            redirect(r'^docs/intro/$', '/never/'),
+            redirect(r'^docs/(?P<page>[a-z]+)/$', '/never/'),
+        ])
+        # exact paths are looked up in a dict
+        self.assertEqual(findings[0].cost, 0)
+        self.assertGreater(findings[1].cost, 0)
+
+
+class TestRedirectShadowsCommand(TestCase):
+    def setUp(self):
+        self.addCleanup(set_redirectpatterns, utils.redirectpatterns)
+        set_redirectpatterns([
+            redirect(r'^dude/(?P<x>.*)$', '/abides/', locale_prefix=False),
+            redirect(r'^dude/walter/$', '/sobchak/', locale_prefix=False),
+            no_redirect(r'^donny/$', locale_prefix=False),
+        ])
+
+    def call(self, *args):
+        out = StringIO()
+        call_command('redirect_shadows', *args, stdout=out)
+        return out.getvalue()
+
+    def test_lines(self):
+        lines = self.call().splitlines()
+        self.assertEqual(lines[0], '#1 ^dude/walter/$  [shadowed by #0 ^dude/(?P<x>.*)$, '
+                                   '0.0 us per request]')
+        self.assertEqual(lines[1], '#2 ^donny/$  [no_redirect that protects nothing, '
+                                   '0.0 us per request]')
+        self.assertTrue(lines[2].startswith('Removing 2 patterns saves about '))
+
+    def test_json(self):
+        findings = json.loads(self.call('--json'))
+        self.assertEqual(findings[0]['cover'], [0, '^dude/(?P<x>.*)$'])
+        self.assertEqual(findings[1]['kind'], 'unneeded')
+
+    def test_fail(self):
+        with self.assertRaises(CommandError):
+            self.call('--fail')
+
+        utils.redirectpatterns[1:] = []
+        self.call('--fail')
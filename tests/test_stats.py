@@ -0,0 +1,226 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils.six import StringIO
+
+from mock import patch
+
+from redirect_urls.database import database_redirects
+from redirect_urls.middleware import RedirectsMiddleware
+from redirect_urls.models import Redirect
+from redirect_urls.resolvers import URLResolver, resolver_pattern
+from redirect_urls.stats import MISS, RedirectStats, load_stats
+from redirect_urls.tables import RedirectTable
+from redirect_urls.utils import LOCALE_RE, gone, get_resolver, redirect
+
+
+patterns = [
+    redirect(r'^dude/already/10th/', '/far/out/'),
+    redirect(r'^walter/prior/restraint/', '/finishes/coffee/'),
+    gone(r'^donnie/.*$'),
+]
+
+
+class TestRedirectStats(TestCase):
+    def test_record(self):
+        stats = RedirectStats()
+        stats.record('dude', 0.5, 1.0)
+        stats.record('dude', 0.25, 1.0)
+        stats.record(MISS, 0.25)
+        self.assertEqual(stats.snapshot(), [
+            {'pattern': 'dude', 'hits': 2, 'resolve_time': 0.75, 'view_time': 2.0},
+            {'pattern': MISS, 'hits': 1, 'resolve_time': 0.25, 'view_time': 0.0},
+        ])
+
+    def test_count_miss(self):
+        stats = RedirectStats()
+        stats.count_miss()
+        stats.count_miss()
+        self.assertEqual(stats.counts(), {MISS: [2, 0.0, 0.0]})
+
+    def test_labels_patterns_by_regex(self):
+        stats = RedirectStats()
+        stats.record(patterns[0], 0.5, 0.5)
+        self.assertEqual(stats.snapshot()[0]['pattern'], LOCALE_RE + 'dude/already/10th/')
+
+    def test_adds_up_threads(self):
+        """Counts from other threads are included, even after those threads end."""
+        stats = RedirectStats()
+        stats.record('dude', 0.5, 0.5)
+        threads = [threading.Thread(target=stats.record, args=('dude', 0.5, 0.5))
+                   for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(stats.snapshot()[0]['hits'], 4)
+        # ended threads are only merged once
+        self.assertEqual(stats.snapshot()[0]['hits'], 4)
+        self.assertEqual(len(stats._threads), 1)
+
+    def test_reset(self):
+        stats = RedirectStats()
+        stats.record('dude', 0.5, 0.5)
+        thread = threading.Thread(target=stats.record, args=('walter', 0.5, 0.5))
+        thread.start()
+        thread.join()
+        stats.reset()
+        self.assertEqual(stats.snapshot(), [])
+        stats.record('dude', 0.5, 0.5)
+        self.assertEqual(stats.snapshot()[0]['hits'], 1)
+
+
+class StatsDirMixin(object):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+class TestPublish(StatsDirMixin, TestCase):
+    def test_publish_and_load(self):
+        stats = RedirectStats(self.directory)
+        stats.record('dude', 0.5, 0.5)
+        stats.publish()
+        stats.record('dude', 0.5, 0.5)
+        stats.publish()
+        # another process
+        with open(os.path.join(self.directory, 'redirect-stats-1.json'), 'w') as fp:
+            json.dump({'dude': [1, 0.5, 0.5], 'walter': [3, 1.0, 1.0]}, fp)
+
+        self.assertEqual(load_stats(self.directory), [
+            {'pattern': 'dude', 'hits': 3, 'resolve_time': 1.5, 'view_time': 1.5},
+            {'pattern': 'walter', 'hits': 3, 'resolve_time': 1.0, 'view_time': 1.0},
+        ])
+
+    def test_publish_interval(self):
+        stats = RedirectStats(self.directory, interval=0)
+        middleware = RedirectsMiddleware(resolver=get_resolver(patterns), stats=stats)
+        middleware(RequestFactory().get('/walter/prior/restraint/'))
+        self.assertEqual(load_stats(self.directory)[0]['hits'], 1)
+
+    def test_publish_errors_are_logged(self):
+        stats = RedirectStats(os.path.join(self.directory, 'nope'))
+        stats.record('dude', 0.5, 0.5)
+        with patch('redirect_urls.stats.log') as log:
+            stats.publish()
+
+        self.assertTrue(log.exception.called)
+
+
+class TestMiddlewareStats(TestCase):
+    def setUp(self):
+        self.rf = RequestFactory()
+        self.stats = RedirectStats()
+        self.middleware = RedirectsMiddleware(resolver=get_resolver(patterns), stats=self.stats)
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(RedirectsMiddleware(resolver=get_resolver(patterns)).stats)
+
+    @override_settings(REDIRECT_URLS_STATS=True)
+    @patch('redirect_urls.stats._stats', None)
+    def test_setting(self):
+        self.assertIsInstance(RedirectsMiddleware(resolver=get_resolver(patterns)).stats,
+                              RedirectStats)
+
+    def test_records_hits_and_misses(self):
+        resp = self.middleware(self.rf.get('/walter/prior/restraint/'))
+        self.assertEqual(resp.status_code, 301)
+        self.middleware(self.rf.get('/de/walter/prior/restraint/'))
+        self.middleware(self.rf.get('/donnie/out/of/element/'))
+        self.assertIsNone(self.middleware(self.rf.get('/the/dude/')))
+
+        stats = self.stats.snapshot()
+        self.assertEqual([(s['pattern'], s['hits']) for s in stats], [
+            (LOCALE_RE + 'walter/prior/restraint/', 2),
+            (MISS, 1),
+            ('^donnie/.*$', 1),
+        ])
+        self.assertTrue(stats[0]['resolve_time'] > 0)
+        self.assertTrue(stats[2]['resolve_time'] > 0)
+        # misses are only counted
+        self.assertEqual(stats[1]['resolve_time'], 0.0)
+        self.assertEqual(stats[1]['view_time'], 0.0)
+
+    def test_django_resolver(self):
+        """Patterns matched by other resolvers are recorded by route or view."""
+        resolver = URLResolver(resolver_pattern(r'^/'), patterns)
+        middleware = RedirectsMiddleware(resolver=resolver, stats=self.stats)
+        middleware(self.rf.get('/donnie/out/of/element/'))
+        self.assertEqual(self.stats.snapshot()[0]['hits'], 1)
+
+
+class TestStatsCommand(StatsDirMixin, TestCase):
+    def setUp(self):
+        super(TestStatsCommand, self).setUp()
+        with open(os.path.join(self.directory, 'redirect-stats-1.json'), 'w') as fp:
+            json.dump({
+                'dude': [1, 0.5, 0.5],
+                'walter': [3, 0.001, 0.002],
+                MISS: [10, 0.01, 0.0],
+            }, fp)
+
+    def call(self, *args):
+        out = StringIO()
+        call_command('redirect_stats', '--dir', self.directory, *args, stdout=out)
+        return out.getvalue()
+
+    def test_requires_dir(self):
+        with self.assertRaises(CommandError):
+            call_command('redirect_stats')
+
+    def test_table(self):
+        lines = self.call().splitlines()
+        self.assertEqual(lines[0].split(), ['rank', 'hits', 'resolve', 'ms', 'avg', 'resolve',
+                                            'us', 'view', 'ms', 'avg', 'view', 'us',
+                                            'pattern'])
+        self.assertEqual(lines[1].split(), ['1', '10', '10.0', '1000.0', '0.0', MISS])
+        self.assertEqual(lines[2].split(), ['2', '3', '1.0', '333.3', '2.0', '666.7',
+                                            'walter'])
+        self.assertEqual(len(lines), 4)
+
+    def test_order_and_limit(self):
+        stats = json.loads(self.call('--order', 'view', '--limit', '1', '--json'))
+        self.assertEqual([s['pattern'] for s in stats], ['dude'])
+
+    @patch('redirect_urls.utils.redirectpatterns', patterns)
+    def test_dead(self):
+        stats = json.loads(self.call('--dead', '--json'))
+
+        self.assertEqual([s['pattern'] for s in stats[3:]], [
+            LOCALE_RE + 'dude/already/10th/',
+            LOCALE_RE + 'walter/prior/restraint/',
+            '^donnie/.*$',
+        ])
+        self.assertEqual(stats[3]['hits'], 0)
+
+    def test_dead_rows(self):
+        table = RedirectTable([('/dude/', '/abides/', 301), ('/walter/', '/bowling/', 301)],
+                              locale_prefix=False)
+        Redirect.objects.create(pattern='^maude/$', to='/art/')
+        Redirect.objects.create(pattern='^jackie/$', to='/treehorn/')
+        with open(os.path.join(self.directory, 'redirect-stats-2.json'), 'w') as fp:
+            json.dump({table.row_regex(0): [2, 0.1, 0.1],
+                       LOCALE_RE + 'maude/$': [1, 0.1, 0.1]}, fp)
+
+        with patch('redirect_urls.utils.redirectpatterns', [table, database_redirects()]):
+            stats = json.loads(self.call('--dead', '--json'))
+
+        self.assertEqual([s['pattern'] for s in stats if not s['hits']],
+                         [table.row_regex(1), LOCALE_RE + 'jackie/$'])
+
+    def test_reset(self):
+        self.call('--reset')
+        self.assertEqual(os.listdir(self.directory), [])
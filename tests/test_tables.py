@@ -0,0 +1,189 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import RequestFactory, TestCase
+
+from mock import patch
+
+from redirect_urls import utils
+from redirect_urls.middleware import RedirectsMiddleware
+from redirect_urls.reload import RedirectsReloader
+from redirect_urls.stats import RedirectStats
+from redirect_urls.tables import RedirectTable, redirect_table
+from redirect_urls.utils import LOCALE_RE, get_resolver, redirect, set_redirectpatterns
+
+
+CSV = '''path,to,status
+# the dude
+/dude/,/abides/
+/walter/,/shomer/shabbos/,302
+/donnie/,,410
+/dude/,/not/this/one/
+'''
+
+
+class TableMixin(object):
+    def setUp(self):
+        self.rf = RequestFactory()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w') as fp:
+            fp.write(content)
+
+        return filename
+
+
+class TestLoad(TableMixin, TestCase):
+    def test_csv(self):
+        table = redirect_table(self.write('redirects.csv', CSV))
+        self.assertEqual(len(table), 3)
+        self.assertEqual(table.paths, {'dude/': 0, 'walter/': 1, 'donnie/': 2})
+        self.assertEqual(table.destinations, ['/abides/', '/shomer/shabbos/', ''])
+        self.assertEqual(list(table.statuses), [301, 302, 410])
+
+    def test_json(self):
+        table = redirect_table(self.write('redirects.json', json.dumps([
+            {'path': '/dude/', 'to': '/abides/'},
+            ['/walter/', '/shomer/shabbos/', 302],
+            ['/donnie/', None, 410],
+        ])))
+        self.assertEqual(table.destinations, ['/abides/', '/shomer/shabbos/', ''])
+        self.assertEqual(list(table.statuses), [301, 302, 410])
+
+    def test_errors(self):
+        for content in ('/dude/\n', '/dude/,/abides/,200\n', '/dude/,/abides/,perm\n'):
+            with self.assertRaises(ImproperlyConfigured) as cm:
+                redirect_table(self.write('redirects.csv', '/walter/,/bowling/\n' + content))
+
+            self.assertIn('entry 2', str(cm.exception))
+
+        with self.assertRaises(ImproperlyConfigured):
+            redirect_table(self.write('redirects.json', '{nope'))
+
+        for row in ({'path': 1, 'to': '/abides/'}, ['/dude/', ['/abides/']], '/dude/', 10):
+            content = json.dumps([['/walter/', '/bowling/'], row])
+            with self.assertRaises(ImproperlyConfigured) as cm:
+                redirect_table(self.write('redirects.json', content))
+
+            self.assertIn('entry 2', str(cm.exception))
+
+    def test_encoding(self):
+        filename = os.path.join(self.directory, 'redirects.csv')
+        with io.open(filename, 'w', encoding='utf-8', newline='') as fp:
+            fp.write(u'/caf\xe9/,/cafe/\r\n/dude/,/abides/\r\n')
+
+        table = redirect_table(filename)
+        self.assertEqual(table.row_paths, [u'caf\xe9/', 'dude/'])
+        self.assertEqual(table.destinations, ['/cafe/', '/abides/'])
+
+
+class TestRedirectTable(TableMixin, TestCase):
+    def setUp(self):
+        super(TestRedirectTable, self).setUp()
+        self.table = redirect_table(self.write('redirects.csv', CSV))
+        self.patterns = [
+            redirect(r'^walter/$', '/first/'),
+            self.table,
+            redirect(r'^dude/$', '/too/late/'),
+            redirect(r'^jackie/.*$', '/treehorn/'),
+        ]
+        self.middleware = RedirectsMiddleware(resolver=get_resolver(self.patterns))
+
+    def test_responses(self):
+        resp = self.middleware(self.rf.get('/dude/', {'bowling': 'yes'}))
+        self.assertEqual(resp.status_code, 301)
+        self.assertEqual(resp['Location'], '/abides/?bowling=yes')
+        self.assertEqual(resp['Cache-Control'], 'max-age=43200')
+        resp = self.middleware(self.rf.get('/de/dude/'))
+        self.assertEqual(resp['Location'], '/de/abides/')
+        self.assertEqual(self.middleware(self.rf.get('/donnie/')).status_code, 410)
+        self.assertEqual(self.middleware(self.rf.get('/en-US/donnie/')).status_code, 410)
+        self.assertIsNone(self.middleware(self.rf.get('/dude/abides/')))
+
+    def test_in_order(self):
+        self.assertEqual(self.middleware(self.rf.get('/walter/'))['Location'], '/first/')
+        self.assertEqual(self.middleware(self.rf.get('/jackie/'))['Location'], '/treehorn/')
+
+    def test_all_resolver_options(self):
+        for options in ({}, {'combined': True, 'locale_dispatch': True, 'sharded': True}):
+            middleware = RedirectsMiddleware(resolver=get_resolver(self.patterns, **options))
+            for path, location in [('/dude/', '/abides/'), ('/de/dude/', '/de/abides/'),
+                                   ('/walter/', '/first/'), ('/jackie/', '/treehorn/'),
+                                   ('/dude/\n', '/abides/')]:
+                self.assertEqual(middleware(self.rf.get(path))['Location'], location)
+
+    def test_without_locale_prefix(self):
+        table = RedirectTable([('/dude/', '/abides/', 301)], locale_prefix=False)
+        middleware = RedirectsMiddleware(resolver=get_resolver([table]))
+        self.assertEqual(middleware(self.rf.get('/dude/'))['Location'], '/abides/')
+        self.assertIsNone(middleware(self.rf.get('/de/dude/')))
+
+    def test_patterns_made_on_match(self):
+        self.assertEqual(len(self.table._patterns), 0)
+        self.middleware(self.rf.get('/dude/'))
+        url_pattern = self.table.row_pattern(0)
+        self.assertEqual(len(self.table._patterns), 1)
+        self.middleware(self.rf.get('/de/dude/'))
+        self.assertIs(self.table.row_pattern(0), url_pattern)
+
+    def test_stats_count_rows(self):
+        stats = RedirectStats()
+        middleware = RedirectsMiddleware(resolver=get_resolver(self.patterns), stats=stats)
+        middleware(self.rf.get('/dude/'))
+        middleware(self.rf.get('/fr/dude/'))
+        self.assertEqual(stats.snapshot()[0]['pattern'], LOCALE_RE + re.escape('dude/') + '$')
+        self.assertEqual(stats.snapshot()[0]['hits'], 2)
+
+
+class TestReloadTable(TableMixin, TestCase):
+    def test_reloads_changed_file(self):
+        filename = self.write('redirects.csv', CSV)
+        table = redirect_table(filename)
+        other = redirect(r'^jackie/$', '/treehorn/')
+        self.addCleanup(set_redirectpatterns, utils.redirectpatterns)
+        set_redirectpatterns([table, other])
+        middleware = RedirectsMiddleware()
+        reloader = RedirectsReloader([], 60)
+        self.assertFalse(reloader.check())
+
+        self.write('redirects.csv', '/dude/,/new/abode/\n')
+        mtime = time.time() + 10
+        os.utime(filename, (mtime, mtime))
+        self.assertTrue(reloader.check())
+        self.assertEqual(middleware(self.rf.get('/dude/'))['Location'], '/new/abode/')
+        self.assertIsNone(middleware(self.rf.get('/walter/')))
+        self.assertIs(utils.redirectpatterns[1], other)
+
+    def test_applies_other_tables_when_one_is_broken(self):
+        broken = redirect_table(self.write('broken.csv', '/walter/,/shomer/shabbos/\n'))
+        table = redirect_table(self.write('redirects.csv', CSV))
+        self.addCleanup(set_redirectpatterns, utils.redirectpatterns)
+        set_redirectpatterns([broken, table])
+        middleware = RedirectsMiddleware()
+        reloader = RedirectsReloader([], 60)
+
+        self.write('broken.csv', '/walter/,/shomer/shabbos/,404\n')
+        self.write('redirects.csv', '/dude/,/new/abode/\n')
+        mtime = time.time() + 10
+        for filename in (broken.filename, table.filename):
+            os.utime(filename, (mtime, mtime))
+        with patch('redirect_urls.reload.log'):
+            self.assertTrue(reloader.check())
+
+        self.assertEqual(middleware(self.rf.get('/dude/'))['Location'], '/new/abode/')
+        self.assertEqual(middleware(self.rf.get('/walter/'))['Location'], '/shomer/shabbos/')
+        self.assertIs(utils.redirectpatterns[0], broken)
+        self.assertFalse(reloader.check())
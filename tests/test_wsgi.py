@@ -0,0 +1,160 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from django.test import RequestFactory, TestCase
+
+from mock import patch
+
+from redirect_urls.middleware import RedirectsMiddleware
+from redirect_urls.stats import RedirectStats
+from redirect_urls.tables import RedirectTable
+from redirect_urls.utils import (decision_redirector, get_resolver, gone, redirect,
+                                 ua_redirector)
+from redirect_urls.wsgi import RESOLVED_KEY, RedirectsApplication
+
+
+def user_view(request, *args, **kwargs):
+    return '/from/a/view/'
+
+
+patterns = [
+    redirect(r'^dude/already/10th/', '/far/out/'),
+    redirect(r'^walter/(?P<page>\w+)/$', '/finishes/{page}/', anchor='coffee'),
+    redirect(r'^bunny/$', '/lebowski/', query={'ransom': '1M'}, merge_query=True),
+    redirect(r'^maude/$', '/art/', query={}, permanent=False, cache_timeout=None),
+    redirect(r'^donny/$', ua_redirector('Firefox', '/fx/', '/other/'), vary='User-Agent'),
+    redirect(r'^jesus/$', decision_redirector([
+        ({'cookie:bowling': '^yes$'}, '/lanes/'),
+        ({'user-agent': 'Android'}, '/android/'),
+    ], '/nope/')),
+    redirect(r'^ftp/$', 'ftp://ftp.example.com/'),
+    redirect(r'^js/$', 'javascript:alert(1)'),
+    redirect(r'^view/$', user_view),
+    redirect(r'^decorated/$', '/rug/', decorators=lambda view: view),
+    gone(r'^nihilists/.*$'),
+]
+
+
+class TestRedirectsApplication(TestCase):
+    def setUp(self):
+        self.rf = RequestFactory()
+        self.app_calls = []
+        self.middleware = RedirectsMiddleware(resolver=get_resolver(patterns))
+        self.application = RedirectsApplication(self.django_app, resolver=self.middleware.resolver)
+
+    def django_app(self, environ, start_response):
+        self.app_calls.append(environ)
+        start_response('200 OK', [])
+        return [b'django']
+
+    def call(self, environ):
+        responses = []
+
+        def start_response(status, headers):
+            responses.append((status, headers))
+
+        body = self.application(environ, start_response)
+        return responses[0] + (b''.join(body),)
+
+    def assertSameAsMiddleware(self, *args, **kwargs):
+        request = self.rf.get(*args, **kwargs)
+        with patch('time.time', return_value=1500000000.5):
+            status, headers, body = self.call(request.environ.copy())
+            response = self.middleware(self.rf.get(*args, **kwargs))
+
+        self.assertEqual(self.app_calls, [])
+        self.assertEqual(status, '{} {}'.format(response.status_code, response.reason_phrase))
+        # Django < 2.0 keeps the headers of responses in a dict
+        self.assertEqual(sorted(headers), sorted(response.items()))
+        self.assertEqual(body, response.content)
+        return headers
+
+    def test_static_redirects(self):
+        headers = self.assertSameAsMiddleware('/dude/already/10th/')
+        self.assertEqual(headers[1], ('Location', '/far/out/'))
+        self.assertEqual(headers[3], ('Cache-Control', 'max-age=43200'))
+        self.assertSameAsMiddleware('/de/dude/already/10th/', {'abides': 'yes'})
+        self.assertSameAsMiddleware('/walter/prior/')
+        self.assertSameAsMiddleware('/bunny/', {'toe': 'nail'})
+        headers = self.assertSameAsMiddleware('/maude/', {'dropped': '1'})
+        self.assertEqual(headers, [('Content-Type', 'text/html; charset=utf-8'),
+                                   ('Location', '/art/')])
+
+    def test_deciders(self):
+        self.assertSameAsMiddleware('/donny/', HTTP_USER_AGENT='Firefox/60.0')
+        headers = self.assertSameAsMiddleware('/donny/', HTTP_USER_AGENT='Chrome')
+        self.assertIn(('Vary', 'User-Agent'), headers)
+        self.assertSameAsMiddleware('/jesus/', HTTP_COOKIE='bowling=yes')
+        self.assertSameAsMiddleware('/jesus/', HTTP_USER_AGENT='Android')
+        headers = self.assertSameAsMiddleware('/jesus/')
+        self.assertIn(('Vary', 'Cookie, User-Agent'), headers)
+
+    def test_gone(self):
+        self.assertSameAsMiddleware('/nihilists/have/no/rules/')
+
+    def test_other_schemes(self):
+        self.assertSameAsMiddleware('/ftp/')
+        # refused by Django
+        environ = self.rf.get('/js/').environ
+        self.assertEqual(self.call(environ)[2], b'django')
+
+    def test_passes_on_what_needs_django(self):
+        for path in ('/view/', '/decorated/'):
+            environ = self.rf.get(path).environ
+            self.assertEqual(self.call(environ)[2], b'django')
+            patterns_, resolver_match = environ[RESOLVED_KEY]
+            self.assertIs(patterns_, patterns)
+            self.assertIs(resolver_match.func, resolver_match.redirect_pattern.callback)
+
+    def test_middleware_reuses_resolution(self):
+        environ = self.rf.get('/view/').environ
+        self.call(environ)
+        request = self.rf.get('/view/')
+        request.META = environ
+        with patch.object(self.middleware, 'resolve') as resolve:
+            response = self.middleware(request)
+
+        self.assertFalse(resolve.called)
+        self.assertEqual(response['Location'], '/from/a/view/')
+
+    def test_misses(self):
+        environ = self.rf.get('/the/dude/').environ
+        self.assertEqual(self.call(environ), ('200 OK', [], b'django'))
+        self.assertEqual(environ[RESOLVED_KEY], (patterns, None))
+        request = self.rf.get('/the/dude/')
+        request.META = environ
+        with patch.object(self.middleware, 'resolve') as resolve:
+            self.assertIsNone(self.middleware(request))
+
+        self.assertFalse(resolve.called)
+
+    def test_other_patterns_are_resolved_again(self):
+        request = self.rf.get('/the/dude/')
+        request.META[RESOLVED_KEY] = ([], None)
+        with patch.object(self.middleware, 'resolve', return_value=None) as resolve:
+            self.middleware(request)
+
+        resolve.assert_called_with('/the/dude/')
+
+    @patch('redirect_urls.tables.ROW_PATTERN_CACHE_SIZE', 5)
+    @patch('redirect_urls.wsgi.PREBUILT_CACHE_SIZE', 10)
+    def test_prebuilt_bounded(self):
+        # table rows get a new view each time their pattern is made again
+        table = RedirectTable([('/page/{}/'.format(i), '/new/{}/'.format(i), 301)
+                               for i in range(50)])
+        application = RedirectsApplication(self.django_app, resolver=get_resolver([table]))
+        self.application = application
+        for _ in range(3):
+            for i in range(50):
+                status, headers, body = self.call(self.rf.get('/page/{}/'.format(i)).environ)
+                self.assertEqual(dict(headers)['Location'], '/new/{}/'.format(i))
+
+        self.assertEqual(len(application._prebuilt), 10)
+
+    def test_stats(self):
+        stats = RedirectStats()
+        self.application = RedirectsApplication(self.django_app, resolver=get_resolver(patterns),
+                                                stats=stats)
+        self.call(self.rf.get('/dude/already/10th/').environ)
+        self.assertEqual(stats.snapshot()[0]['hits'], 1)